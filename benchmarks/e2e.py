@@ -0,0 +1,237 @@
+"""
+End-to-end benchmark: drives /api/init -> /api/plan -> /api/build -> /api/download
+over the case-studies packs at several concurrency levels and prints a JSON report.
+
+Runs fully offline against the fake LLM backend by default:
+
+    uv run -m benchmarks.e2e --concurrency 1 4 16 --sessions 16 --output bench.json
+
+Pass --url to benchmark a running server instead (its backend is whatever it was
+started with).
+
+The extraction and task caches are cold by default: each level starts with empty
+caches that keep nothing, so every session pays for the full pipeline. Pass
+--warm-cache to let sessions and levels share the caches, as a long-running
+server would.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+
+import httpx
+
+CASE_STUDIES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "case-studies"))
+STAGES = ("init", "plan", "build", "download", "total")
+
+def load_case_studies(root: str = CASE_STUDIES_DIR) -> list[dict]:
+    """
+    Collects (filename, bytes) pairs for each case study's company and candidate folders.
+    """
+    packs = []
+    for name in sorted(os.listdir(root)):
+        company_dir = os.path.join(root, name, "company")
+        candidate_dir = os.path.join(root, name, "candidate")
+        if not (os.path.isdir(company_dir) and os.path.isdir(candidate_dir)):
+            continue
+        pack = {"name": name}
+        for side, directory in (("company_files", company_dir), ("employee_files", candidate_dir)):
+            files = []
+            for filename in sorted(os.listdir(directory)):
+                path = os.path.join(directory, filename)
+                if os.path.isfile(path):
+                    with open(path, "rb") as f:
+                        files.append((filename, f.read()))
+            pack[side] = files
+        packs.append(pack)
+    return packs
+
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+def summarise(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+async def run_session(client: httpx.AsyncClient, pack: dict, n_tasks: int) -> dict:
+    timings = {}
+    start = time.perf_counter()
+
+    files = [("company_files", (name, data)) for name, data in pack["company_files"]]
+    files += [("employee_files", (name, data)) for name, data in pack["employee_files"]]
+    t0 = time.perf_counter()
+    response = await client.post("/api/init", params={"n_tasks": n_tasks}, files=files)
+    response.raise_for_status()
+    session_id = response.json()["session_id"]
+    timings["init"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    response = await client.post("/api/plan", json={"session_id": session_id, "feedback": "Make the last task slightly harder."})
+    response.raise_for_status()
+    timings["plan"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    complete = None
+    async with client.stream("POST", "/api/build", json={"session_id": session_id}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == "error":
+                raise RuntimeError(f"Build failed: {event['message']}")
+            if event["type"] == "complete":
+                complete = event
+    if complete is None:
+        raise RuntimeError("Build stream ended without a complete event")
+    timings["build"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    response = await client.get(complete["download_url"])
+    response.raise_for_status()
+    timings["download"] = time.perf_counter() - t0
+
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+async def run_level(client: httpx.AsyncClient, packs: list[dict], concurrency: int, sessions: int, n_tasks: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    results: list[dict] = []
+    errors: list[str] = []
+
+    async def one(i: int):
+        async with semaphore:
+            try:
+                results.append(await run_session(client, packs[i % len(packs)], n_tasks))
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(sessions)))
+    wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "completed": len(results),
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput_sessions_per_s": len(results) / wall if wall else None,
+        "latency_seconds": {stage: summarise([r[stage] for r in results]) for stage in STAGES},
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+@contextmanager
+def cold_caches():
+    """
+    Points the in-process extraction and task caches at an empty directory and
+    stops them keeping entries, so no session is served from another's
+    results. The caches are restored on exit.
+    """
+    from src.backend.summariser.cache import extraction_cache
+    from src.backend.task_cache import task_cache
+
+    caches = {"extraction": extraction_cache, "tasks": task_cache}
+    saved = {name: (cache.directory, cache.max_entries) for name, cache in caches.items()}
+    with tempfile.TemporaryDirectory(prefix="katalab-bench-cache-") as directory:
+        for name, cache in caches.items():
+            cache.directory = os.path.join(directory, name)
+            cache.max_entries = 0
+        try:
+            yield
+        finally:
+            for name, cache in caches.items():
+                cache.directory, cache.max_entries = saved[name]
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__), text=True).strip()
+    except Exception:
+        return None
+
+async def run_benchmark(concurrency_levels: list[int], sessions: int, n_tasks: int, url: str | None = None, app=None, warm_cache: bool = False) -> dict:
+    """
+    Runs every concurrency level against either a live server (`url`) or an
+    in-process ASGI app and returns the machine-readable report. In-process
+    levels run with cold caches unless `warm_cache` is set; a live server's
+    caches are whatever it was started with.
+    """
+    packs = load_case_studies()
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=None)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+
+    levels = []
+    async with client:
+        for concurrency in concurrency_levels:
+            with nullcontext() if url or warm_cache else cold_caches():
+                levels.append(await run_level(client, packs, concurrency, sessions, n_tasks))
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "backend": "remote" if url else os.environ.get("KATALAB_LLM_BACKEND", "gemini"),
+        "fake_latency": os.environ.get("KATALAB_FAKE_LATENCY"),
+        "fake_jitter": os.environ.get("KATALAB_FAKE_JITTER"),
+        "cache": "server" if url else "warm" if warm_cache else "cold",
+        "n_tasks": n_tasks,
+        "case_studies": [pack["name"] for pack in packs],
+        "levels": levels,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end Katalab benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrent sessions per level")
+    parser.add_argument("--sessions", type=int, default=16, help="Sessions to run at each level")
+    parser.add_argument("--n-tasks", type=int, default=3, help="Tasks per kata")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Fake LLM jitter per call in seconds")
+    parser.add_argument("--url", default=None, help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--warm-cache", action="store_true", help="Share the extraction and task caches across sessions and levels")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    app = None
+    if not args.url:
+        # The backend is chosen when src.backend.client is first imported
+        os.environ.setdefault("KATALAB_LLM_BACKEND", "fake")
+        os.environ["KATALAB_FAKE_LATENCY"] = str(args.latency)
+        os.environ["KATALAB_FAKE_JITTER"] = str(args.jitter)
+        # Keep sessions, caches and zips out of the working tree
+        os.chdir(tempfile.mkdtemp(prefix="katalab-bench-"))
+        from src.backend.main import app
+
+    report = asyncio.run(run_benchmark(args.concurrency, args.sessions, args.n_tasks, url=args.url, app=app, warm_cache=args.warm_cache))
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
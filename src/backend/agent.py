@@ -1,27 +1,160 @@
 from src.backend.client import google_client
-from src.backend.models import CompanyInfo, EmployeeInfo, KataPlan, Plan, TaskImplementation
+from src.backend.context import build_context_digest
+from src.backend.llm import LLMClient, default_policy
+from src.backend.metrics import registry
+from src.backend.models import CompanyInfo, ContextDigest, EmployeeInfo, FileContent, KataPlan, Plan, PlanRevision, PlanVersion, TaskArtifact, TaskBatch, TaskImplementation
+from src.backend.summariser.cache import ExtractionCache
+from src.backend.task_cache import make_task_key
+from src.backend.utils import iterate_sync
+from src.backend.validation import validate_files
 from google.genai import types
-import json
+import asyncio
 
 from pydantic import create_model, Field
 
+# Sentinel pushed by a task worker once it has emitted all of its events
+_TASK_DONE = object()
+
+# Bump whenever the README or implementation prompts change so cached tasks are not reused
+TASK_PROMPT_VERSION = "2"
+
+# A revision whose tasks match nothing in the plan is asked for once more before giving up
+REVISION_ATTEMPTS = 2
+
+# Generated kata code is meant to be fixed by candidates, e.g. deliberately broken security code
+_SAFETY_SETTINGS = [
+    types.SafetySetting(category=category, threshold="BLOCK_NONE")
+    for category in ("HARM_CATEGORY_DANGEROUS_CONTENT", "HARM_CATEGORY_HATE_SPEECH", "HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_SEXUALLY_EXPLICIT")
+]
+
+registry.describe("katalab_validation_repairs_total", "counter", "Generated files regenerated after failing static checks, by outcome (fixed or failed)")
+registry.describe("katalab_task_batches_total", "counter", "Batched task generation calls by outcome (ok, partial or failed)")
+registry.describe("katalab_speculative_tasks_total", "counter", "Tasks generated ahead of a build, by outcome (generated, failed, used or cancelled)")
+
+class UnknownTaskId(ValueError):
+    """Raised when a plan revision targets a task id that is not in the latest plan."""
+
+class RevisionMismatch(ValueError):
+    """Raised when the model's revision returns tasks that match no task in the plan."""
+
+def apply_revision(plan: KataPlan, revision: PlanRevision, task_ids: list[str] | None = None) -> tuple[KataPlan, list[str]]:
+    """
+    Applies a revision to `plan`, replacing tasks by id and keeping every other
+    task verbatim. When specific tasks were targeted, only those may change; a
+    revised task with an id not in the plan is matched to the remaining targets in order.
+    Otherwise it is matched to a not yet revised task of the same name.
+
+    Returns:
+        The revised plan and the ids of the tasks that changed.
+
+    Raises:
+        RevisionMismatch: If an untargeted revision returns a task that matches no task in the plan.
+    """
+    current = {task.id: task for task in plan.tasks}
+    allowed = set(task_ids) if task_ids else set(current)
+    updates: dict[str, Plan] = {}
+    unmatched = []
+    for task in revision.tasks:
+        if task.id in allowed and task.id not in updates:
+            updates[task.id] = task
+        elif task.id not in current:
+            unmatched.append(task)
+    if task_ids:
+        remaining = [task_id for task_id in task_ids if task_id not in updates]
+        for task_id, task in zip(remaining, unmatched):
+            updates[task_id] = task.model_copy(update={"id": task_id})
+    elif unmatched:
+        by_name = {task.name.strip().lower(): task.id for task in plan.tasks if task.id not in updates}
+        unknown = []
+        for task in unmatched:
+            task_id = by_name.pop(task.name.strip().lower(), None)
+            if task_id is None:
+                unknown.append(task.id)
+            else:
+                updates[task_id] = task.model_copy(update={"id": task_id})
+        if unknown:
+            raise RevisionMismatch(f"The revision returned tasks {unknown} that match no task in the plan {list(current)}.")
+
+    changed = [task.id for task in plan.tasks if task.id in updates and updates[task.id] != task]
+    revised = KataPlan(
+        title=revision.title or plan.title,
+        description=revision.description or plan.description,
+        tasks=[updates.get(task.id, task) for task in plan.tasks],
+    )
+    return revised, changed
+
 class KataAgent:
-    def __init__(self, model_name: str = "gemini-3-pro-preview", n_tasks: int = 3):
+    def __init__(self, model_name: str = "gemini-3-pro-preview", n_tasks: int = 3, max_concurrency: int = 4, ordered: bool = True, cache: ExtractionCache | None = None, speculative_concurrency: int = 1, batch_size: int = 1, validate: bool = True, repair_rounds: int = 2):
+        """
+        Args:
+            model_name: The Gemini model to use.
+            n_tasks: Number of tasks the plan must contain.
+            max_concurrency: Maximum number of tasks generated at the same time.
+            ordered: Emit build events in plan order (True) or as tasks complete (False).
+            cache: Optional on-disk cache of generated tasks, so rebuilds only regenerate changed tasks.
+            speculative_concurrency: Maximum number of tasks generated ahead of a build at the same time.
+            batch_size: Tasks generated per LLM call. Above 1, READMEs and code for up to this many
+                tasks come back in one structured response (no streamed README deltas), falling
+                back to per-task calls for any task the batch response does not cover.
+            validate: Statically check generated files and regenerate only the ones that fail.
+            repair_rounds: Maximum regeneration attempts per task before shipping files as they are.
+        """
         self.client = google_client
+        self.llm = LLMClient(self.client)
+        # A truncated or unparseable batch falls back to per-task calls rather than being retried
+        self.batch_llm = LLMClient(self.client, policy=default_policy.model_copy(update={"retry_on_empty": False}))
         self.model_name = model_name
         self.n_tasks = n_tasks
+        self.max_concurrency = max_concurrency
+        self.ordered = ordered
+        self.cache = cache
+        self.batch_size = batch_size
+        self.validate = validate
+        self.repair_rounds = repair_rounds
         self.latest_plan: KataPlan | None = None
+        # Every plan this agent produced, oldest first
+        self.plan_history: list[PlanVersion] = []
+        # Compact company/candidate brief shared by every prompt, rebuilt when the inputs change
+        self._context: ContextDigest | None = None
+        self._context_source: tuple[CompanyInfo, EmployeeInfo] | None = None
+        # Task cache key -> (task id, background generation) started by speculate()
+        self._speculative: dict[str, tuple[str, asyncio.Task]] = {}
+        # Keys whose speculative generation got a slot and is calling the LLM
+        self._speculation_started: set[str] = set()
+        self._speculation_slots = asyncio.Semaphore(speculative_concurrency)
+
+    def context(self, company_data: CompanyInfo, employee_data: EmployeeInfo) -> ContextDigest:
+        source = self._context_source
+        if self._context is None or source[0] is not company_data or source[1] is not employee_data:
+            self._context = build_context_digest(company_data, employee_data)
+            self._context_source = (company_data, employee_data)
+        return self._context
+
+    def _record_version(self, plan: KataPlan, feedback: str | None, changed_task_ids: list[str]):
+        self.latest_plan = plan
+        self.plan_history.append(PlanVersion(
+            version=len(self.plan_history) + 1,
+            plan=plan,
+            feedback=feedback,
+            changed_task_ids=changed_task_ids,
+        ))
 
     def plan(self, company_data: CompanyInfo, employee_data: EmployeeInfo, feedback: str | None = None) -> KataPlan:
+        return asyncio.run(self.aplan(company_data, employee_data, feedback))
+
+    def revise(self, company_data: CompanyInfo, employee_data: EmployeeInfo, feedback: str, task_ids: list[str] | None = None) -> KataPlan:
+        return asyncio.run(self.arevise(company_data, employee_data, feedback, task_ids))
+
+    def run(self, company_data: CompanyInfo, employee_data: EmployeeInfo, ordered: bool | None = None):
+        yield from iterate_sync(self.arun(company_data, employee_data, ordered=ordered))
+
+    async def aplan(self, company_data: CompanyInfo, employee_data: EmployeeInfo, feedback: str | None = None) -> KataPlan:
         prompt = f"""
         You are an expert technical interviewer and coding kata designer.
         Design a coding kata (a set of EXACTLY {self.n_tasks} tasks) tailored to the candidate based on:
 
-        Company Context:
-        {company_data.model_dump_json(indent=2)}
-
-        Candidate Profile:
-        {employee_data.model_dump_json(indent=2)}
+        Company and Candidate Context:
+        {self.context(company_data, employee_data).text}
 
         Feedback from previous iteration (if any):
         {feedback or "None"}
@@ -49,7 +182,8 @@ class KataAgent:
             tasks=(list[Plan], Field(min_length=self.n_tasks, max_length=self.n_tasks, description=f"List of exactly {self.n_tasks} tasks"))
         )
 
-        response = self.client.models.generate_content(
+        response = await self.llm.generate(
+            operation="plan",
             model=self.model_name,
             contents=[prompt],
             config=types.GenerateContentConfig(
@@ -63,10 +197,82 @@ class KataAgent:
 
         # Convert back to standard KataPlan for type consistency if needed, 
         # but the structure is identical so we can just cast or return
-        self.latest_plan = KataPlan(**response.parsed.model_dump())
+        plan = KataPlan(**response.parsed.model_dump())
+        self._record_version(plan, feedback, [task.id for task in plan.tasks])
         return self.latest_plan
 
-    def run(self, company_data: CompanyInfo, employee_data: EmployeeInfo):
+    async def arevise(self, company_data: CompanyInfo, employee_data: EmployeeInfo, feedback: str, task_ids: list[str] | None = None) -> KataPlan:
+        """
+        Revises the latest plan from feedback instead of planning from scratch.
+        The model only returns the tasks that change (restricted to `task_ids`
+        when given); all other tasks are kept verbatim. Falls back to a full plan
+        when there is nothing to revise yet.
+
+        Raises:
+            UnknownTaskId: If `task_ids` names a task that is not in the plan.
+            RevisionMismatch: If the model keeps returning tasks that are not in the plan.
+        """
+        if not self.latest_plan:
+            return await self.aplan(company_data, employee_data, feedback)
+
+        plan_ids = [task.id for task in self.latest_plan.tasks]
+        unknown = [task_id for task_id in task_ids or [] if task_id not in plan_ids]
+        if unknown:
+            raise UnknownTaskId(f"Unknown task ids {unknown}; the plan has {plan_ids}.")
+
+        if task_ids:
+            scope = f"Only revise the tasks with ids {task_ids}. Return exactly those tasks, keeping their ids."
+        else:
+            scope = "Return only the tasks that need to change to address the feedback, keeping their ids. Leave out tasks that stay the same."
+
+        prompt = f"""
+        You are an expert technical interviewer and coding kata designer revising an existing kata plan.
+
+        Current plan:
+        {self.latest_plan.model_dump_json(indent=2)}
+
+        Context:
+        {self.context(company_data, employee_data).text}
+
+        Feedback:
+        {feedback}
+
+        {scope}
+        Only set title or description if the feedback asks to change them.
+
+        Output a structured PlanRevision.
+        """
+
+        for attempt in range(REVISION_ATTEMPTS):
+            response = await self.llm.generate(
+                operation="revise",
+                model=self.model_name,
+                contents=[prompt],
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=PlanRevision,
+                ),
+            )
+
+            if not response.parsed:
+                raise ValueError("Failed to parse the response into PlanRevision.")
+
+            try:
+                plan, changed = apply_revision(self.latest_plan, response.parsed, task_ids)
+            except RevisionMismatch as e:
+                if attempt == REVISION_ATTEMPTS - 1:
+                    raise
+                print(f"Retrying plan revision: {e}")
+                continue
+            self._record_version(plan, feedback, changed)
+            return plan
+
+    async def arun(self, company_data: CompanyInfo, employee_data: EmployeeInfo, ordered: bool | None = None):
+        """
+        Generates every task of the latest plan concurrently (bounded by max_concurrency)
+        and yields log/file events. The README -> implementation dependency only exists
+        within a task, so tasks are independent of each other.
+        """
         if not self.latest_plan:
             raise ValueError("No plan found. Please run plan() first.")
 
@@ -77,101 +283,406 @@ class KataAgent:
         yield {"type": "log", "message": "Generated root README.md"}
         yield {"type": "file", "path": "README.md", "content": root_readme}
 
-        for i, task in enumerate(self.latest_plan.tasks):
-            yield {"type": "log", "message": f"[{i+1}/{len(self.latest_plan.tasks)}] designing task: {task.name}..."}
-            
-            # Step 1: Generate README and Task Design
-            readme_prompt = f"""
-            Design a specific, short coding task for this Kata.
+        tasks = self.latest_plan.tasks
+        ordered = self.ordered if ordered is None else ordered
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # One queue per task when streaming in plan order, a shared one otherwise
+        queues = [asyncio.Queue() for _ in tasks] if ordered else [asyncio.Queue()] * len(tasks)
+
+        async def replay(i: int, task: Plan, artifact: TaskArtifact, reason: str):
+            # Unchanged tasks are replayed straight away without waiting for a slot
+            for event in self._cached_task_events(i, len(tasks), task, artifact, reason):
+                await queues[i].put(event)
+
+        async def generate(i: int, task: Plan, key: str | None):
+            async with semaphore:
+                async for event in self._agenerate_task(i, len(tasks), task, company_data, employee_data, cache_key=key):
+                    await queues[i].put(event)
+
+        async def worker(i: int, task: Plan):
+            try:
+                key, cached, reason = await self._alookup_task(task, company_data, employee_data)
+                if cached is not None:
+                    await replay(i, task, cached, reason)
+                else:
+                    await generate(i, task, key)
+            finally:
+                await queues[i].put(_TASK_DONE)
+
+        async def batch_worker(batch: list[tuple[int, Plan, str | None]]):
+            try:
+                async with semaphore:
+                    generated = await self._agenerate_batch([task for _, task, _ in batch], company_data, employee_data)
+                    covered = [task for _, task, _ in batch if task.id in generated]
+                    checked = await asyncio.gather(*(self._avalidate_artifact(task, generated[task.id]) for task in covered))
+                artifacts = {task.id: result for task, result in zip(covered, checked)}
+                for i, task, key in batch:
+                    if task.id in artifacts:
+                        artifact, messages = artifacts[task.id]
+                        for message in messages:
+                            await queues[i].put({"type": "log", "message": f"[{i+1}/{len(tasks)}] {message}"})
+                        await replay(i, task, artifact, "generated in batch")
+                        if key is not None:
+                            await asyncio.to_thread(self.cache.put, key, artifact)
+                fallback = [(i, task, key) for i, task, key in batch if task.id not in artifacts]
+                for i, task, _ in fallback:
+                    await queues[i].put({"type": "log", "message": f"[{i+1}/{len(tasks)}] batch response did not cover {task.name}, generating it on its own"})
+                await asyncio.gather(*(generate(i, task, key) for i, task, key in fallback), return_exceptions=True)
+            finally:
+                for i, _, _ in batch:
+                    await queues[i].put(_TASK_DONE)
+
+        async def batched():
+            lookups = await asyncio.gather(*(self._alookup_task(task, company_data, employee_data) for task in tasks), return_exceptions=True)
+            pending = []
+            for i, (task, lookup) in enumerate(zip(tasks, lookups)):
+                key, cached, reason = (None, None, "") if isinstance(lookup, Exception) else lookup
+                if cached is not None:
+                    await replay(i, task, cached, reason)
+                    await queues[i].put(_TASK_DONE)
+                else:
+                    pending.append((i, task, key))
+            batches = [pending[start:start + self.batch_size] for start in range(0, len(pending), self.batch_size)]
+            await asyncio.gather(*(batch_worker(batch) for batch in batches))
+
+        if self.batch_size > 1:
+            workers = [asyncio.create_task(batched())]
+        else:
+            workers = [asyncio.create_task(worker(i, task)) for i, task in enumerate(tasks)]
+        try:
+            if ordered:
+                for queue in queues:
+                    while (event := await queue.get()) is not _TASK_DONE:
+                        yield event
+            else:
+                remaining = len(tasks)
+                while remaining:
+                    event = await queues[0].get()
+                    if event is _TASK_DONE:
+                        remaining -= 1
+                    else:
+                        yield event
+        finally:
+            # Client went away or we finished: make sure no task keeps running
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _alookup_task(self, task: Plan, company_data: CompanyInfo, employee_data: EmployeeInfo) -> tuple[str | None, TaskArtifact | None, str]:
+        """Returns the task's cache key, its artifact if one is cached or being speculated, and how it was found."""
+        key, cached = await self._acached_task(task, company_data, employee_data)
+        if cached is None and key in self._speculative:
+            return key, await self._aclaim_speculative(key), "using task generated ahead of the build"
+        return key, cached, "reusing unchanged task"
+
+    async def _agenerate_batch(self, tasks: list[Plan], company_data: CompanyInfo, employee_data: EmployeeInfo) -> dict[str, TaskArtifact]:
+        """
+        Generates the READMEs and code of several tasks in one call. Returns the
+        artifacts by task id; tasks missing from the response (or every task,
+        if it was truncated or unparseable) are left for per-task generation.
+        """
+        task_list = "\n".join(f"- Task id: {task.id}\n  Name: {task.name}\n  Description: {task.description}" for task in tasks)
+        prompt = f"""
+        Design {len(tasks)} specific, short coding tasks for this Kata, one per planned task below.
+
+        Planned tasks:
+        {task_list}
+
+        Company and Candidate Context:
+        {self.context(company_data, employee_data).text}
+
+        For each task:
+        1. Write an easy to understand README.md that explains the task to the candidate, engineer-to-engineer,
+           tailored to their level ({employee_data.level}) and learning style ({employee_data.likely_learning_style}).
+           The task should involve fixing or implementing a specific feature.
+        2. Create a skeleton code file (e.g. `main.py`, `service.js` etc) that contains signatures or incorrect code for the candidate to fix, as described in the README.
+        3. Create a `tests/` folder with valid test files (e.g. `tests/test_task.py`) that will verify the correct solution.
+
+        Return a TaskBatch with one entry per task, using the task ids above. Do not include README.md in the implementation files.
+        """
+        try:
+            response = await self.batch_llm.generate(
+                operation="batch",
+                model=self.model_name,
+                contents=[prompt],
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=TaskBatch,
+                    safety_settings=_SAFETY_SETTINGS,
+                ),
+            )
+        except Exception as e:
+            print(f"Batched generation of {[task.id for task in tasks]} failed: {e}")
+            registry.inc("katalab_task_batches_total", {"outcome": "failed"})
+            return {}
+
+        wanted = {task.id for task in tasks}
+        artifacts = {}
+        for item in response.parsed.tasks if response.parsed else []:
+            if item.task_id in wanted and item.readme.strip() and item.implementation.files:
+                artifacts.setdefault(item.task_id, TaskArtifact(readme=item.readme, files=item.implementation.files))
+        outcome = "ok" if len(artifacts) == len(wanted) else "partial" if artifacts else "failed"
+        registry.inc("katalab_task_batches_total", {"outcome": outcome})
+        return artifacts
+
+    async def _avalidate_artifact(self, task: Plan, artifact: TaskArtifact) -> tuple[TaskArtifact, list[str]]:
+        """
+        Checks every generated file and regenerates only the failing ones, up to
+        `repair_rounds` times. Returns the (possibly repaired) artifact and log
+        messages describing what was found and fixed.
+        """
+        if not self.validate:
+            return artifact, []
+        files = {file_obj.filename: file_obj.content for file_obj in artifact.files}
+        messages = []
+        issues = await validate_files(files)
+        for _ in range(self.repair_rounds):
+            if not issues:
+                break
+            messages.append(f"regenerating {sorted(issues)} for {task.name}: " + "; ".join(f"{name}: {problems[0]}" for name, problems in sorted(issues.items())))
+            repaired = await asyncio.gather(*(self._arepair_file(task, artifact.readme, files, filename, problems) for filename, problems in issues.items()))
+            for filename, content in zip(issues, repaired):
+                if content is not None:
+                    files[filename] = content
+            previous, issues = issues, await validate_files(files)
+            fixed = [filename for filename in previous if filename not in issues]
+            registry.inc("katalab_validation_repairs_total", {"outcome": "fixed"}, len(fixed))
+            registry.inc("katalab_validation_repairs_total", {"outcome": "failed"}, len(previous) - len(fixed))
+        if issues:
+            messages.append(f"Warning: {sorted(issues)} in {task.name} still fail validation: " + "; ".join(f"{name}: {problems[0]}" for name, problems in sorted(issues.items())))
+        return TaskArtifact(readme=artifact.readme, files=[FileContent(filename=name, content=content) for name, content in files.items()]), messages
+
+    async def _arepair_file(self, task: Plan, readme: str, files: dict[str, str], filename: str, problems: list[str]) -> str | None:
+        others = "\n\n".join(f"--- {name} ---\n{content}" for name, content in files.items() if name != filename)
+        problem_list = "\n".join(f"- {problem}" for problem in problems)
+        prompt = f"""
+        A generated coding kata task has a file that fails static checks. Fix only that file.
+
+        Task: {task.name}
+
+        README Content:
+        {readme}
+
+        Other files of the task:
+        {others}
+
+        File to fix: {filename}
+        --- {filename} ---
+        {files[filename]}
+
+        Problems:
+        {problem_list}
+
+        Keep the file's purpose: a skeleton stays incomplete for the candidate to fix, and tests keep verifying the
+        correct solution, only importing names the other files define.
+        Return the corrected file as a FileContent with filename {filename}.
+        """
+        try:
+            response = await self.llm.generate(
+                operation="repair",
+                model=self.model_name,
+                contents=[prompt],
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=FileContent,
+                    safety_settings=_SAFETY_SETTINGS,
+                ),
+            )
+        except Exception as e:
+            print(f"Repair of {task.id}/{filename} failed: {e}")
+            return None
+        return response.parsed.content if response.parsed else None
+
+    def speculate(self, company_data: CompanyInfo, employee_data: EmployeeInfo) -> int:
+        """
+        Starts generating the latest plan's tasks in the background, at most
+        `speculative_concurrency` at a time, so a build that follows an
+        unchanged plan finds them in the task cache. Speculative work for tasks
+        that are no longer in the plan (or whose content changed) is cancelled.
+        Needs a task cache and a running event loop.
+
+        Returns:
+            The number of tasks newly scheduled.
+        """
+        if not self.latest_plan or self.cache is None:
+            return 0
+        tasks = self.latest_plan.tasks
+        wanted = {self._task_key(task, company_data, employee_data): (i, task) for i, task in enumerate(tasks)}
+        for key in [key for key in self._speculative if key not in wanted]:
+            self._cancel_speculative(key)
+
+        scheduled = 0
+        for key, (i, task) in wanted.items():
+            if key in self._speculative:
+                continue
+            job = asyncio.create_task(self._speculate_task(i, len(tasks), task, key, company_data, employee_data))
+            self._speculative[key] = (task.id, job)
+            job.add_done_callback(lambda done, key=key: self._speculation_finished(key, done))
+            scheduled += 1
+        return scheduled
+
+    def cancel_speculation(self, task_ids: list[str] | None = None):
+        """Cancels background generation of the given tasks, or of every task."""
+        for key, (task_id, _) in list(self._speculative.items()):
+            if task_ids is None or task_id in task_ids:
+                self._cancel_speculative(key)
+
+    def _cancel_speculative(self, key: str):
+        _, job = self._speculative.pop(key)
+        if not job.done():
+            job.cancel()
+            registry.inc("katalab_speculative_tasks_total", {"outcome": "cancelled"})
 
-            Task Info:
-            Name: {task.name}
-            Description: {task.description}
+    def _speculation_finished(self, key: str, job: asyncio.Task):
+        if key in self._speculative and self._speculative[key][1] is job:
+            del self._speculative[key]
+        self._speculation_started.discard(key)
+        if not job.cancelled() and job.exception() is not None:
+            print(f"Speculative generation failed: {job.exception()}")
+
+    async def _speculate_task(self, i: int, n_tasks: int, task: Plan, key: str, company_data: CompanyInfo, employee_data: EmployeeInfo):
+        # Queue for a slot before anything else, so tasks are generated in plan order
+        async with self._speculation_slots:
+            if await asyncio.to_thread(self.cache.get, key, TaskArtifact) is not None:
+                return
+            self._speculation_started.add(key)
+            # Events are dropped: a successful generation lands in the task cache
+            try:
+                async for _ in self._agenerate_task(i, n_tasks, task, company_data, employee_data, cache_key=key):
+                    pass
+            except Exception:
+                registry.inc("katalab_speculative_tasks_total", {"outcome": "failed"})
+                raise
+        # Failures are reported as events, not raised; only a cached artifact is of use to the build
+        cached = await asyncio.to_thread(self.cache.get, key, TaskArtifact) is not None
+        registry.inc("katalab_speculative_tasks_total", {"outcome": "generated" if cached else "failed"})
+
+    async def _aclaim_speculative(self, key: str) -> TaskArtifact | None:
+        """
+        Hands a task the build needs over from speculation: a generation that is
+        already calling the LLM is awaited, one still waiting for a slot is
+        cancelled so the build generates it at full priority.
+        """
+        _, job = self._speculative[key]
+        if key not in self._speculation_started:
+            self._cancel_speculative(key)
+            return None
+        try:
+            # Shielded: a build that is cancelled leaves the generation running for the next one
+            await asyncio.shield(job)
+        except asyncio.CancelledError:
+            if not job.cancelled():
+                raise
+            return None
+        except Exception:
+            return None
+        artifact = await asyncio.to_thread(self.cache.get, key, TaskArtifact)
+        if artifact is not None:
+            registry.inc("katalab_speculative_tasks_total", {"outcome": "used"})
+        return artifact
+
+    def _task_key(self, task: Plan, company_data: CompanyInfo, employee_data: EmployeeInfo) -> str:
+        context = self.context(company_data, employee_data)
+        return make_task_key(task, [context.text], self.model_name, TASK_PROMPT_VERSION)
+
+    async def _acached_task(self, task: Plan, company_data: CompanyInfo, employee_data: EmployeeInfo) -> tuple[str | None, TaskArtifact | None]:
+        if self.cache is None:
+            return None, None
+        key = self._task_key(task, company_data, employee_data)
+        return key, await asyncio.to_thread(self.cache.get, key, TaskArtifact)
+
+    def _cached_task_events(self, i: int, n_tasks: int, task: Plan, artifact: TaskArtifact, reason: str = "reusing unchanged task"):
+        yield {"type": "log", "message": f"[{i+1}/{n_tasks}] {reason}: {task.name}"}
+        yield {"type": "file", "path": f"{task.id}/README.md", "content": artifact.readme}
+        for file_obj in artifact.files:
+            yield {"type": "file", "path": f"{task.id}/{file_obj.filename}", "content": file_obj.content}
+
+    async def _agenerate_task(self, i: int, n_tasks: int, task: Plan, company_data: CompanyInfo, employee_data: EmployeeInfo, cache_key: str | None = None):
+        yield {"type": "log", "message": f"[{i+1}/{n_tasks}] designing task: {task.name}..."}
+        
+        # Step 1: Generate README and Task Design
+        readme_prompt = f"""
+        Design a specific, short coding task for this Kata.
+
+        Task Info:
+        Name: {task.name}
+        Description: {task.description}
+        
+        Company and Candidate Context:
+        {self.context(company_data, employee_data).text}
+        
+        Tailor the task explanation and difficulty to the candidate's level ({employee_data.level})
+        and learning style ({employee_data.likely_learning_style}).
+        
+        Remember you are talking engineer-to-engineer, so use clear, direct language without too much jargon. Use technical terms appropriately and do not overindex or overcomplicate the task.
+        Output an easy to understand, cleanly parsed README.md file content that explains the task to the candidate.
+        The task should involve fixing or implementing a specific feature.
+        """
+        
+        try:
+            folder_name = task.id
+            readme_path = f"{folder_name}/README.md"
+
+            # Stream the README so the UI can render it from the first token
+            readme_chunks = []
+            async for chunk in self.llm.stream(
+                operation="readme",
+                model=self.model_name,
+                contents=[readme_prompt],
+                config=types.GenerateContentConfig(
+                    response_mime_type="text/plain"
+                )
+            ):
+                readme_chunks.append(chunk)
+                yield {"type": "file_delta", "path": readme_path, "chunk": chunk}
+
+            readme_content = "".join(readme_chunks)
+            yield {"type": "file", "path": readme_path, "content": readme_content}
             
-            Company Context:
-            {company_data.model_dump_json(indent=2)}
+            yield {"type": "log", "message": f"[{i+1}/{n_tasks}] generating code for: {task.name}..."}
+
+            # Step 2: Generate Implementation based on the README
+            impl_prompt = f"""
+            Based on the following README for a coding task, generate the necessary code files.
             
-            Candidate Profile:
-            {employee_data.model_dump_json(indent=2)}
+            README Content:
+            {readme_content}
             
-            Tailor the task explanation and difficulty to the candidate's level ({employee_data.level})
-            and learning style ({employee_data.likely_learning_style}).
+            Requirements:
+            1. Create a skeleton code file (e.g. `main.py`, `service.js` etc) that contains signatures or incorrect code for the candidate to fix, as described in the README.
+            2. Create a `tests/` folder with valid test files (e.g. `tests/test_task.py`) that will verify the correct solution.
             
-            Remember you are talking engineer-to-engineer, so use clear, direct language without too much jargon. Use technical terms appropriately and do not overindex or overcomplicate the task.
-            Output an easy to understand, cleanly parsed README.md file content that explains the task to the candidate.
-            The task should involve fixing or implementing a specific feature.
+            Return a JSON object with the list of files (excluding README.md).
             """
-            
-            try:
-                readme_response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=[readme_prompt],
-                    config=types.GenerateContentConfig(
-                        response_mime_type="text/plain"
-                    )
-                )
-                
-                readme_content = readme_response.text
-                folder_name = task.id
-                readme_path = f"{folder_name}/README.md"
-                yield {"type": "file", "path": readme_path, "content": readme_content}
-                
-                yield {"type": "log", "message": f"[{i+1}/{len(self.latest_plan.tasks)}] generating code for: {task.name}..."}
-
-                # Step 2: Generate Implementation based on the README
-                impl_prompt = f"""
-                Based on the following README for a coding task, generate the necessary code files.
-                
-                README Content:
-                {readme_content}
-                
-                Requirements:
-                1. Create a skeleton code file (e.g. `main.py`, `service.js` etc) that contains signatures or incorrect code for the candidate to fix, as described in the README.
-                2. Create a `tests/` folder with valid test files (e.g. `tests/test_task.py`) that will verify the correct solution.
-                
-                Return a JSON object with the list of files (excluding README.md).
-                """
-
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=[impl_prompt],
-                    config=types.GenerateContentConfig(
-                        response_mime_type="application/json", 
-                        response_schema=TaskImplementation,
-                        safety_settings=[
-                            types.SafetySetting(
-                                category="HARM_CATEGORY_DANGEROUS_CONTENT",
-                                threshold="BLOCK_NONE"
-                            ),
-                            types.SafetySetting(
-                                category="HARM_CATEGORY_HATE_SPEECH",
-                                threshold="BLOCK_NONE"
-                            ),
-                            types.SafetySetting(
-                                category="HARM_CATEGORY_HARASSMENT",
-                                threshold="BLOCK_NONE"
-                            ),
-                            types.SafetySetting(
-                                category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                                threshold="BLOCK_NONE"
-                            ),
-                        ]
-                    ),
-                )
-                
-                if response.parsed:
-                    task_impl = response.parsed
-                    for file_obj in task_impl.files:
-                        file_path = f"{folder_name}/{file_obj.filename}"
-                        yield {"type": "file", "path": file_path, "content": file_obj.content}
-                else:
-                    msg = f"Failed to generate code for task {task.name}. Response: {response}"
-                    print(msg)
-                    yield {"type": "log", "message": f"Error: {msg}"}
 
-            except Exception as e:
-                msg = f"Exception for task {task.name}. Error: {e}"
+            response = await self.llm.generate(
+                operation="implementation",
+                model=self.model_name,
+                contents=[impl_prompt],
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json", 
+                    response_schema=TaskImplementation,
+                    safety_settings=_SAFETY_SETTINGS,
+                ),
+            )
+            
+            if response.parsed:
+                artifact, messages = await self._avalidate_artifact(task, TaskArtifact(readme=readme_content, files=response.parsed.files))
+                for message in messages:
+                    yield {"type": "log", "message": f"[{i+1}/{n_tasks}] {message}"}
+                for file_obj in artifact.files:
+                    file_path = f"{folder_name}/{file_obj.filename}"
+                    yield {"type": "file", "path": file_path, "content": file_obj.content}
+                if cache_key is not None:
+                    await asyncio.to_thread(self.cache.put, cache_key, artifact)
+            else:
+                msg = f"Failed to generate code for task {task.name}. Response: {response}"
                 print(msg)
-                import traceback
-                traceback.print_exc()
                 yield {"type": "log", "message": f"Error: {msg}"}
+
+        except Exception as e:
+            msg = f"Exception for task {task.name}. Error: {e}"
+            print(msg)
+            import traceback
+            traceback.print_exc()
+            yield {"type": "log", "message": f"Error: {msg}"}
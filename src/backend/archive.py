@@ -0,0 +1,111 @@
+import asyncio
+import os
+import zipfile
+from typing import Iterable, Iterator
+
+ZIP_FILENAME = "kata_repo.zip"
+
+class ZipStreamWriter:
+    """
+    Builds a zip on disk while the repo is still being generated. Each file is
+    deflated on a worker thread as soon as it arrives, one write at a time, so
+    the event loop keeps streaming events and only the central directory is left
+    to write at the end. The archive is written under a temporary name and only
+    replaces `path` once it is complete. A file added twice keeps its last
+    version, like the repo dict it mirrors; since written entries cannot be
+    replaced in place, the archive is rewritten once on close if that happened.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = f"{path}.{os.getpid()}.{id(self)}.tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._zip = zipfile.ZipFile(self._tmp_path, "w", zipfile.ZIP_DEFLATED)
+        self._names: set[str] = set()
+        self._replaced: dict[str, str] = {}
+        self._last: asyncio.Task | None = None
+
+    def add(self, name: str, content: str):
+        """Queues a file for compression without waiting for it."""
+        if name in self._names:
+            self._replaced[name] = content
+            return
+        self._names.add(name)
+        previous = self._last
+
+        async def write():
+            if previous is not None:
+                await previous
+            await asyncio.to_thread(self._zip.writestr, name, content)
+
+        self._last = asyncio.create_task(write())
+
+    async def close(self) -> str:
+        if self._last is not None:
+            await self._last
+        await asyncio.to_thread(self._zip.close)
+        if self._replaced:
+            await asyncio.to_thread(self._rewrite)
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def _rewrite(self):
+        """Copies the archive, swapping in the last version of each file added twice."""
+        rewritten = f"{self._tmp_path}.rewrite"
+        try:
+            with zipfile.ZipFile(self._tmp_path) as source, zipfile.ZipFile(rewritten, "w", zipfile.ZIP_DEFLATED) as target:
+                for info in source.infolist():
+                    if info.filename in self._replaced:
+                        target.writestr(info.filename, self._replaced[info.filename])
+                    else:
+                        target.writestr(info, source.read(info))
+            os.replace(rewritten, self._tmp_path)
+        except BaseException:
+            try:
+                os.remove(rewritten)
+            except OSError:
+                pass
+            raise
+
+    async def abort(self):
+        if self._last is not None:
+            self._last.cancel()
+            await asyncio.gather(self._last, return_exceptions=True)
+        await asyncio.to_thread(self._zip.close)
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+class _ChunkSink:
+    """Write-only file object collecting what zipfile writes between yields."""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def iter_zip(files: Iterable[tuple[str, str]]) -> Iterator[bytes]:
+    """
+    Yields a zip of `files` piece by piece without staging it on disk or holding
+    the whole archive in memory. The sink is not seekable, so zipfile writes
+    sizes in data descriptors after each entry.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+            if data := sink.drain():
+                yield data
+    if data := sink.drain():
+        yield data
@@ -0,0 +1,160 @@
+"""
+Batch kata generation for a cohort of candidates against one company pack.
+
+The company is extracted once and shared; candidate profiles are extracted in
+parallel, and planning and building run under a global concurrency cap. Each
+candidate gets its own zip and the run writes a JSON report with per-stage
+timings:
+
+    uv run -m src.backend.batch case-studies/nebula_junior_dev/company \
+        case-studies/nebula_junior_dev case-studies/biohelix_senior_ml --output-dir cohort
+
+Candidate paths are either a folder of documents or a case-study folder with a
+`candidate/` subfolder.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from src.backend.builder import KataBuilder
+from src.backend.models import CompanyInfo
+from src.backend.summariser import Summariser
+from src.backend.summariser.loaders import DocumentLoader
+from src.backend.summariser.preprocess import preprocess_documents
+
+REPORT_FILENAME = "report.json"
+
+def candidate_documents_dir(path: str) -> str:
+    candidate_dir = os.path.join(path, "candidate")
+    return candidate_dir if os.path.isdir(candidate_dir) else path
+
+def candidate_names(paths: list[str]) -> list[str]:
+    """
+    Names candidates after their folder (the case study for `<name>/candidate`),
+    numbering repeats so every candidate gets its own output folder.
+    """
+    names = []
+    seen: dict[str, int] = {}
+    for path in paths:
+        path = os.path.normpath(path)
+        if os.path.basename(path) == "candidate":
+            path = os.path.dirname(path)
+        base = os.path.basename(path)
+        seen[base] = seen.get(base, 0) + 1
+        names.append(base if seen[base] == 1 else f"{base}_{seen[base]}")
+    return names
+
+def load_documents(directory: str) -> list[str]:
+    documents = DocumentLoader().load_directory(directory)
+    if not documents:
+        raise ValueError(f"No readable documents in {directory}")
+    documents, _ = preprocess_documents(documents)
+    return documents
+
+async def build_candidate(name: str, path: str, company: CompanyInfo, company_docs: list[str], output_dir: str, semaphore: asyncio.Semaphore, n_tasks: int, summariser_llm: str, agent_llm: str) -> dict:
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+    result = {"name": name, "path": path, "status": "failed", "error": None, "zip_path": None, "files": 0, "timings": timings}
+    try:
+        t0 = time.perf_counter()
+        employee_docs = await asyncio.to_thread(load_documents, candidate_documents_dir(path))
+        builder = KataBuilder(
+            docs=company_docs,
+            employee_docs=employee_docs,
+            summariser_llm=summariser_llm,
+            agent_llm=agent_llm,
+            output_dir=os.path.join(output_dir, name),
+            n_tasks=n_tasks,
+        )
+        # The company pack is shared by the whole cohort and was extracted once up front
+        builder.data = company
+        await builder._aparse_employee_data()
+        timings["extract"] = time.perf_counter() - t0
+
+        async with semaphore:
+            t0 = time.perf_counter()
+            await builder._aplan_repo()
+            timings["plan"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            errors = [event["message"] async for event in builder._abuild_repo() if event["type"] == "log" and event["message"].startswith("Error:")]
+            timings["build"] = time.perf_counter() - t0
+
+        result.update(status="partial" if errors else "ok", error="; ".join(errors) or None, zip_path=builder.zip_path, files=len(builder.repo))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    timings["total"] = time.perf_counter() - start
+    return result
+
+async def run_batch(company_dir: str, candidate_paths: list[str], output_dir: str, concurrency: int = 4, n_tasks: int = 3, summariser_llm: str = "gemini-2.5-flash", agent_llm: str = "gemini-2.5-flash") -> dict:
+    """
+    Generates one kata per candidate and returns the report (also written to
+    `output_dir/report.json`).
+
+    Args:
+        concurrency: Maximum number of candidates planning or building at the same time.
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+
+    t0 = time.perf_counter()
+    company_docs = await asyncio.to_thread(load_documents, company_dir)
+    company = await Summariser(model_name=summariser_llm).arun(company_docs)
+    company_seconds = time.perf_counter() - t0
+
+    semaphore = asyncio.Semaphore(concurrency)
+    names = candidate_names(candidate_paths)
+    candidates = await asyncio.gather(*(
+        build_candidate(name, path, company, company_docs, output_dir, semaphore, n_tasks, summariser_llm, agent_llm)
+        for name, path in zip(names, candidate_paths)
+    ))
+
+    report = {
+        "company_dir": company_dir,
+        "company_extract_seconds": company_seconds,
+        "concurrency": concurrency,
+        "n_tasks": n_tasks,
+        "wall_seconds": time.perf_counter() - start,
+        "succeeded": sum(1 for c in candidates if c["status"] == "ok"),
+        "partial": sum(1 for c in candidates if c["status"] == "partial"),
+        "failed": sum(1 for c in candidates if c["status"] == "failed"),
+        "candidates": candidates,
+    }
+    with open(os.path.join(output_dir, REPORT_FILENAME), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Generate katas for many candidates against one company pack")
+    parser.add_argument("company_dir", help="Directory containing the company documents")
+    parser.add_argument("candidates", nargs="+", help="Candidate document folders, or case-study folders with a candidate/ subfolder")
+    parser.add_argument("--output-dir", default="batch", help="Where per-candidate zips and report.json are written")
+    parser.add_argument("--concurrency", type=int, default=4, help="Candidates planned and built at the same time")
+    parser.add_argument("--n-tasks", type=int, default=3, help="Tasks per kata")
+    parser.add_argument("--summariser-llm", default="gemini-2.5-flash")
+    parser.add_argument("--agent-llm", default="gemini-2.5-flash")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_batch(
+        args.company_dir,
+        args.candidates,
+        args.output_dir,
+        concurrency=args.concurrency,
+        n_tasks=args.n_tasks,
+        summariser_llm=args.summariser_llm,
+        agent_llm=args.agent_llm,
+    ))
+    for candidate in report["candidates"]:
+        total = candidate["timings"].get("total", 0.0)
+        detail = candidate["zip_path"] if candidate["status"] != "failed" else candidate["error"]
+        print(f"{candidate['name']:<30} {candidate['status']:<8} {total:7.1f}s  {detail}")
+    print(f"{report['succeeded']} ok, {report['partial']} partial, {report['failed']} failed in {report['wall_seconds']:.1f}s")
+    print(f"Report written to {os.path.join(args.output_dir, REPORT_FILENAME)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,30 @@
 from src.backend.agent import KataAgent
+from src.backend.archive import ZIP_FILENAME, ZipStreamWriter
 from src.backend.summariser import Summariser, EmployeeInfoExtractor
-from src.backend.models import CompanyInfo, EmployeeInfo
+from src.backend.summariser.chunking import TokenBudgetExceeded, estimate_tokens
+from src.backend.summariser.preprocess import combine_reports, preprocess_documents
+from src.backend.models import CompanyInfo, ContextDigest, EmployeeInfo, PreprocessingReport
+from src.backend.summariser.cache import ExtractionCache
+from src.backend.task_cache import task_cache
+import asyncio
 import os
 import zipfile
 
 class KataBuilder:
-    def __init__(self, docs: list[str], employee_docs: list[str], summariser_llm: str = "gemini-2.5-flash", agent_llm: str = "gemini-2.5-flash", output_dir: str = "downloads", n_tasks: int = 1):
+    def __init__(self, docs: list[str], employee_docs: list[str], summariser_llm: str = "gemini-2.5-flash", agent_llm: str = "gemini-2.5-flash", output_dir: str = "downloads", n_tasks: int = 1, task_concurrency: int = 4, max_input_tokens: int | None = None, cache: ExtractionCache | None = task_cache, task_batch_size: int = 1):
         self.summariser = Summariser(model_name=summariser_llm)
         self.employee_extractor = EmployeeInfoExtractor(model_name=summariser_llm)
-        self.agent = KataAgent(model_name=agent_llm, n_tasks=n_tasks)
+        self.agent = KataAgent(model_name=agent_llm, n_tasks=n_tasks, max_concurrency=task_concurrency, cache=cache, batch_size=task_batch_size)
         self.docs = docs
         self.employee_docs = employee_docs
         self.output_dir = output_dir
+        self.max_input_tokens = max_input_tokens
+        self.preprocessing: PreprocessingReport | None = None
         self.data: CompanyInfo | None = None
         self.employee_data: EmployeeInfo | None = None
         self.repo: dict[str, str] | None = None
+        # Session store revision this builder was loaded or last saved at; None until first saved
+        self.revision: int | None = None
 
     def _parse_data(self) -> CompanyInfo:
         self.data = self.summariser.run(self.docs)
@@ -24,27 +34,136 @@ class KataBuilder:
         self.employee_data = self.employee_extractor.run(self.employee_docs)
         return self.employee_data
 
-    def _plan_repo(self, feedback: str | None = None):
+    async def _aparse_data(self) -> CompanyInfo:
+        self.data = await self.summariser.arun(self.docs)
+        return self.data
+
+    async def _aparse_employee_data(self) -> EmployeeInfo:
+        self.employee_data = await self.employee_extractor.arun(self.employee_docs)
+        return self.employee_data
+
+    async def _apreprocess(self) -> PreprocessingReport:
+        """
+        Normalises both document sets and drops duplicate paragraphs before they
+        are sent for extraction. Runs once per builder.
+        """
+        if self.preprocessing is None:
+            (self.docs, company_report), (self.employee_docs, employee_report) = await asyncio.gather(
+                asyncio.to_thread(preprocess_documents, self.docs),
+                asyncio.to_thread(preprocess_documents, self.employee_docs),
+            )
+            self.preprocessing = combine_reports(company_report, employee_report)
+        return self.preprocessing
+
+    async def _aparse_inputs(self) -> tuple[CompanyInfo, EmployeeInfo]:
+        """
+        Extracts company and employee data concurrently. The two extractions are
+        independent, so if one side fails the other is cancelled and the raised
+        error names the side that failed.
+        """
+        await self._apreprocess()
+        self._check_token_budget()
+
+        async def extract(side: str, coro):
+            try:
+                return await coro
+            except Exception as e:
+                raise ValueError(f"{side} extraction failed: {e}") from e
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                company = tg.create_task(extract("Company", self._aparse_data()))
+                employee = tg.create_task(extract("Employee", self._aparse_employee_data()))
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0]
+        return company.result(), employee.result()
+
+    def _check_token_budget(self):
+        if self.max_input_tokens is None:
+            return
+        total_tokens = sum(estimate_tokens(doc) for doc in self.docs + self.employee_docs)
+        if total_tokens > self.max_input_tokens:
+            raise TokenBudgetExceeded(f"Uploaded documents are ~{total_tokens} tokens, over the {self.max_input_tokens} token session limit.")
+
+    def _check_parsed(self):
         if not self.data:
             raise ValueError("Company data not parsed yet. Call _parse_data() first.")
         if not self.employee_data:
             raise ValueError("Employee data not parsed yet. Call _parse_employee_data() first.")
+
+    def context_digest(self) -> ContextDigest:
+        """
+        The compact company/candidate brief the agent puts in every prompt,
+        computed once per parsed input and reused across plan, revise and build.
+        """
+        self._check_parsed()
+        return self.agent.context(self.data, self.employee_data)
+
+    def _plan_repo(self, feedback: str | None = None):
+        self._check_parsed()
         return self.agent.plan(company_data=self.data, employee_data=self.employee_data, feedback=feedback)
 
+    async def _aplan_repo(self, feedback: str | None = None):
+        self._check_parsed()
+        return await self.agent.aplan(company_data=self.data, employee_data=self.employee_data, feedback=feedback)
+
+    def _revise_plan(self, feedback: str, task_ids: list[str] | None = None):
+        self._check_parsed()
+        return self.agent.revise(company_data=self.data, employee_data=self.employee_data, feedback=feedback, task_ids=task_ids)
+
+    async def _arevise_plan(self, feedback: str, task_ids: list[str] | None = None):
+        self._check_parsed()
+        return await self.agent.arevise(company_data=self.data, employee_data=self.employee_data, feedback=feedback, task_ids=task_ids)
+
+    def speculate(self) -> int:
+        """
+        Starts generating the current plan's tasks in the background so a build
+        of an unchanged plan picks them up from the task cache.
+        """
+        self._check_parsed()
+        return self.agent.speculate(self.data, self.employee_data)
+
     def _build_repo(self):
-        if not self.data:
-            raise ValueError("Company data not parsed yet.")
-        if not self.employee_data:
-            raise ValueError("Employee data not parsed yet.")
-        
+        self._check_parsed()
+
         self.repo = {}
         generator = self.agent.run(company_data=self.data, employee_data=self.employee_data)
-        
+
         for event in generator:
             if event["type"] == "file":
-                self.repo[event["path"]] = event["content"]
+                self._add_file(event["path"], event["content"])
             yield event
 
+    async def _abuild_repo(self, ordered: bool | None = None):
+        """
+        Async counterpart of `_build_repo` that also writes the zip as files
+        arrive, so it is ready as soon as the last task lands.
+        """
+        self._check_parsed()
+
+        self.repo = {}
+        writer = ZipStreamWriter(self.zip_path)
+        try:
+            async for event in self.agent.arun(company_data=self.data, employee_data=self.employee_data, ordered=ordered):
+                if event["type"] == "file":
+                    self._add_file(event["path"], event["content"])
+                    writer.add(event["path"], event["content"])
+                yield event
+        except BaseException:
+            await writer.abort()
+            raise
+        await writer.close()
+
+    def _add_file(self, path: str, content: str):
+        # Last version wins, in the repo and in the zip alike
+        if path in self.repo:
+            print(f"File {path} was generated twice; keeping the later version")
+        self.repo[path] = content
+
+    @property
+    def zip_path(self) -> str:
+        return os.path.join(self.output_dir, ZIP_FILENAME)
+
     def _output_repo(self) -> str:
         """
         Saves the repo as a .zip file and returns the path to the zip file.
@@ -55,9 +174,7 @@ class KataBuilder:
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
-        # Create zip in memory first or directly write
-        zip_filename = "kata_repo.zip"
-        zip_path = os.path.join(self.output_dir, zip_filename)
+        zip_path = self.zip_path
 
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
             for file_path, content in self.repo.items():
@@ -69,8 +186,7 @@ class KataBuilder:
         """
         Run the full pipeline non-interactively (for testing or batch)
         """
-        self._parse_data()
-        self._parse_employee_data()
+        asyncio.run(self._aparse_inputs())
         self._plan_repo()
         for _ in self._build_repo():
             pass  # Consume generator
@@ -3,4 +3,12 @@ from dotenv import load_dotenv
 import os
 load_dotenv()
 
-google_client = genai.Client(api_key=os.environ.get("GOOGLE_API_KEY"))
\ No newline at end of file
+# KATALAB_LLM_BACKEND=fake swaps Gemini for a deterministic offline stand-in (tests, benchmarks)
+if os.environ.get("KATALAB_LLM_BACKEND", "gemini") == "fake":
+    from src.backend.fake_client import FakeGenAIClient
+    google_client = FakeGenAIClient(
+        latency=float(os.environ.get("KATALAB_FAKE_LATENCY", "0.5")),
+        jitter=float(os.environ.get("KATALAB_FAKE_JITTER", "0.2")),
+    )
+else:
+    google_client = genai.Client(api_key=os.environ.get("GOOGLE_API_KEY"))
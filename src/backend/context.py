@@ -0,0 +1,72 @@
+from src.backend.models import CompanyInfo, ContextDigest, EmployeeInfo, ProductOrClient, Role, Team
+from src.backend.summariser.chunking import estimate_tokens
+
+def _terms(values: list[str] | None) -> set[str]:
+    return {value.strip().lower() for value in values or [] if value.strip()}
+
+def _clip(text: str | None, max_chars: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= max_chars else text[:max_chars - 3].rstrip() + "..."
+
+def _products(items: list[ProductOrClient] | None, max_chars: int) -> list[str]:
+    return [f"{item.name} ({item.type}): {_clip(item.description, max_chars)}" for item in items or []]
+
+def _relevant_roles(company_data: CompanyInfo, stack: set[str], max_roles: int) -> list[Role]:
+    # Roles sharing the most technologies with the candidate; every role scores zero on a mismatch
+    ranked = sorted(company_data.roles, key=lambda role: len(_terms(role.stack) & stack), reverse=True)
+    return ranked[:max_roles]
+
+def _relevant_teams(company_data: CompanyInfo, roles: list[Role], stack: set[str], max_teams: int) -> list[Team]:
+    role_teams = {role.team.name for role in roles if role.team}
+    teams = {team.name: team for team in company_data.teams}
+    for role in roles:
+        if role.team and role.team.name not in teams:
+            teams[role.team.name] = role.team
+    ranked = sorted(
+        teams.values(),
+        key=lambda team: (team.name in role_teams, len(_terms(team.tools_used) & stack)),
+        reverse=True,
+    )
+    return ranked[:max_teams]
+
+def build_context_digest(company_data: CompanyInfo, employee_data: EmployeeInfo, max_roles: int = 2, max_teams: int = 2, max_chars: int = 400) -> ContextDigest:
+    """
+    Renders the company and candidate profile as a short plain-text brief for
+    agent prompts. Only the roles and teams closest to the candidate's stack are
+    kept, and long free-text fields are clipped to `max_chars`.
+    """
+    stack = _terms(employee_data.stack)
+    roles = _relevant_roles(company_data, stack, max_roles)
+    teams = _relevant_teams(company_data, roles, stack, max_teams)
+
+    lines = [
+        f"Candidate: {employee_data.level}, {employee_data.experience_yrs} years of experience",
+        f"Candidate stack: {', '.join(employee_data.stack)}",
+        f"Learning style: {_clip(employee_data.likely_learning_style, max_chars)}",
+        "",
+        f"Company philosophy: {_clip(company_data.philosophy, max_chars)}",
+    ]
+
+    lines.append("Relevant roles:")
+    for role in roles:
+        team = f" [{role.team.name}]" if role.team else ""
+        lines.append(f"- {role.title}{team} ({', '.join(role.stack)}): {_clip(role.requirements, max_chars)}")
+
+    lines.append("Relevant teams:")
+    for team in teams:
+        lines.append(f"- {team.name} ({team.size} people): {_clip(team.context, max_chars)}")
+        if team.tools_used:
+            lines.append(f"  Tools: {', '.join(team.tools_used)}")
+        if team.philosophy:
+            lines.append(f"  Principles: {', '.join(team.philosophy)}")
+        for product in _products(team.products, max_chars) + _products(team.clients, max_chars):
+            lines.append(f"  Works on: {product}")
+
+    company_products = _products(company_data.products, max_chars) + _products(company_data.clients, max_chars)
+    if company_products:
+        lines.append("Company products and clients:")
+        lines.extend(f"- {product}" for product in company_products)
+
+    text = "\n".join(lines)
+    full_tokens = estimate_tokens(company_data.model_dump_json(indent=2)) + estimate_tokens(employee_data.model_dump_json(indent=2))
+    return ContextDigest(text=text, tokens=estimate_tokens(text), full_tokens=full_tokens)
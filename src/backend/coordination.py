@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import threading
+import time
+
+COORDINATION_DB = "coordination.db"
+
+class LeaseStore:
+    """
+    Named, expiring leases in a SQLite database shared by every worker process
+    on the node. A lease is held by one owner until it is released or its
+    holder stops renewing it, so a crashed worker never blocks others for
+    longer than the lease TTL.
+    """
+
+    def __init__(self, path: str = COORDINATION_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, name: str, owner: str, ttl: float) -> str:
+        """
+        Takes the lease if it is free, expired or already ours, and returns the
+        owner it ended up with; the caller holds the lease if that is `owner`.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+                (name, owner, now + ttl, now),
+            )
+            (holder,) = conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+        return holder
+
+    def renew(self, name: str, owner: str, ttl: float) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE name = ? AND owner = ?",
+                (time.time() + ttl, name, owner),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, name: str, owner: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def owner(self, name: str) -> str | None:
+        row = self._connect().execute(
+            "SELECT owner FROM leases WHERE name = ? AND expires_at >= ?", (name, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+def leases_from_env() -> LeaseStore | None:
+    """
+    The lease store named by KATALAB_COORDINATION_DB, or None when it is unset,
+    i.e. a single worker process that has nobody to coordinate with.
+    """
+    path = os.environ.get("KATALAB_COORDINATION_DB")
+    return LeaseStore(path) if path else None
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import random
+import re
+import time
+import types as pytypes
+import typing
+from typing import Any, Literal, get_args, get_origin
+
+from annotated_types import MaxLen, MinLen
+from pydantic import BaseModel
+
+from src.backend.models import BatchedTask, PlanRevision, TaskBatch, TaskImplementation
+
+class FakeUsage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+class FakeResponse:
+    """Mimics the parts of `GenerateContentResponse` the app reads."""
+
+    def __init__(self, text: str, parsed: BaseModel | None, prompt_tokens: int):
+        self.text = text
+        self.parsed = parsed
+        self.usage_metadata = FakeUsage(prompt_tokens, max(1, len(text) // 4))
+
+def _prompt_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(str(part) for part in contents)
+
+def _seed(model: str, prompt: str) -> int:
+    return int.from_bytes(hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).digest()[:8], "big")
+
+def _list_bounds(metadata) -> tuple[int, int | None]:
+    min_length, max_length = 0, None
+    for constraint in metadata:
+        if isinstance(constraint, MinLen):
+            min_length = constraint.min_length
+        elif isinstance(constraint, MaxLen):
+            max_length = constraint.max_length
+    return min_length, max_length
+
+def _fake_value(annotation: Any, name: str, index: int, metadata=()) -> Any:
+    origin = get_origin(annotation)
+    if origin in (typing.Union, pytypes.UnionType):
+        inner = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return _fake_value(inner[0], name, index, metadata)
+    if origin is Literal:
+        return get_args(annotation)[0]
+    if origin is list:
+        min_length, max_length = _list_bounds(metadata)
+        length = max(min_length, 2)
+        if max_length is not None:
+            length = min(length, max_length)
+        (item_type,) = get_args(annotation)
+        return [_fake_value(item_type, name, i) for i in range(length)]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return fake_instance(annotation, index)
+    if annotation is int:
+        return 3
+    if annotation is float:
+        return 1.0
+    if annotation is bool:
+        return True
+    if name == "id":
+        return f"task_{index + 1}"
+    return f"{name.replace('_', ' ')} {index + 1}"
+
+def _fake_task_implementation() -> TaskImplementation:
+    return TaskImplementation(files=[
+        {"filename": "main.py", "content": "def solve(values):\n    raise NotImplementedError\n"},
+        {"filename": "tests/test_task.py", "content": "from main import solve\n\n\ndef test_solve():\n    assert solve([1, 2]) == 3\n"},
+    ])
+
+def fake_instance(model: type[BaseModel], index: int = 0) -> BaseModel:
+    """
+    Builds a schema-valid instance of any response model, honouring list
+    length constraints (e.g. the exact task count of the dynamic KataPlan).
+    """
+    if model is TaskImplementation:
+        return _fake_task_implementation()
+    values = {
+        name: _fake_value(field.annotation, name, index, field.metadata)
+        for name, field in model.model_fields.items()
+    }
+    return model.model_validate(values)
+
+def _fake_task_batch(prompt: str) -> TaskBatch:
+    """Answers a batched generation prompt with one task per `Task id:` line, echoing the ids."""
+    task_ids = [line.split(":", 1)[1].strip() for line in prompt.splitlines() if line.strip().startswith("- Task id:")]
+    return TaskBatch(tasks=[
+        BatchedTask(task_id=task_id, readme=f"# {task_id}\n\nImplement `solve` in `main.py` so that the tests in `tests/` pass.\n", implementation=_fake_task_implementation())
+        for task_id in task_ids
+    ])
+
+def _fake_plan_revision(prompt: str) -> PlanRevision:
+    """Answers a revision prompt with tasks that keep ids from the current plan, as the prompt asks."""
+    plan_ids = set(re.findall(r'"id": "([^"]+)"', prompt))
+    revision = fake_instance(PlanRevision)
+    return revision.model_copy(update={"tasks": [task for task in revision.tasks if task.id in plan_ids]})
+
+def _fake_readme(prompt: str) -> str:
+    name = next((line.split(":", 1)[1].strip() for line in prompt.splitlines() if line.strip().startswith("Name:")), "Task")
+    return f"# {name}\n\nImplement `solve` in `main.py` so that the tests in `tests/` pass.\n"
+
+# Share of a streamed call's latency spent before the first chunk
+FIRST_CHUNK_FRACTION = 0.2
+STREAM_CHUNK_CHARS = 32
+
+def _stream_plan(response: FakeResponse, delay: float) -> list[tuple[float, FakeResponse]]:
+    """Splits a response into (sleep before, chunk) pairs that add up to `delay`."""
+    texts = [response.text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(response.text), STREAM_CHUNK_CHARS)]
+    gap = delay * (1 - FIRST_CHUNK_FRACTION) / max(1, len(texts) - 1)
+    prompt_tokens = response.usage_metadata.prompt_token_count
+    return [
+        (delay * FIRST_CHUNK_FRACTION if i == 0 else gap, FakeResponse(text, None, prompt_tokens))
+        for i, text in enumerate(texts)
+    ]
+
+class FakeModels:
+    """
+    Deterministic offline stand-in for `client.models`. Responses depend only on
+    the model and prompt; latency is `latency` seconds plus up to `jitter`
+    seconds of seeded noise. Streamed responses deliver their first chunk after
+    a fifth of that latency and spread the rest across the remaining chunks.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+
+    def _delay(self, model: str, prompt: str) -> float:
+        return self.latency + random.Random(_seed(model, prompt)).uniform(0, self.jitter)
+
+    def _respond(self, model: str, contents, config) -> FakeResponse:
+        self.calls += 1
+        prompt = _prompt_text(contents)
+        schema = getattr(config, "response_schema", None) if config is not None else None
+        if schema is TaskBatch:
+            parsed = _fake_task_batch(prompt)
+            return FakeResponse(parsed.model_dump_json(), parsed, len(prompt) // 4)
+        if schema is PlanRevision:
+            parsed = _fake_plan_revision(prompt)
+            return FakeResponse(parsed.model_dump_json(), parsed, len(prompt) // 4)
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            parsed = fake_instance(schema)
+            return FakeResponse(parsed.model_dump_json(), parsed, len(prompt) // 4)
+        return FakeResponse(_fake_readme(prompt), None, len(prompt) // 4)
+
+    def generate_content(self, *, model: str, contents, config=None) -> FakeResponse:
+        time.sleep(self._delay(model, _prompt_text(contents)))
+        return self._respond(model, contents, config)
+
+    def generate_content_stream(self, *, model: str, contents, config=None):
+        delay = self._delay(model, _prompt_text(contents))
+        for sleep, chunk in _stream_plan(self._respond(model, contents, config), delay):
+            time.sleep(sleep)
+            yield chunk
+
+class FakeAsyncModels:
+    def __init__(self, models: FakeModels):
+        self._models = models
+
+    async def generate_content(self, *, model: str, contents, config=None) -> FakeResponse:
+        await asyncio.sleep(self._models._delay(model, _prompt_text(contents)))
+        return self._models._respond(model, contents, config)
+
+    async def generate_content_stream(self, *, model: str, contents, config=None):
+        delay = self._models._delay(model, _prompt_text(contents))
+        plan = _stream_plan(self._models._respond(model, contents, config), delay)
+
+        async def chunks():
+            for sleep, chunk in plan:
+                await asyncio.sleep(sleep)
+                yield chunk
+        return chunks()
+
+class FakeGenAIClient:
+    """Drop-in replacement for `genai.Client` used for offline runs and benchmarks."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.models = FakeModels(latency=latency, jitter=jitter)
+        self.aio = pytypes.SimpleNamespace(models=FakeAsyncModels(self.models))
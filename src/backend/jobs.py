@@ -0,0 +1,344 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Callable
+
+from src.backend.builder import KataBuilder
+from src.backend.coordination import LeaseStore
+from src.backend.llm import current_session
+from src.backend.metrics import registry
+from src.backend.session_store import SessionStore
+
+JOB_DIR = "jobs"
+
+registry.describe("katalab_build_jobs_total", "counter", "Build jobs by final status")
+registry.describe("katalab_build_job_seconds", "histogram", "Wall time of build jobs, from submission to completion")
+
+class BuildJob:
+    """
+    One build of one session. Every event the build produces is appended to an
+    in-memory list and to an NDJSON log on disk, so readers can join at any
+    point and resume from the index of the last event they saw. The log is
+    written from a worker thread, so a slow disk never stalls the event loop.
+    """
+
+    def __init__(self, job_id: str, session_id: str, log_path: str, status: str = "queued"):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.log_path = log_path
+        self.status = status
+        self.submitted_at = time.monotonic()
+        self.events: list[dict] = []
+        self._changed = asyncio.Event()
+        # Log lines not yet written, and the task writing them
+        self._pending: list[str] = []
+        self._writer: asyncio.Task | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in ("queued", "running")
+
+    def append(self, event: dict):
+        self._pending.append(json.dumps(event) + "\n")
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write())
+        self.events.append(event)
+        self._notify()
+
+    def start_log(self, event: dict):
+        """
+        Writes the job's first event straight to disk, so other workers can look
+        the job up as soon as it is submitted.
+        """
+        self._write_lines([json.dumps(event) + "\n"])
+        self.events.append(event)
+
+    async def _write(self):
+        # Events appended while a batch is being written go out in the next one
+        while self._pending:
+            lines, self._pending = self._pending, []
+            await asyncio.to_thread(self._write_lines, lines)
+
+    def _write_lines(self, lines: list[str]):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def flush(self):
+        """Waits until every appended event is in the log."""
+        if self._writer is not None:
+            await self._writer
+
+    def finish(self, status: str):
+        self.status = status
+        self._notify()
+
+    def _notify(self):
+        # Wake current readers and hand later ones a fresh event to wait on
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self, since: int = 0):
+        """Yields events from index `since`, waiting for new ones until the job ends."""
+        index = max(0, since)
+        while True:
+            changed = self._changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+    @classmethod
+    def load(cls, job_id: str, log_path: str) -> "BuildJob":
+        """Rebuilds a job from its log, e.g. after the process restarted."""
+        with open(log_path, "r", encoding="utf-8") as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        # A log without a terminal event belongs to a build that died with its process
+        job = cls(job_id, events[0].get("session_id", "") if events else "", log_path, status=_terminal_status(events, "interrupted"))
+        job.events = events
+        return job
+
+def _terminal_status(events: list[dict], default: str) -> str:
+    last = events[-1]["type"] if events else None
+    return {"complete": "done", "error": "failed"}.get(last, default)
+
+class RemoteBuildJob(BuildJob):
+    """
+    A build running in another worker process. Its events are read by tailing
+    that worker's log, until a terminal event appears or the worker stops
+    renewing its lease (in which case the build died with it).
+    """
+
+    poll_interval = 0.2
+
+    def __init__(self, job_id: str, session_id: str, log_path: str, leases: LeaseStore, lease: str):
+        super().__init__(job_id, session_id, log_path, status="running")
+        self.leases = leases
+        self.lease = lease
+        self._offset = 0
+
+    def _read(self):
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Only consume complete lines; the writer may be midway through one
+        complete = data[: data.rfind("\n") + 1]
+        self._offset += len(complete.encode("utf-8"))
+        self.events.extend(json.loads(line) for line in complete.splitlines() if line.strip())
+        if not self.session_id and self.events:
+            self.session_id = self.events[0].get("session_id", "")
+
+    def refresh(self):
+        """Reads events appended to the log since the last refresh and updates the status."""
+        self._read()
+        status = _terminal_status(self.events, "running")
+        if status == "running" and self.leases.owner(self.lease) != self.job_id:
+            # The lease went away: the build either just finished or died with its worker
+            self._read()
+            status = _terminal_status(self.events, "interrupted")
+        if status != "running":
+            self.finish(status)
+
+    async def follow(self, since: int = 0):
+        index = max(0, since)
+        while True:
+            await asyncio.to_thread(self.refresh)
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+class JobManager:
+    """
+    Local build queue: jobs are run by a fixed pool of worker tasks, at most one
+    queued or running job per session (a second submit joins the first), and
+    builds keep running when the client that started them disconnects.
+    Finished jobs are not kept in memory; lookups replay them from their logs.
+
+    With `leases`, several worker processes sharing `directory` also agree on
+    one build per session: the process that queues it holds the session's
+    lease for as long as the job lives, and a submit or lookup in any other
+    process follows that job's log instead of starting another build.
+
+    Args:
+        workers: Number of builds run at the same time.
+        directory: Where per-job event logs are written.
+        leases: Lease store shared by every worker process, if more than one.
+        lease_ttl: Seconds a build's lease outlives its last heartbeat.
+    """
+
+    def __init__(self, workers: int = 4, directory: str = JOB_DIR, leases: LeaseStore | None = None, lease_ttl: float = 30):
+        self.workers = workers
+        self.directory = directory
+        self.leases = leases
+        self.lease_ttl = lease_ttl
+        self.jobs: dict[str, BuildJob] = {}
+        # session id -> its queued or running job
+        self._active: dict[str, BuildJob] = {}
+        self._queue: asyncio.Queue | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._workers: list[asyncio.Task] = []
+        self._heartbeats: dict[str, asyncio.Task] = {}
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Queues and tasks belong to one event loop; start a fresh pool on a new one
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, session_id: str, builder: KataBuilder, save: Callable[[str, KataBuilder], None], ordered: bool | None = None) -> BuildJob:
+        """
+        Queues a build of `builder` and returns its job, or the session's job that
+        is already queued or running. `save` persists the session once the build
+        has finished.
+        """
+        active = self._active.get(session_id)
+        if active is not None and not active.finished:
+            registry.inc("katalab_singleflight_coalesced_total", {"operation": "build"})
+            return active
+
+        self._ensure_workers()
+        os.makedirs(self.directory, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        if self.leases is not None:
+            holder = self.leases.acquire(self._lease(session_id), job_id, self.lease_ttl)
+            if holder != job_id:
+                registry.inc("katalab_singleflight_coalesced_total", {"operation": "build"})
+                return RemoteBuildJob(holder, session_id, self._log_path(holder), self.leases, self._lease(session_id))
+            self._heartbeats[job_id] = asyncio.get_running_loop().create_task(self._heartbeat(session_id, job_id))
+
+        job = BuildJob(job_id, session_id, self._log_path(job_id))
+        job.start_log({"type": "log", "message": "Build queued", "session_id": session_id})
+        self.jobs[job_id] = job
+        self._active[session_id] = job
+        self._queue.put_nowait((job, builder, save, ordered))
+        return job
+
+    @staticmethod
+    def _lease(session_id: str) -> str:
+        return f"build:{session_id}"
+
+    def _log_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.ndjson")
+
+    async def _heartbeat(self, session_id: str, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            if not await asyncio.to_thread(self.leases.renew, self._lease(session_id), job_id, self.lease_ttl):
+                print(f"Build job {job_id} lost its lease on session {session_id}")
+                return
+
+    def get(self, job_id: str) -> BuildJob | None:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        try:
+            SessionStore._check_id(job_id)
+        except ValueError:
+            return None
+        log_path = self._log_path(job_id)
+        if not os.path.exists(log_path):
+            return None
+        job = BuildJob.load(job_id, log_path)
+        # An unfinished log may belong to a build another worker is still running
+        if job.status == "interrupted" and self.leases is not None and self.leases.owner(self._lease(job.session_id)) == job_id:
+            remote = RemoteBuildJob(job_id, job.session_id, log_path, self.leases, self._lease(job.session_id))
+            remote.refresh()
+            return remote
+        return job
+
+    async def _worker(self):
+        while True:
+            job, builder, save, ordered = await self._queue.get()
+            try:
+                await self._run(job, builder, save, ordered)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: BuildJob, builder: KataBuilder, save: Callable[[str, KataBuilder], None], ordered: bool | None):
+        job.status = "running"
+        current_session.set(job.session_id)
+        # Stays "interrupted" if the worker is cancelled, e.g. on shutdown
+        status = "interrupted"
+        try:
+            async for event in builder._abuild_repo(ordered=ordered):
+                job.append(event)
+            # Serialising and writing the session blocks; keep it off the event loop
+            await asyncio.to_thread(save, job.session_id, builder)
+            job.append({"type": "complete", "download_url": f"/api/download/{job.session_id}"})
+            status = "done"
+        except Exception as e:
+            print(f"Error in build job {job.job_id}: {e}")
+            import traceback
+            traceback.print_exc()
+            job.append({"type": "error", "message": str(e)})
+            status = "failed"
+        finally:
+            if self._active.get(job.session_id) is job:
+                del self._active[job.session_id]
+            try:
+                # Other workers read the log once the lease is gone, so it must be complete by then
+                await job.flush()
+            except OSError as e:
+                print(f"Failed to write the log of build job {job.job_id}: {e}")
+            heartbeat = self._heartbeats.pop(job.job_id, None)
+            if heartbeat is not None:
+                heartbeat.cancel()
+                self.leases.release(self._lease(job.session_id), job.job_id)
+            job.finish(status)
+            # Current followers keep their reference; later lookups load the log
+            self.jobs.pop(job.job_id, None)
+        registry.inc("katalab_build_jobs_total", {"status": status})
+        registry.observe("katalab_build_job_seconds", time.monotonic() - job.submitted_at)
+
+    def is_active(self, session_id: str) -> bool:
+        job = self._active.get(session_id)
+        if job is not None and not job.finished:
+            return True
+        return self.leases is not None and self.leases.owner(self._lease(session_id)) is not None
+
+    def prune(self, older_than: float) -> int:
+        """
+        Deletes logs of finished jobs last written before `older_than` (a unix
+        time) and forgets those jobs. Returns how many logs were removed.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                job_id = entry.name[: -len(".ndjson")]
+                job = self.jobs.get(job_id)
+                if not entry.name.endswith(".ndjson") or (job is not None and not job.finished):
+                    continue
+                if entry.stat().st_mtime < older_than:
+                    os.remove(entry.path)
+                    self.jobs.pop(job_id, None)
+                    removed += 1
+        return removed
+
+    def stats(self) -> dict[str, int]:
+        queued = sum(1 for job in self._active.values() if job.status == "queued")
+        running = sum(1 for job in self._active.values() if job.status == "running")
+        return {"queued": queued, "running": running}
+
+# Leases are attached at app start-up, when running several workers
+job_manager = JobManager(workers=int(os.environ.get("KATALAB_BUILD_WORKERS", "4")))
+
+def _collect_job_stats():
+    stats = job_manager.stats()
+    for status in ("queued", "running"):
+        yield "katalab_build_jobs", "gauge", "Build jobs currently queued or running", {"status": status}, stats[status]
+
+registry.add_collector(_collect_job_stats)
@@ -0,0 +1,366 @@
+import asyncio
+import os
+import random
+import time
+import weakref
+from collections import deque
+from contextvars import ContextVar
+from typing import Any
+
+import httpx
+from google.genai import errors
+from pydantic import BaseModel
+
+from src.backend.metrics import registry
+
+# Set by the API handlers so every LLM call made while serving a request is attributed to its session
+current_session: ContextVar[str | None] = ContextVar("katalab_session", default=None)
+
+registry.describe("katalab_llm_calls_total", "counter", "LLM calls by operation, model, schema and outcome")
+registry.describe("katalab_llm_prompt_tokens_total", "counter", "Prompt tokens reported by the LLM")
+registry.describe("katalab_llm_response_tokens_total", "counter", "Response tokens reported by the LLM")
+registry.describe("katalab_llm_call_seconds", "histogram", "Wall time of LLM calls")
+registry.describe("katalab_llm_ttfb_seconds", "histogram", "Time until the first byte of an LLM response")
+registry.describe("katalab_llm_retries_total", "counter", "LLM calls retried, by reason")
+registry.describe("katalab_llm_hedges_total", "counter", "Hedged LLM requests sent after the p95 latency was exceeded")
+registry.describe("katalab_llm_rate_limit_wait_seconds", "histogram", "Time spent waiting for the per-model rate limiter")
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+class ResiliencePolicy(BaseModel):
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    attempt_timeout: float = 120.0
+    deadline: float = 300.0
+    retry_on_empty: bool = True
+    requests_per_minute: float = 300.0
+    burst: int = 10
+    max_concurrency: int = 16
+    hedge: bool = False
+    hedge_min_samples: int = 20
+
+default_policy = ResiliencePolicy(
+    requests_per_minute=float(os.environ.get("KATALAB_LLM_RPM", "300")),
+    max_concurrency=int(os.environ.get("KATALAB_LLM_CONCURRENCY", "16")),
+    hedge=os.environ.get("KATALAB_LLM_HEDGE", "0") == "1",
+)
+
+class LLMCall(BaseModel):
+    operation: str
+    model: str
+    schema_name: str | None = None
+    session_id: str | None = None
+    outcome: str
+    wall_seconds: float
+    ttfb_seconds: float | None = None
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    error: str | None = None
+
+# Most recent calls, newest last, for debugging slow builds
+recent_calls: deque[LLMCall] = deque(maxlen=1000)
+
+def _token_count(value: Any) -> int:
+    return value if isinstance(value, int) else 0
+
+def record_call(call: LLMCall):
+    recent_calls.append(call)
+    labels = {"operation": call.operation, "model": call.model}
+    registry.inc("katalab_llm_calls_total", {**labels, "schema": call.schema_name or "text", "outcome": call.outcome})
+    registry.inc("katalab_llm_prompt_tokens_total", labels, call.prompt_tokens)
+    registry.inc("katalab_llm_response_tokens_total", labels, call.response_tokens)
+    registry.observe("katalab_llm_call_seconds", call.wall_seconds, labels)
+    if call.ttfb_seconds is not None:
+        registry.observe("katalab_llm_ttfb_seconds", call.ttfb_seconds, labels)
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second up to `capacity`. Callers
+    wait until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class ModelLimiter:
+    """
+    Per-model rate limit, concurrency cap and recent latencies (for hedging).
+    """
+
+    def __init__(self, policy: ResiliencePolicy):
+        self.bucket = TokenBucket(policy.requests_per_minute / 60, policy.burst)
+        self.semaphore = asyncio.Semaphore(policy.max_concurrency)
+        self.latencies: dict[str, deque[float]] = {}
+
+    def observe(self, operation: str, seconds: float):
+        self.latencies.setdefault(operation, deque(maxlen=200)).append(seconds)
+
+    def p95(self, operation: str, min_samples: int) -> float | None:
+        samples = self.latencies.get(operation)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+# Limiters are shared by every LLMClient on the same event loop, keyed by model.
+# asyncio primitives cannot be shared across loops, so the limits only hold
+# within one loop: the API server runs on a single loop and is fully covered,
+# but every call to a sync wrapper (KataBuilder.run_pipeline, KataAgent.run,
+# ...) runs on a fresh asyncio.run loop and starts with fresh limits. Sync
+# callers running in parallel threads are therefore not limited against each
+# other; drive them from one loop (e.g. the batch CLI) to share the limits.
+_limiters: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, ModelLimiter]] = weakref.WeakKeyDictionary()
+
+def _limiter(model: str, policy: ResiliencePolicy) -> ModelLimiter:
+    per_loop = _limiters.setdefault(asyncio.get_running_loop(), {})
+    if model not in per_loop:
+        per_loop[model] = ModelLimiter(policy)
+    return per_loop[model]
+
+def _retry_reason(error: BaseException) -> str | None:
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    if isinstance(error, errors.APIError):
+        return str(error.code) if error.code in RETRYABLE_STATUS_CODES else None
+    if isinstance(error, (httpx.TransportError, ConnectionError)):
+        return "connection"
+    return None
+
+def _has_content(response, schema_name: str | None) -> bool:
+    return bool(response.parsed) if schema_name else bool(response.text)
+
+def _schema_name(config) -> str | None:
+    schema = getattr(config, "response_schema", None) if config is not None else None
+    return getattr(schema, "__name__", None)
+
+class LLMClient:
+    """
+    The single path through which the app talks to the LLM. Every attempt is
+    timed and recorded with its token usage, model, schema, session and outcome.
+
+    Calls are rate limited and concurrency capped per model, bounded by a
+    per-attempt timeout and an overall deadline, and retried with jittered
+    exponential backoff on retryable errors and on responses that could not be
+    parsed. With hedging enabled, a second request is raced against the first
+    once it is slower than the recent p95 for that operation.
+
+    Args:
+        client: A `genai.Client` (or the offline fake).
+        policy: Retry, rate limiting and hedging settings.
+    """
+
+    def __init__(self, client, policy: ResiliencePolicy | None = None):
+        self.client = client
+        self.policy = policy or default_policy
+
+    async def generate(self, *, operation: str, model: str, contents, config=None):
+        """
+        Calls `client.aio.models.generate_content` with retries. Returns the last
+        response even if it is still empty once retries are exhausted, so callers
+        keep deciding how to report unparseable output.
+        """
+        policy = self.policy
+        schema_name = _schema_name(config)
+        labels = {"operation": operation, "model": model}
+        start = time.monotonic()
+        attempt = 0
+        # Bounds the whole call: rate limit waits, attempts and backoff sleeps
+        async with asyncio.timeout(policy.deadline):
+            while True:
+                attempt += 1
+                delay = random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1)))
+                can_retry = attempt < policy.max_attempts and time.monotonic() - start + delay < policy.deadline
+                try:
+                    response = await self._hedged(operation, model, contents, config)
+                except Exception as e:
+                    reason = _retry_reason(e)
+                    if reason is None or not can_retry:
+                        raise
+                else:
+                    if _has_content(response, schema_name) or not policy.retry_on_empty or not can_retry:
+                        return response
+                    reason = "empty"
+                registry.inc("katalab_llm_retries_total", {**labels, "reason": reason})
+                await asyncio.sleep(delay)
+
+    async def _hedged(self, operation: str, model: str, contents, config):
+        policy = self.policy
+        threshold = _limiter(model, policy).p95(operation, policy.hedge_min_samples) if policy.hedge else None
+        if threshold is None:
+            return await self._attempt(operation, model, contents, config)
+
+        attempts = {asyncio.create_task(self._attempt(operation, model, contents, config))}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=threshold)
+            if not done:
+                registry.inc("katalab_llm_hedges_total", {"operation": operation, "model": model})
+                attempts.add(asyncio.create_task(self._attempt(operation, model, contents, config)))
+            first_error = None
+            pending = attempts
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in attempts:
+                task.cancel()
+            # Let the losers record their calls and release their slots before returning
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+    async def _attempt(self, operation: str, model: str, contents, config):
+        limiter = _limiter(model, self.policy)
+        waited = time.perf_counter()
+        await limiter.bucket.acquire()
+        async with limiter.semaphore:
+            registry.observe("katalab_llm_rate_limit_wait_seconds", time.perf_counter() - waited, {"model": model})
+            response, elapsed = await self._call(operation, model, contents, config)
+        limiter.observe(operation, elapsed)
+        return response
+
+    async def _call(self, operation: str, model: str, contents, config):
+        schema_name = _schema_name(config)
+        start = time.perf_counter()
+        response = None
+        error = None
+        # Covers BaseExceptions that are neither handled below nor a cancellation, e.g. KeyboardInterrupt
+        outcome = "error"
+        try:
+            # Inside the try, so the attempt timeout is told apart from a caller cancelling
+            async with asyncio.timeout(self.policy.attempt_timeout):
+                response = await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except TimeoutError:
+            outcome = "timeout"
+            error = f"attempt timed out after {self.policy.attempt_timeout:g}s"
+            raise
+        except Exception as e:
+            outcome = "error"
+            error = f"{type(e).__name__}: {e}"
+            raise
+        else:
+            if schema_name:
+                outcome = "ok" if response.parsed else "empty"
+            else:
+                outcome = "ok" if response.text else "empty"
+            return response, time.perf_counter() - start
+        finally:
+            elapsed = time.perf_counter() - start
+            usage = getattr(response, "usage_metadata", None)
+            record_call(LLMCall(
+                operation=operation,
+                model=model,
+                schema_name=schema_name,
+                session_id=current_session.get(),
+                outcome=outcome,
+                wall_seconds=elapsed,
+                # Non-streaming responses arrive in one piece
+                ttfb_seconds=elapsed if response is not None else None,
+                prompt_tokens=_token_count(getattr(usage, "prompt_token_count", None)),
+                response_tokens=_token_count(getattr(usage, "candidates_token_count", None)),
+                error=error,
+            ))
+
+    async def stream(self, *, operation: str, model: str, contents, config=None):
+        """
+        Yields text chunks from `client.aio.models.generate_content_stream` as they
+        arrive. A request is retried like `generate` until its first chunk; once
+        output has been handed to the caller, a failure is raised instead.
+        """
+        policy = self.policy
+        labels = {"operation": operation, "model": model}
+        start = time.monotonic()
+        # A timeout block cannot span the yields of a generator, so every wait is clamped to this instead
+        deadline_at = asyncio.get_running_loop().time() + policy.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            delay = random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1)))
+            can_retry = attempt < policy.max_attempts and time.monotonic() - start + delay < policy.deadline
+            received = False
+            try:
+                async for chunk in self._stream_attempt(operation, model, contents, config, deadline_at):
+                    received = True
+                    yield chunk
+            except Exception as e:
+                reason = _retry_reason(e)
+                if received or reason is None or not can_retry:
+                    raise
+            else:
+                if received or not policy.retry_on_empty or not can_retry:
+                    return
+                reason = "empty"
+            registry.inc("katalab_llm_retries_total", {**labels, "reason": reason})
+            await asyncio.sleep(delay)
+
+    async def _stream_attempt(self, operation: str, model: str, contents, config, deadline_at: float):
+        loop = asyncio.get_running_loop()
+        limiter = _limiter(model, self.policy)
+        waited = time.perf_counter()
+        async with asyncio.timeout_at(deadline_at):
+            await limiter.bucket.acquire()
+            await limiter.semaphore.acquire()
+        try:
+            registry.observe("katalab_llm_rate_limit_wait_seconds", time.perf_counter() - waited, {"model": model})
+            start = time.perf_counter()
+            ttfb = None
+            last = None
+            error = None
+            outcome = "cancelled"
+            try:
+                async with asyncio.timeout_at(min(loop.time() + self.policy.attempt_timeout, deadline_at)):
+                    chunks = await self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+                while True:
+                    # Each wait for the next chunk is bounded by the attempt timeout and the overall deadline
+                    async with asyncio.timeout_at(min(loop.time() + self.policy.attempt_timeout, deadline_at)):
+                        try:
+                            last = await anext(chunks)
+                        except StopAsyncIteration:
+                            break
+                    if last.text:
+                        if ttfb is None:
+                            ttfb = time.perf_counter() - start
+                        yield last.text
+                outcome = "ok" if ttfb is not None else "empty"
+            except TimeoutError:
+                outcome = "timeout"
+                error = "timed out waiting for the stream"
+                raise
+            except Exception as e:
+                outcome = "error"
+                error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                usage = getattr(last, "usage_metadata", None)
+                record_call(LLMCall(
+                    operation=operation,
+                    model=model,
+                    schema_name=_schema_name(config),
+                    session_id=current_session.get(),
+                    outcome=outcome,
+                    wall_seconds=time.perf_counter() - start,
+                    ttfb_seconds=ttfb,
+                    prompt_tokens=_token_count(getattr(usage, "prompt_token_count", None)),
+                    response_tokens=_token_count(getattr(usage, "candidates_token_count", None)),
+                    error=error,
+                ))
+        finally:
+            limiter.semaphore.release()
@@ -1,16 +1,82 @@
 from fastapi import FastAPI, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import uuid
 import os
-from typing import List, Optional
+from typing import List, Literal, Optional
 
+from src.backend.archive import ZIP_FILENAME, iter_zip
 from src.backend.builder import KataBuilder
-from src.backend.models import CompanyInfo, EmployeeInfo, KataPlan
+from src.backend.coordination import leases_from_env
+from src.backend.jobs import BuildJob, job_manager
+from src.backend.models import CompanyInfo, ContextDigest, EmployeeInfo, KataPlan, PlanVersion, PreprocessingReport, SkippedDocument
+from src.backend.agent import RevisionMismatch, UnknownTaskId
+from src.backend.summariser.loaders import MAX_REQUEST_BYTES, DocumentLoader
+from src.backend.summariser.chunking import TokenBudgetExceeded
+from src.backend.llm import current_session
+from src.backend.metrics import registry
+from src.backend.singleflight import flight_key, flights, normalise_text
+from src.backend.validation import shutdown_pool, warm_pool
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only needed when several worker processes share the session store
+    job_manager.leases = leases_from_env()
+    # Expired sessions, zips and build logs are swept in the background
+    sweeper = asyncio.create_task(RetentionSweeper(session_manager, job_manager, policy_from_env(), leases=job_manager.leases).run_forever())
+    # Validation workers take a moment to start; do it before the first build needs them
+    await warm_pool()
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        shutdown_pool()
+
+class RequestSizeLimit:
+    """
+    Rejects request bodies over `max_bytes` with 413 before they are spooled:
+    up front from Content-Length, or as soon as a streamed body crosses it.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                return await PlainTextResponse("Invalid Content-Length header", status_code=400)(scope, receive, send)
+            if declared > self.max_bytes:
+                response = PlainTextResponse(f"Request body exceeds {self.max_bytes} bytes", status_code=413)
+                return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {self.max_bytes} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+app = FastAPI(lifespan=lifespan)
+
+# Uploads are capped by the loader's request limit, plus headroom for multipart framing
+app.add_middleware(RequestSizeLimit, max_bytes=MAX_REQUEST_BYTES + 1024 * 1024)
 
 # Enable CORS for development
 app.add_middleware(
@@ -22,68 +88,78 @@ app.add_middleware(
 )
 
 # In-memory session store
-from src.backend.sessions import session_manager
+from src.backend.sessions import SessionConflict, SessionExpired, session_manager
+from src.backend.retention import RetentionSweeper, policy_from_env
+
+async def _get_builder(session_id: str) -> KataBuilder:
+    try:
+        # Reading the store and rehydrating are blocking; keep them off the event loop
+        builder = await asyncio.to_thread(session_manager.get_session, session_id)
+    except SessionExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    if not builder:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return builder
+
+# Hard ceiling on the estimated input tokens a single session may send for extraction
+MAX_SESSION_TOKENS = int(os.environ.get("KATALAB_MAX_SESSION_TOKENS", "1000000"))
+# Generate tasks in the background while the user reviews a plan (costs tokens for plans that get changed)
+SPECULATIVE_BUILD = os.environ.get("KATALAB_SPECULATIVE_BUILD", "0") == "1"
+# Tasks generated per LLM call; fewer round-trips suit small katas on high-latency links
+TASK_BATCH_SIZE = int(os.environ.get("KATALAB_TASK_BATCH_SIZE", "1"))
 
 class InitResponse(BaseModel):
     session_id: str
     company_info: CompanyInfo
     employee_info: EmployeeInfo
     plan: KataPlan
+    skipped_files: List[SkippedDocument] = []
+    preprocessing: Optional[PreprocessingReport] = None
+    context: Optional[ContextDigest] = None
 
 class PlanRequest(BaseModel):
     session_id: str
     feedback: Optional[str] = None
     n_tasks: Optional[int] = 1
+    # "revise" rewrites only the tasks the feedback touches (or `task_ids`); "full" plans from scratch
+    mode: Literal["revise", "full"] = "revise"
+    task_ids: Optional[List[str]] = None
 
 class BuildRequest(BaseModel):
     session_id: str
+    # Stream task events in plan order (True) or as soon as each task completes (False)
+    ordered: Optional[bool] = None
 
 @app.post("/api/init", response_model=InitResponse)
 async def init_session(company_files: List[UploadFile], employee_files: List[UploadFile], n_tasks: int = 5):
     session_id = str(uuid.uuid4())
-    
-    # Read company files content
-    company_docs = []
-    for file in company_files:
-        content = await file.read()
-        try:
-            # Try decoding as utf-8
-            text = content.decode("utf-8")
-            company_docs.append(text)
-        except UnicodeDecodeError:
-            # Skip non-text files for now or handle gracefully
-            print(f"Skipping binary file {file.filename}")
-            pass
-    
-    # Read employee files content
-    employee_docs = []
-    for file in employee_files:
-        content = await file.read()
-        try:
-            # Try decoding as utf-8
-            text = content.decode("utf-8")
-            employee_docs.append(text)
-        except UnicodeDecodeError:
-            # Skip non-text files for now or handle gracefully
-            print(f"Skipping binary file {file.filename}")
-            pass
-    
+    current_session.set(session_id)
+
+    # Stream uploads in chunks; oversized and unreadable files are skipped and reported
+    loader = DocumentLoader()
+    company_docs = await loader.aload_uploads(company_files)
+    employee_docs = await loader.aload_uploads(employee_files)
+
+    skipped = [f"{doc.filename} ({doc.reason})" for doc in loader.skipped]
     if not company_docs:
-        raise HTTPException(status_code=400, detail="No valid company text documents uploaded.")
+        raise HTTPException(status_code=400, detail=f"No valid company documents uploaded. Skipped: {skipped}")
     if not employee_docs:
-        raise HTTPException(status_code=400, detail="No valid employee text documents uploaded.")
+        raise HTTPException(status_code=400, detail=f"No valid employee documents uploaded. Skipped: {skipped}")
 
     # Initialize Builder
-    builder = KataBuilder(docs=company_docs, employee_docs=employee_docs, output_dir=f"downloads/{session_id}", n_tasks=n_tasks)
-    session_manager.save_session(session_id, builder)
+    builder = KataBuilder(docs=company_docs, employee_docs=employee_docs, output_dir=f"downloads/{session_id}", n_tasks=n_tasks, max_input_tokens=MAX_SESSION_TOKENS, task_batch_size=TASK_BATCH_SIZE)
+    await asyncio.to_thread(session_manager.save_session, session_id, builder)
     
     # Parse and Plan
     try:
-        company_info = builder._parse_data()
-        employee_info = builder._parse_employee_data()
-        plan = builder._plan_repo()
-        session_manager.save_session(session_id, builder) # Save state after planning
-        return InitResponse(session_id=session_id, company_info=company_info, employee_info=employee_info, plan=plan)
+        company_info, employee_info = await builder._aparse_inputs()
+        plan = await builder._aplan_repo()
+        await asyncio.to_thread(session_manager.save_session, session_id, builder) # Save state after planning
+        if SPECULATIVE_BUILD:
+            builder.speculate()
+        return InitResponse(session_id=session_id, company_info=company_info, employee_info=employee_info, plan=plan, skipped_files=loader.skipped, preprocessing=builder.preprocessing, context=builder.context_digest())
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"Error in init_session: {e}")
         import traceback
@@ -93,60 +169,129 @@ async def init_session(company_files: List[UploadFile], employee_files: List[Upl
 
 @app.post("/api/plan")
 async def update_plan(request: PlanRequest):
-    builder = session_manager.get_session(request.session_id)
-    if not builder:
-        raise HTTPException(status_code=404, detail="Session not found")
-    try:
-        new_plan = builder._plan_repo(feedback=request.feedback)
-        session_manager.save_session(request.session_id, builder) 
+    builder = await _get_builder(request.session_id)
+    current_session.set(request.session_id)
+
+    async def replan() -> KataPlan:
+        if request.mode == "revise" and request.feedback:
+            # Targeted tasks are about to change; anything else is reconciled once the revision is in
+            if request.task_ids:
+                builder.agent.cancel_speculation(request.task_ids)
+            new_plan = await builder._arevise_plan(feedback=request.feedback, task_ids=request.task_ids)
+        else:
+            builder.agent.cancel_speculation()
+            new_plan = await builder._aplan_repo(feedback=request.feedback)
+        await asyncio.to_thread(session_manager.save_session, request.session_id, builder)
+        if SPECULATIVE_BUILD:
+            builder.speculate()
         return new_plan
+
+    # A double submit or a second tab sending the same feedback joins the plan already in flight
+    key = flight_key(request.session_id, request.mode, normalise_text(request.feedback), sorted(request.task_ids or []))
+    try:
+        return await flights.do("plan", key, replan)
+    except UnknownTaskId as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RevisionMismatch as e:
+        # The model, not the request, is at fault
+        raise HTTPException(status_code=502, detail=f"{e} Try again or target tasks by id.")
+    except SessionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         print(f"Error in update_plan: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/plan/{session_id}/history", response_model=List[PlanVersion])
+async def plan_history(session_id: str):
+    builder = await _get_builder(session_id)
+    return builder.agent.plan_history
+
+class BuildJobResponse(BaseModel):
+    job_id: str
+    session_id: str
+    status: str
+    events: int
+    events_url: str
+
+def _job_response(job: BuildJob) -> BuildJobResponse:
+    return BuildJobResponse(job_id=job.job_id, session_id=job.session_id, status=job.status, events=len(job.events), events_url=f"/api/build/{job.job_id}/events")
+
+async def _submit_build(request: BuildRequest) -> BuildJob:
+    builder = await _get_builder(request.session_id)
+    # Joins the session's running build instead of racing it on builder.repo
+    return job_manager.submit(request.session_id, builder, save=session_manager.save_build, ordered=request.ordered)
+
+def _stream_job(job: BuildJob, since: int = 0) -> StreamingResponse:
+    async def event_stream():
+        # Following a job never cancels it; a dropped client can resume with ?since=N
+        async for event in job.follow(since):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson", headers={"X-Build-Job": job.job_id})
+
 @app.post("/api/build")
 async def build_repo(request: BuildRequest):
-    builder = session_manager.get_session(request.session_id)
-    if not builder:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    def event_stream():
-        try:
-            for event in builder._build_repo():
-                import json
-                yield json.dumps(event) + "\n"
-            
-            # Save session at end
-            session_manager.save_session(request.session_id, builder)
-            
-            # Create the ZIP file explicitly here after streaming
-            builder._output_repo()
-            
-            # Yield final success event with url
-            yield json.dumps({"type": "complete", "download_url": f"/api/download/{request.session_id}"}) + "\n"
-        except Exception as e:
-            print(f"Error in event_stream: {e}")
-            import traceback
-            traceback.print_exc()
-            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
-
-    from fastapi.responses import StreamingResponse
-    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+    """
+    Queues a build and streams its events as NDJSON. The job id is returned in
+    the X-Build-Job header for reconnecting via /api/build/{job_id}/events.
+    """
+    return _stream_job(await _submit_build(request))
+
+@app.post("/api/build/jobs", response_model=BuildJobResponse)
+async def submit_build(request: BuildRequest):
+    return _job_response(await _submit_build(request))
+
+@app.get("/api/build/{job_id}", response_model=BuildJobResponse)
+async def build_status(job_id: str):
+    # Finished jobs are replayed from their logs, which can be large
+    job = await asyncio.to_thread(job_manager.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Build job not found")
+    return _job_response(job)
+
+@app.get("/api/build/{job_id}/events")
+async def build_events(job_id: str, since: int = 0):
+    # Finished jobs are replayed from their logs, which can be large
+    job = await asyncio.to_thread(job_manager.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Build job not found")
+    return _stream_job(job, since)
 
 @app.get("/api/download/{session_id}")
-async def download_repo(session_id: str):
-    builder = session_manager.get_session(session_id)
-    if not builder:
-        raise HTTPException(status_code=404, detail="Session not found")
-    # Re-construct expected path
-    zip_path = os.path.join(builder.output_dir, "kata_repo.zip")
-    
+async def download_repo(session_id: str, stream: bool = False):
+    """
+    Serves the built repo as a zip. With `stream=true` the zip is generated on
+    the fly from the session's files instead of being read from disk.
+    """
+    builder = await _get_builder(session_id)
+
+    if stream:
+        if not builder.repo:
+            raise HTTPException(status_code=404, detail="Build artifact not found")
+        # A sync iterator, so Starlette deflates each file on its threadpool
+        return StreamingResponse(
+            iter_zip(list(builder.repo.items())),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{ZIP_FILENAME}"'},
+        )
+
+    zip_path = builder.zip_path
     if not os.path.exists(zip_path):
-        raise HTTPException(status_code=404, detail="Build artifact not found")
+        if not builder.repo:
+            raise HTTPException(status_code=404, detail="Build artifact not found")
+        # Built files are persisted with the session, so the zip can be recreated
+        zip_path = await asyncio.to_thread(builder._output_repo)
         
-    return FileResponse(zip_path, filename="kata_repo.zip")
+    return FileResponse(zip_path, filename=ZIP_FILENAME)
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus text exposition of LLM call latency, token usage and outcomes.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 # Serve logo and assets from fig directory
 if os.path.exists("fig"):
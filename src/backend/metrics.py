@@ -0,0 +1,105 @@
+import bisect
+import math
+import threading
+from collections import defaultdict
+from typing import Callable, Iterable
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = tuple[tuple[str, str], ...]
+# (name, type, help, labels, value) rows produced on demand, e.g. cache statistics
+Collector = Callable[[], Iterable[tuple[str, str, str, dict[str, str], float]]]
+
+def _labels(labels: dict[str, str] | None) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Labels, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics registry rendered in the Prometheus text format.
+    Counters and histograms are created on first use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: dict[str, tuple[str, str]] = {}
+        self._counters: dict[str, dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._histograms: dict[str, dict[Labels, list]] = defaultdict(dict)
+        self._buckets: dict[str, tuple[float, ...]] = {}
+        self._collectors: list[Collector] = []
+
+    def describe(self, name: str, kind: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self._meta[name] = (kind, help)
+        if kind == "histogram":
+            self._buckets[name] = buckets
+
+    def inc(self, name: str, labels: dict[str, str] | None = None, value: float = 1.0):
+        with self._lock:
+            self._counters[name][_labels(labels)] += value
+
+    def observe(self, name: str, value: float, labels: dict[str, str] | None = None):
+        buckets = self._buckets.get(name, DEFAULT_BUCKETS)
+        with self._lock:
+            series = self._histograms[name].setdefault(_labels(labels), [[0] * len(buckets), 0.0, 0])
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def counter_value(self, name: str, labels: dict[str, str] | None = None) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(labels), 0.0)
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def _header(self, lines: list[str], name: str, kind: str, help: str):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                kind, help = self._meta.get(name, ("counter", name))
+                self._header(lines, name, kind, help)
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+            for name, series in sorted(self._histograms.items()):
+                _, help = self._meta.get(name, ("histogram", name))
+                self._header(lines, name, "histogram", help)
+                buckets = self._buckets.get(name, DEFAULT_BUCKETS)
+                for labels, (counts, total, count) in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_value(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        seen = set()
+        for collector in self._collectors:
+            for name, kind, help, labels, value in collector():
+                if name not in seen:
+                    self._header(lines, name, kind, help)
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
@@ -48,9 +48,53 @@ class KataPlan(BaseModel):
     description: str = Field(description="Overview of what this Kata aims to teach/assess")
     tasks: list[Plan]
 
+class PlanRevision(BaseModel):
+    title: Optional[str] = Field(default=None, description="New title, only if the feedback changes it")
+    description: Optional[str] = Field(default=None, description="New overview, only if the feedback changes it")
+    tasks: list[Plan] = Field(description="Only the tasks that change, each keeping its original id")
+
+class PlanVersion(BaseModel):
+    version: int
+    plan: KataPlan
+    feedback: Optional[str] = None
+    # Ids of the tasks rewritten in this version; every task for a full plan
+    changed_task_ids: list[str] = []
+
 class FileContent(BaseModel):
     filename: str = Field(description="Name of the file, e.g. main.py")
     content: str = Field(description="Content of the file")
 
 class TaskImplementation(BaseModel):
-    files: list[FileContent]
\ No newline at end of file
+    files: list[FileContent]
+
+class BatchedTask(BaseModel):
+    task_id: str = Field(description="Id of the planned task this implements")
+    readme: str = Field(description="README.md content explaining the task to the candidate")
+    implementation: TaskImplementation
+
+# Several tasks generated in one call, when batched generation is enabled
+class TaskBatch(BaseModel):
+    tasks: list[BatchedTask]
+
+# Everything generated for one task, as stored in the task cache
+class TaskArtifact(BaseModel):
+    readme: str
+    files: list[FileContent]
+
+class ContextDigest(BaseModel):
+    text: str
+    # Estimated tokens of the digest, and of the full company/employee JSON it replaces
+    tokens: int
+    full_tokens: int
+
+class SkippedDocument(BaseModel):
+    filename: str = Field(description="Name of the uploaded file that was not used")
+    reason: str = Field(description="Why the file was skipped")
+
+class PreprocessingReport(BaseModel):
+    documents_in: int = 0
+    documents_out: int = 0
+    paragraphs_removed: int = Field(default=0, description="Exact and near-duplicate paragraphs dropped")
+    bytes_in: int = 0
+    bytes_out: int = 0
+    tokens_saved: int = Field(default=0, description="Estimated input tokens saved by preprocessing")
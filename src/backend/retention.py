@@ -0,0 +1,155 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+
+from pydantic import BaseModel
+
+from src.backend.archive import ZIP_FILENAME
+from src.backend.coordination import LeaseStore
+from src.backend.jobs import JobManager
+from src.backend.metrics import registry
+from src.backend.sessions import SessionManager
+
+DOWNLOADS_DIR = "downloads"
+SWEEP_LEASE = "retention-sweep"
+
+registry.describe("katalab_retention_evictions_total", "counter", "Sessions, artifacts, job logs and tombstones removed by the retention sweeper")
+registry.describe("katalab_retention_sweep_seconds", "histogram", "Wall time of retention sweeps")
+
+class RetentionPolicy(BaseModel):
+    # Built zips are a cache: the session keeps its files, so downloads recreate them
+    artifact_ttl_seconds: float = 24 * 3600
+    max_artifact_bytes: int = 1024 * 1024 * 1024
+    # Sessions, their artifacts and their build logs
+    session_ttl_seconds: float = 7 * 24 * 3600
+    max_sessions: int = 10_000
+    # How long an evicted session keeps answering 410 Gone instead of 404
+    tombstone_ttl_seconds: float = 30 * 24 * 3600
+    sweep_interval_seconds: float = 600
+
+def policy_from_env() -> RetentionPolicy:
+    defaults = RetentionPolicy()
+    return RetentionPolicy(
+        artifact_ttl_seconds=float(os.environ.get("KATALAB_ARTIFACT_TTL", defaults.artifact_ttl_seconds)),
+        max_artifact_bytes=int(os.environ.get("KATALAB_MAX_ARTIFACT_BYTES", defaults.max_artifact_bytes)),
+        session_ttl_seconds=float(os.environ.get("KATALAB_SESSION_TTL", defaults.session_ttl_seconds)),
+        max_sessions=int(os.environ.get("KATALAB_MAX_SESSIONS", defaults.max_sessions)),
+        sweep_interval_seconds=float(os.environ.get("KATALAB_SWEEP_INTERVAL", defaults.sweep_interval_seconds)),
+    )
+
+class RetentionSweeper:
+    """
+    Periodically removes expired sessions and their artifacts, keeping disk use
+    and the session store bounded on long-running nodes.
+
+    Each sweep:
+      1. evicts sessions not saved within the session TTL, then the oldest ones
+         beyond `max_sessions`, deleting their download folder and leaving a
+         tombstone so lookups answer 410 Gone;
+      2. deletes zips older than the artifact TTL, then the least recently
+         written ones until the downloads folder fits `max_artifact_bytes`;
+      3. deletes build logs older than the session TTL and expired tombstones.
+
+    Sessions with a queued or running build are never touched. When several
+    worker processes each run a sweeper, the one holding the sweep lease in
+    `leases` does the work and the others skip their turn.
+    """
+
+    def __init__(self, sessions: SessionManager, jobs: JobManager, policy: RetentionPolicy | None = None, downloads_dir: str = DOWNLOADS_DIR, leases: LeaseStore | None = None):
+        self.sessions = sessions
+        self.jobs = jobs
+        self.policy = policy or RetentionPolicy()
+        self.downloads_dir = downloads_dir
+        self.leases = leases
+        self.sweeper_id = uuid.uuid4().hex
+
+    def _evict_session(self, session_id: str):
+        self.sessions.evict(session_id)
+        shutil.rmtree(os.path.join(self.downloads_dir, session_id), ignore_errors=True)
+
+    def _sweep_sessions(self, now: float) -> int:
+        entries = sorted(self.sessions.store.entries(), key=lambda entry: entry[1])
+        cutoff = now - self.policy.session_ttl_seconds
+        # Oldest first: expired sessions, then whatever is over the quota
+        over_quota = max(0, len(entries) - self.policy.max_sessions)
+        evicted = 0
+        for index, (session_id, updated_at) in enumerate(entries):
+            if updated_at >= cutoff and index >= over_quota:
+                break
+            if self.jobs.is_active(session_id):
+                continue
+            self._evict_session(session_id)
+            evicted += 1
+        return evicted
+
+    def _sweep_artifacts(self, now: float) -> int:
+        if not os.path.isdir(self.downloads_dir):
+            return 0
+        artifacts = []
+        for root, _, files in os.walk(self.downloads_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                artifacts.append((stat.st_mtime, stat.st_size, path, name))
+
+        removed = 0
+        kept = []
+        for mtime, size, path, name in sorted(artifacts):
+            if now - mtime > self.policy.artifact_ttl_seconds:
+                removed += self._remove(path)
+            elif name == ZIP_FILENAME:
+                kept.append((size, path))
+            # Anything else (e.g. a zip still being written) only goes once it is stale
+
+        total = sum(size for size, _ in kept)
+        for size, path in kept:
+            if total <= self.policy.max_artifact_bytes:
+                break
+            removed += self._remove(path)
+            total -= size
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return 1
+
+    def sweep(self) -> dict[str, int]:
+        """Runs one sweep and returns how many items of each kind were removed."""
+        start = time.perf_counter()
+        now = time.time()
+        removed = {
+            "sessions": self._sweep_sessions(now),
+            "artifacts": self._sweep_artifacts(now),
+            "job_logs": self.jobs.prune(now - self.policy.session_ttl_seconds),
+            "tombstones": self.sessions.store.purge_tombstones(now - self.policy.tombstone_ttl_seconds),
+        }
+        for kind, count in removed.items():
+            if count:
+                registry.inc("katalab_retention_evictions_total", {"kind": kind}, count)
+        registry.observe("katalab_retention_sweep_seconds", time.perf_counter() - start)
+        return removed
+
+    def _is_leader(self) -> bool:
+        if self.leases is None:
+            return True
+        # Held across sweeps and renewed by each one; another worker takes over once it lapses
+        ttl = 1.5 * self.policy.sweep_interval_seconds
+        return self.leases.acquire(SWEEP_LEASE, self.sweeper_id, ttl) == self.sweeper_id
+
+    async def run_forever(self):
+        while True:
+            try:
+                if await asyncio.to_thread(self._is_leader):
+                    await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Retention sweep failed: {e}")
+            await asyncio.sleep(self.policy.sweep_interval_seconds)
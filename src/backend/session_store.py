@@ -0,0 +1,259 @@
+import fcntl
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Iterator
+
+SESSION_DB = "sessions.db"
+SESSION_DIR = "sessions"
+
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+class SessionConflict(RuntimeError):
+    """Raised when a session was saved by someone else since it was read."""
+
+class SessionStore(ABC):
+    """
+    Persistent backend for session records (plain JSON-serialisable dicts).
+
+    Every write touches a single session, so saving costs the same with 10 or
+    10k historical sessions.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def put(self, session_id: str, record: dict, expected_revision: int | None = None) -> int:
+        """
+        Saves a record and returns its new revision. With `expected_revision`,
+        the save only happens if the stored revision still matches.
+
+        Raises:
+            SessionConflict: If the session was saved at another revision meanwhile.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def ids(self) -> Iterator[str]:
+        ...
+
+    @abstractmethod
+    def revision(self, session_id: str) -> int | None:
+        """
+        A value that changes on every save, so processes sharing the store can
+        tell whether their in-memory copy of a session is stale.
+        """
+
+    @abstractmethod
+    def entries(self) -> Iterator[tuple[str, float]]:
+        """Yields (session id, last saved as a unix time) without loading the records."""
+
+    @abstractmethod
+    def evict(self, session_id: str):
+        """Deletes a session and leaves a tombstone so lookups can tell it expired."""
+
+    @abstractmethod
+    def evicted_at(self, session_id: str) -> float | None:
+        ...
+
+    @abstractmethod
+    def purge_tombstones(self, older_than: float) -> int:
+        """Forgets sessions evicted before `older_than`; returns how many were dropped."""
+
+    @staticmethod
+    def _check_id(session_id: str):
+        # Session ids come straight from URLs, never let them escape the store
+        if not _SESSION_ID_RE.match(session_id):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+
+class SQLiteSessionStore(SessionStore):
+    """
+    One row per session in a SQLite database running in WAL mode, so readers
+    never block the writer and each save is a single-row upsert.
+    """
+
+    def __init__(self, path: str = SESSION_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS evicted (id TEXT PRIMARY KEY, evicted_at REAL NOT NULL)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+            if "revision" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> dict | None:
+        self._check_id(session_id)
+        row = self._connect().execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, session_id: str, record: dict, expected_revision: int | None = None) -> int:
+        self._check_id(session_id)
+        with self._connect() as conn:
+            if expected_revision is None:
+                row = conn.execute(
+                    "INSERT INTO sessions (id, data, updated_at, revision) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at, "
+                    "revision = sessions.revision + 1 RETURNING revision",
+                    (session_id, json.dumps(record), time.time()),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "UPDATE sessions SET data = ?, updated_at = ?, revision = revision + 1 "
+                    "WHERE id = ? AND revision = ? RETURNING revision",
+                    (json.dumps(record), time.time(), session_id, expected_revision),
+                ).fetchone()
+        if row is None:
+            raise SessionConflict(f"Session {session_id} was saved by another request; reload it and try again.")
+        return row[0]
+
+    def revision(self, session_id: str) -> int | None:
+        self._check_id(session_id)
+        row = self._connect().execute("SELECT revision FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def delete(self, session_id: str):
+        self._check_id(session_id)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def ids(self) -> Iterator[str]:
+        for (session_id,) in self._connect().execute("SELECT id FROM sessions"):
+            yield session_id
+
+    def entries(self) -> Iterator[tuple[str, float]]:
+        yield from self._connect().execute("SELECT id, updated_at FROM sessions").fetchall()
+
+    def evict(self, session_id: str):
+        self._check_id(session_id)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute("INSERT OR REPLACE INTO evicted (id, evicted_at) VALUES (?, ?)", (session_id, time.time()))
+
+    def evicted_at(self, session_id: str) -> float | None:
+        self._check_id(session_id)
+        row = self._connect().execute("SELECT evicted_at FROM evicted WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def purge_tombstones(self, older_than: float) -> int:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM evicted WHERE evicted_at < ?", (older_than,)).rowcount
+
+class FileSessionStore(SessionStore):
+    """
+    One JSON file per session, written to a temp file and atomically renamed
+    into place so a crash never leaves a half-written session behind.
+    """
+
+    def __init__(self, directory: str = SESSION_DIR):
+        self.directory = directory
+        self.evicted_directory = os.path.join(directory, "evicted")
+        # Serialises saves across threads and processes so a revision check and its write are atomic
+        self.lock_path = os.path.join(directory, ".lock")
+        os.makedirs(self.evicted_directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        self._check_id(session_id)
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def get(self, session_id: str) -> dict | None:
+        try:
+            with open(self._path(session_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, session_id: str, record: dict, expected_revision: int | None = None) -> int:
+        path = self._path(session_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if expected_revision is not None and self.revision(session_id) != expected_revision:
+                os.remove(tmp_path)
+                raise SessionConflict(f"Session {session_id} was saved by another request; reload it and try again.")
+            os.replace(tmp_path, path)
+            return self.revision(session_id)
+
+    def delete(self, session_id: str):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def ids(self) -> Iterator[str]:
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                yield name[: -len(".json")]
+
+    def revision(self, session_id: str) -> int | None:
+        try:
+            # Every save is a rename of a freshly written file, so the inode changes too
+            stat = os.stat(self._path(session_id))
+        except FileNotFoundError:
+            return None
+        return hash((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+
+    def entries(self) -> Iterator[tuple[str, float]]:
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json") and entry.is_file():
+                    yield entry.name[: -len(".json")], entry.stat().st_mtime
+
+    def _tombstone_path(self, session_id: str) -> str:
+        self._check_id(session_id)
+        return os.path.join(self.evicted_directory, session_id)
+
+    def evict(self, session_id: str):
+        # Tombstone first, so a concurrent lookup never sees neither
+        with open(self._tombstone_path(session_id), "w"):
+            pass
+        self.delete(session_id)
+
+    def evicted_at(self, session_id: str) -> float | None:
+        try:
+            return os.path.getmtime(self._tombstone_path(session_id))
+        except FileNotFoundError:
+            return None
+
+    def purge_tombstones(self, older_than: float) -> int:
+        purged = 0
+        with os.scandir(self.evicted_directory) as it:
+            for entry in it:
+                if entry.stat().st_mtime < older_than:
+                    os.remove(entry.path)
+                    purged += 1
+        return purged
+
+def make_store(kind: str = "sqlite") -> SessionStore:
+    """
+    Builds the session store selected by name ("sqlite" or "files").
+    """
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    if kind == "files":
+        return FileSessionStore()
+    raise ValueError(f"Unknown session store: {kind}")
@@ -1,54 +1,211 @@
 import json
 import os
-from src.backend.models import CompanyInfo, KataPlan
+import threading
+from collections import OrderedDict
+from src.backend.models import CompanyInfo, EmployeeInfo, KataPlan, PlanVersion
 from src.backend.builder import KataBuilder
+from src.backend.session_store import SessionConflict, SessionStore, make_store
 
-SESSION_FILE = "sessions.json"
+# Pre-store format: every session in one JSON document. Imported once on startup.
+LEGACY_SESSION_FILE = "sessions.json"
+
+class SessionExpired(LookupError):
+    """Raised when a session existed but was removed by the retention sweeper."""
 
 class SessionManager:
-    def __init__(self):
-        self.sessions: dict[str, KataBuilder] = {}
-        self._load_sessions()
+    def __init__(self, store: SessionStore, max_sessions: int = 256, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            store: Persistent backend every save is written through to.
+            max_sessions: Maximum number of builders kept in memory.
+            max_bytes: Approximate cap on the documents and generated files held in memory.
+        """
+        self.store = store
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # LRU of hydrated builders; evicted entries are reloaded from the store on demand
+        self.sessions: OrderedDict[str, KataBuilder] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        # The retention sweeper evicts from a worker thread
+        self._lock = threading.Lock()
+        self._migrate_legacy_file()
 
-    def _load_sessions(self):
-        if not os.path.exists(SESSION_FILE):
+    def _migrate_legacy_file(self):
+        # Every worker process runs this on start-up; whoever gets there first migrates
+        if not os.path.exists(LEGACY_SESSION_FILE):
             return
 
         try:
-            with open(SESSION_FILE, "r") as f:
-                data = json.load(f)
-                
-            for session_id, session_data in data.items():
-                # Re-hydrate builder
-                builder = KataBuilder(docs=[], output_dir=session_data["output_dir"])
-                if session_data.get("company_info"):
-                    builder.data = CompanyInfo(**session_data["company_info"])
-                if session_data.get("plan"):
-                    builder.agent.latest_plan = KataPlan(**session_data["plan"])
-                
-                self.sessions[session_id] = builder
+            with open(LEGACY_SESSION_FILE, "r") as f:
+                text = f.read()
+            data = json.loads(text) if text.strip() else {}
+        except FileNotFoundError:
+            return
         except Exception as e:
-            print(f"Failed to load sessions: {e}")
-            # Start fresh if corrupted
-            self.sessions = {}
+            print(f"Failed to read legacy sessions: {e}")
+            return
+
+        if not data:
+            return
+        for session_id, session_data in data.items():
+            if self.store.get(session_id) is None:
+                self.store.put(session_id, session_data)
+        try:
+            os.replace(LEGACY_SESSION_FILE, f"{LEGACY_SESSION_FILE}.migrated")
+        except FileNotFoundError:
+            # Another worker finished the migration first
+            pass
+
+    def _hydrate(self, record: dict) -> KataBuilder:
+        builder = KataBuilder(
+            docs=[],
+            employee_docs=[],
+            output_dir=record["output_dir"],
+            n_tasks=record.get("n_tasks", 1),
+            max_input_tokens=record.get("max_input_tokens"),
+            task_batch_size=record.get("task_batch_size", 1),
+        )
+        if record.get("company_info"):
+            builder.data = CompanyInfo(**record["company_info"])
+        if record.get("employee_info"):
+            builder.employee_data = EmployeeInfo(**record["employee_info"])
+        if record.get("plan"):
+            builder.agent.latest_plan = KataPlan(**record["plan"])
+        builder.agent.plan_history = [PlanVersion(**version) for version in record.get("plan_history") or []]
+        builder.repo = record.get("repo")
+        return builder
+
+    def _serialise(self, builder: KataBuilder) -> dict:
+        return {
+            "output_dir": builder.output_dir,
+            "n_tasks": builder.agent.n_tasks,
+            "max_input_tokens": builder.max_input_tokens,
+            "task_batch_size": builder.agent.batch_size,
+            "company_info": builder.data.model_dump() if builder.data else None,
+            "employee_info": builder.employee_data.model_dump() if builder.employee_data else None,
+            "plan": builder.agent.latest_plan.model_dump() if builder.agent.latest_plan else None,
+            "plan_history": [version.model_dump() for version in builder.agent.plan_history],
+            "repo": builder.repo
+        }
+
+    @staticmethod
+    def _approx_size(builder: KataBuilder) -> int:
+        # The raw documents and generated files dominate a builder's footprint
+        size = sum(len(doc) for doc in builder.docs) + sum(len(doc) for doc in builder.employee_docs)
+        if builder.repo:
+            size += sum(len(path) + len(content) for path, content in builder.repo.items())
+        return size
+
+    def _remember(self, session_id: str, builder: KataBuilder, revision: int):
+        size = self._approx_size(builder)
+        with self._lock:
+            builder.revision = revision
+            self.sessions[session_id] = builder
+            self.sessions.move_to_end(session_id)
+            self._sizes[session_id] = size
+
+            # Always keep the session that was just touched
+            while len(self.sessions) > 1 and (len(self.sessions) > self.max_sessions or sum(self._sizes.values()) > self.max_bytes):
+                evicted_id, _ = self.sessions.popitem(last=False)
+                del self._sizes[evicted_id]
+
+    def _forget(self, session_id: str, builder: KataBuilder | None = None):
+        """Drops the in-memory copy of a session (only if it is `builder`, when given)."""
+        with self._lock:
+            if builder is not None and self.sessions.get(session_id) is not builder:
+                return
+            self.sessions.pop(session_id, None)
+            self._sizes.pop(session_id, None)
 
     def save_session(self, session_id: str, builder: KataBuilder):
-        self.sessions[session_id] = builder
-        self._persist()
+        """
+        Saves the whole session, unless someone saved it since this builder was
+        loaded. Only a builder that was never saved (a new session) is written
+        unconditionally.
+
+        Raises:
+            SessionConflict: If the stored session is newer than the builder.
+        """
+        try:
+            revision = self.store.put(session_id, self._serialise(builder), expected_revision=builder.revision)
+        except SessionConflict:
+            # The next lookup reloads the newer copy
+            self._forget(session_id, builder)
+            raise
+        self._remember(session_id, builder, revision)
+
+    def save_build(self, session_id: str, builder: KataBuilder):
+        """
+        Saves only a build's output (the generated repo), so plan changes
+        saved by other workers while the build ran are kept.
+        """
+        while True:
+            revision = self.store.revision(session_id)
+            record = self.store.get(session_id)
+            if record is None:
+                # Evicted while building; nothing left to attach the repo to
+                return
+            record.update(output_dir=builder.output_dir, repo=builder.repo)
+            try:
+                saved = self.store.put(session_id, record, expected_revision=revision)
+                break
+            except SessionConflict:
+                continue
+        if builder.revision == revision:
+            # Nobody saved in between, so the builder is the stored session
+            self._remember(session_id, builder, saved)
+        else:
+            self._forget(session_id, builder)
+
+    def evict(self, session_id: str):
+        """Drops a session from memory and the store, remembering that it expired."""
+        self._forget(session_id)
+        self.store.evict(session_id)
 
     def get_session(self, session_id: str) -> KataBuilder | None:
-        return self.sessions.get(session_id)
-    
-    def _persist(self):
-        data = {}
-        for session_id, builder in self.sessions.items():
-            data[session_id] = {
-                "output_dir": builder.output_dir,
-                "company_info": builder.data.model_dump() if builder.data else None,
-                "plan": builder.agent.latest_plan.model_dump() if builder.agent.latest_plan else None
-            }
-            
-        with open(SESSION_FILE, "w") as f:
-            json.dump(data, f, indent=2)
-
-session_manager = SessionManager()
+        """
+        Returns the session's builder, or None if it never existed.
+
+        Raises:
+            SessionExpired: If the session was evicted by the retention sweeper.
+        """
+        with self._lock:
+            builder = self.sessions.get(session_id)
+        # Other worker processes share the store: only trust the in-memory copy
+        # while nobody has saved a newer one
+        if builder is not None and self.store.revision(session_id) == builder.revision:
+            with self._lock:
+                if session_id in self.sessions:
+                    self.sessions.move_to_end(session_id)
+            return builder
+
+        # Sessions are only rehydrated from the store when first requested
+        try:
+            # Revision first: if a save lands in between, the copy looks stale and the next save
+            # conflicts, rather than a stale copy overwriting that save
+            revision = self.store.revision(session_id)
+            record = self.store.get(session_id)
+            while record is not None and revision is None:
+                # Created in between; read both again
+                revision = self.store.revision(session_id)
+                record = self.store.get(session_id)
+        except ValueError:
+            return None
+        if record is None:
+            self._forget(session_id)
+            if self.store.evicted_at(session_id) is not None:
+                raise SessionExpired(f"Session {session_id} has expired and its files were deleted.")
+            return None
+        try:
+            builder = self._hydrate(record)
+        except Exception as e:
+            print(f"Failed to load session {session_id}: {e}")
+            return None
+        self._remember(session_id, builder, revision)
+        return builder
+
+session_manager = SessionManager(
+    make_store(os.environ.get("KATALAB_SESSION_STORE", "sqlite")),
+    max_sessions=int(os.environ.get("KATALAB_MAX_CACHED_SESSIONS", "256")),
+    max_bytes=int(os.environ.get("KATALAB_MAX_SESSION_BYTES", str(256 * 1024 * 1024))),
+)
@@ -0,0 +1,64 @@
+import asyncio
+import hashlib
+import json
+import weakref
+from typing import Any, Awaitable, Callable, TypeVar
+
+from src.backend.metrics import registry
+
+T = TypeVar("T")
+
+registry.describe("katalab_singleflight_coalesced_total", "counter", "Requests that joined identical in-flight work instead of starting their own")
+
+def normalise_text(text: str | None) -> str:
+    """Collapses whitespace and case so trivially different inputs share a key."""
+    return " ".join((text or "").split()).lower()
+
+def flight_key(*parts: Any) -> str:
+    """Hashes JSON-serialisable parts (e.g. session and normalised inputs) into a key."""
+    encoded = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight work: the first caller for a key starts it,
+    callers arriving while it runs await the same task, and the key is freed
+    as soon as it finishes, so later calls start fresh work.
+
+    The shared task is shielded from its callers, so a client that disconnects
+    does not cancel the work for the others. State is kept per event loop, as
+    the sync wrappers run each call on a loop of its own.
+    """
+
+    def __init__(self):
+        self._flights: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, str], asyncio.Task]] = weakref.WeakKeyDictionary()
+
+    async def do(self, operation: str, key: str, work: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        flights = self._flights.setdefault(loop, {})
+        task = flights.get((operation, key))
+        if task is None:
+            task = loop.create_task(work())
+            flights[(operation, key)] = task
+            task.add_done_callback(lambda done: self._finished(flights, (operation, key), done))
+        else:
+            registry.inc("katalab_singleflight_coalesced_total", {"operation": operation})
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _finished(flights: dict[tuple[str, str], asyncio.Task], key: tuple[str, str], task: asyncio.Task):
+        if flights.get(key) is task:
+            del flights[key]
+        # Every caller may have gone; mark the error as seen so it is not logged as lost
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return sum(len(flights) for flights in self._flights.values())
+
+flights = SingleFlight()
+
+def _collect_in_flight():
+    yield "katalab_singleflight_in_flight", "gauge", "Distinct pieces of work currently shared through the single-flight layer", {}, flights.in_flight()
+
+registry.add_collector(_collect_in_flight)
@@ -1,16 +1,23 @@
 from .pipeline import InformationExtractionPipeline
+from .cache import ExtractionCache, extraction_cache
 from src.backend.models import CompanyInfo, EmployeeInfo
 
 class Summariser:
-    def __init__(self, model_name: str = "gemini-3-pro-preview"):
-        self.pipeline = InformationExtractionPipeline(output_format=CompanyInfo, llm=model_name)
+    def __init__(self, model_name: str = "gemini-3-pro-preview", cache: ExtractionCache | None = extraction_cache):
+        self.pipeline = InformationExtractionPipeline(output_format=CompanyInfo, llm=model_name, cache=cache)
 
     def run(self, documents: list[str]) -> CompanyInfo:
         return self.pipeline.process_documents(documents)
 
+    async def arun(self, documents: list[str]) -> CompanyInfo:
+        return await self.pipeline.aprocess_documents(documents)
+
 class EmployeeInfoExtractor:
-    def __init__(self, model_name: str = "gemini-3-pro-preview"):
-        self.pipeline = InformationExtractionPipeline(output_format=EmployeeInfo, llm=model_name)
+    def __init__(self, model_name: str = "gemini-3-pro-preview", cache: ExtractionCache | None = extraction_cache):
+        self.pipeline = InformationExtractionPipeline(output_format=EmployeeInfo, llm=model_name, cache=cache)
 
     def run(self, documents: list[str]) -> EmployeeInfo:
         return self.pipeline.process_documents(documents)
+
+    async def arun(self, documents: list[str]) -> EmployeeInfo:
+        return await self.pipeline.aprocess_documents(documents)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from src.backend.metrics import registry
+
+T = TypeVar("T", bound=BaseModel)
+
+CACHE_DIR = os.path.join(".cache", "extraction")
+
+class ExtractionCache:
+    """
+    Persistent, content-addressed cache of validated extraction results.
+
+    Entries live one-per-file under `directory` and are keyed by a hash of the
+    normalised documents, the output schema, the model and the prompt version,
+    so re-uploading the same company pack never reaches the LLM twice.
+    Entries expire after `ttl_seconds`; once the cache grows past `max_entries`
+    or `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(documents: list[str], output_format: Type[BaseModel], model: str, prompt_version: str) -> str:
+        """
+        Builds the cache key. Whitespace is collapsed and documents are sorted so
+        that re-ordered or re-formatted uploads of the same pack share an entry.
+        """
+        digest = hashlib.sha256()
+        header = {
+            "schema": output_format.__name__,
+            "json_schema": output_format.model_json_schema(),
+            "model": model,
+            "prompt_version": prompt_version,
+        }
+        digest.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+        for doc in sorted(" ".join(doc.split()) for doc in documents):
+            encoded = doc.encode("utf-8")
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str, output_format: Type[T]) -> T | None:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if time.time() - entry["created_at"] > self.ttl_seconds:
+                raise KeyError("expired")
+            result = output_format.model_validate(entry["result"])
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (OSError, KeyError, ValueError, ValidationError):
+            # Expired, corrupted or written for an older schema: drop it
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Bump mtime so eviction is least-recently-used rather than oldest-first
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, result: BaseModel):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "result": result.model_dump(mode="json")}, f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self.evictions += 1
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                stat = entry.stat()
+                # mtime is refreshed on every hit, so only stale entries are dropped here;
+                # get() enforces the TTL against the creation time
+                if now - stat.st_mtime > self.ttl_seconds:
+                    self._remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            total_bytes -= size
+            self._remove(path)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+extraction_cache = ExtractionCache()
+
+def _collect_cache_stats():
+    stats = extraction_cache.stats()
+    for name in ("hits", "misses", "evictions"):
+        yield f"katalab_extraction_cache_{name}_total", "counter", f"Extraction cache {name}", {}, stats[name]
+
+registry.add_collector(_collect_cache_stats)
@@ -0,0 +1,67 @@
+from typing import List
+
+# Gemini averages roughly four characters of English text per token. An estimate is
+# enough here: budgets only need to keep chunks well clear of the context limit.
+CHARS_PER_TOKEN = 4
+SEPARATOR = "\n\n--- DOCUMENT SEPARATOR ---\n\n"
+
+class TokenBudgetExceeded(ValueError):
+    """Raised when a document set is larger than the configured token ceiling."""
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _split_document(document: str, budget: int) -> List[str]:
+    """
+    Splits a single document that does not fit the budget on paragraph
+    boundaries, hard-slicing any paragraph that is still too large.
+    """
+    max_chars = budget * CHARS_PER_TOKEN
+    pieces: List[str] = []
+    current = ""
+    for paragraph in document.split("\n\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if len(candidate) > max_chars:
+            pieces.append(current)
+            current = paragraph
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+def pack_documents(documents: List[str], budget: int) -> List[List[str]]:
+    """
+    Packs documents, in order, into chunks whose combined size (including the
+    separators used in the prompt) stays within `budget` tokens.
+
+    Args:
+        documents: The documents to pack.
+        budget: Maximum estimated tokens per chunk.
+
+    Returns:
+        List[List[str]]: the chunks, each a list of documents or document pieces.
+    """
+    separator_tokens = estimate_tokens(SEPARATOR)
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for document in documents:
+        pieces = [document] if estimate_tokens(document) <= budget else _split_document(document, budget)
+        for piece in pieces:
+            tokens = estimate_tokens(piece) + (separator_tokens if current else 0)
+            if current and current_tokens + tokens > budget:
+                chunks.append(current)
+                current, current_tokens = [], 0
+                tokens = estimate_tokens(piece)
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,218 @@
+import asyncio
+import io
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+
+from src.backend.models import SkippedDocument
+
+MAX_FILE_BYTES = 10 * 1024 * 1024
+MAX_REQUEST_BYTES = 50 * 1024 * 1024
+
+# OS and archive metadata that ends up in uploads but never contains content
+JUNK_FILENAMES = {".ds_store", "thumbs.db", "desktop.ini", ".localized"}
+
+# Parsing PDFs and DOCX files is CPU bound, keep it off the event loop
+_extraction_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="doc-extract")
+
+class UnsupportedDocument(Exception):
+    """Raised when a file cannot be turned into text."""
+
+def is_junk_file(filename: str) -> bool:
+    parts = (filename or "").replace("\\", "/").split("/")
+    name = parts[-1]
+    return name.lower() in JUNK_FILENAMES or name.startswith("._") or "__MACOSX" in parts
+
+class _HTMLTextExtractor(HTMLParser):
+    _SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts: list[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth and data.strip():
+            self.parts.append(data.strip())
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise UnsupportedDocument("not a UTF-8 text file")
+
+def _extract_pdf(data: bytes) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise UnsupportedDocument("PDF support requires the optional 'pypdf' package")
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception as e:
+        raise UnsupportedDocument(f"could not read PDF: {e}")
+
+def _extract_docx(data: bytes, max_bytes: int) -> str:
+    namespace = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            # Guard against zip bombs: the uncompressed body must respect the same limit
+            if archive.getinfo("word/document.xml").file_size > max_bytes:
+                raise UnsupportedDocument("DOCX body exceeds the per-file size limit")
+            root = ElementTree.fromstring(archive.read("word/document.xml"))
+    except (KeyError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+        raise UnsupportedDocument(f"could not read DOCX: {e}")
+
+    paragraphs = []
+    for paragraph in root.iter(f"{namespace}p"):
+        text = "".join(node.text or "" for node in paragraph.iter(f"{namespace}t"))
+        if text:
+            paragraphs.append(text)
+    return "\n".join(paragraphs)
+
+def _extract_html(data: bytes) -> str:
+    parser = _HTMLTextExtractor()
+    parser.feed(_decode(data))
+    parser.close()
+    return "\n".join(parser.parts)
+
+def _extract_json(data: bytes) -> str:
+    try:
+        # Re-serialise compactly: pretty-printing whitespace is pure token cost
+        return json.dumps(json.loads(_decode(data)), ensure_ascii=False, separators=(",", ":"))
+    except json.JSONDecodeError as e:
+        raise UnsupportedDocument(f"invalid JSON: {e}")
+
+def extract_text(filename: str, data: bytes, max_bytes: int = MAX_FILE_BYTES) -> str:
+    """
+    Converts the raw bytes of a document into plain text based on its extension.
+
+    Supports PDF, DOCX, HTML, JSON, YAML and any other UTF-8 text file.
+
+    Args:
+        filename: Name of the file, used to pick the extractor.
+        data: Raw file contents.
+        max_bytes: Size limit applied to decompressed content (DOCX).
+
+    Returns:
+        str: The extracted text.
+
+    Raises:
+        UnsupportedDocument: If the file cannot be converted to text.
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".pdf" or data.startswith(b"%PDF-"):
+        return _extract_pdf(data)
+    if extension == ".docx":
+        return _extract_docx(data, max_bytes)
+    if extension in (".html", ".htm"):
+        return _extract_html(data)
+    if extension == ".json":
+        return _extract_json(data)
+    # YAML, Markdown, plain text and source files are already text
+    return _decode(data)
+
+class DocumentLoader:
+    """
+    Turns uploaded files or files on disk into text documents while enforcing
+    per-file and per-request byte limits. Every file that is not loaded is
+    recorded in `skipped` with the reason.
+    """
+
+    def __init__(self, max_file_bytes: int = MAX_FILE_BYTES, max_total_bytes: int = MAX_REQUEST_BYTES):
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.total_bytes = 0
+        self.skipped: list[SkippedDocument] = []
+
+    def _skip(self, filename: str, reason: str):
+        print(f"Skipping file {filename}: {reason}")
+        self.skipped.append(SkippedDocument(filename=filename, reason=reason))
+
+    def _limit_for_next_file(self) -> int:
+        return min(self.max_file_bytes, self.max_total_bytes - self.total_bytes)
+
+    def _size_error(self) -> str:
+        if self.max_total_bytes - self.total_bytes < self.max_file_bytes:
+            return f"request exceeds the {self.max_total_bytes} byte upload limit"
+        return f"file exceeds the {self.max_file_bytes} byte limit"
+
+    def _to_text(self, filename: str, data: bytes) -> str | None:
+        if is_junk_file(filename):
+            self._skip(filename, "system metadata file")
+            return None
+        try:
+            text = extract_text(filename, data, self.max_file_bytes)
+        except UnsupportedDocument as e:
+            self._skip(filename, str(e))
+            return None
+        if not text.strip():
+            self._skip(filename, "no text content")
+            return None
+        return text
+
+    async def aload_uploads(self, files) -> list[str]:
+        """
+        Reads uploads (objects with `filename`, an async `read(size)` and optionally
+        `size`) and extracts their text in a worker pool. Files over the remaining
+        limit are skipped by their reported size without being read, and at most
+        one byte past the limit is ever read into memory.
+
+        The web server has already received the request body by now; the
+        request-wide ceiling is enforced earlier by `RequestSizeLimit` in main.py.
+        """
+        loop = asyncio.get_running_loop()
+        documents = []
+        for file in files:
+            if is_junk_file(file.filename):
+                self._skip(file.filename, "system metadata file")
+                continue
+            limit = self._limit_for_next_file()
+            size = getattr(file, "size", None)
+            if size is not None and size > limit:
+                self._skip(file.filename, self._size_error())
+                continue
+            # A single read of at most limit + 1 bytes: no chunk accumulation and no copy. The upload is
+            # already spooled by then; the API's RequestSizeLimit middleware is what bounds that spool
+            data = await file.read(limit + 1)
+            if len(data) > limit:
+                self._skip(file.filename, self._size_error())
+                continue
+
+            self.total_bytes += len(data)
+            text = await loop.run_in_executor(_extraction_pool, self._to_text, file.filename, data)
+            if text is not None:
+                documents.append(text)
+        return documents
+
+    def load_directory(self, directory_path: str) -> list[str]:
+        documents = []
+        for filename in sorted(os.listdir(directory_path)):
+            filepath = os.path.join(directory_path, filename)
+            if not os.path.isfile(filepath):
+                continue
+            if is_junk_file(filename):
+                self._skip(filename, "system metadata file")
+                continue
+            limit = self._limit_for_next_file()
+            if os.path.getsize(filepath) > limit:
+                self._skip(filename, self._size_error())
+                continue
+            with open(filepath, "rb") as f:
+                data = f.read()
+            self.total_bytes += len(data)
+            text = self._to_text(filename, data)
+            if text is not None:
+                documents.append(text)
+        return documents
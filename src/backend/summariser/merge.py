@@ -0,0 +1,63 @@
+import json
+from functools import reduce
+from typing import Any, List, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T", bound=BaseModel)
+
+def _identity(item: Any) -> str:
+    """
+    Key used to deduplicate list entries: models are matched on their `name` or
+    `title` (case and whitespace insensitive), strings on their normalised text.
+    """
+    if isinstance(item, BaseModel):
+        for attr in ("name", "title"):
+            value = getattr(item, attr, None)
+            if isinstance(value, str):
+                return f"{attr}:{' '.join(value.lower().split())}"
+        return item.model_dump_json()
+    if isinstance(item, str):
+        return " ".join(item.lower().split())
+    return json.dumps(item, sort_keys=True, default=str)
+
+def _merge_values(a: Any, b: Any) -> Any:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if isinstance(a, BaseModel) and isinstance(b, BaseModel):
+        return merge_models(a, b)
+    if isinstance(a, list) and isinstance(b, list):
+        merged: dict[str, Any] = {}
+        for item in a + b:
+            key = _identity(item)
+            merged[key] = _merge_values(merged[key], item) if key in merged else item
+        return list(merged.values())
+    if isinstance(a, str):
+        return a if a.strip() else b
+    if isinstance(a, bool):
+        return a or b
+    if isinstance(a, (int, float)):
+        return max(a, b)
+    return a
+
+def merge_models(a: T, b: T) -> T:
+    """
+    Deterministically merges two partial extractions of the same schema.
+
+    Lists are unioned and deduplicated (nested entries with the same name are
+    merged recursively), the first non-empty string wins and numbers take the
+    larger value. List length constraints declared on the schema are respected.
+    """
+    values = {}
+    for name, field in type(a).model_fields.items():
+        value = _merge_values(getattr(a, name), getattr(b, name))
+        max_length = next((m.max_length for m in field.metadata if getattr(m, "max_length", None) is not None), None)
+        if isinstance(value, list) and max_length is not None:
+            value = value[:max_length]
+        values[name] = value
+    return type(a).model_validate(values)
+
+def merge_all(partials: List[T]) -> T:
+    return reduce(merge_models, partials)
@@ -1,47 +1,116 @@
+import asyncio
 from typing import List, Type, TypeVar, Generic
 from google.genai import types
 from pydantic import BaseModel
 from src.backend.client import google_client
+from src.backend.llm import LLMClient
+from src.backend.singleflight import flight_key, flights
+from src.backend.summariser.cache import ExtractionCache
+from src.backend.summariser.chunking import SEPARATOR, TokenBudgetExceeded, estimate_tokens, pack_documents
+from src.backend.summariser.merge import merge_all
 
 T = TypeVar("T", bound=BaseModel)
 
+# Bump whenever the extraction prompt changes so cached results are not reused
+PROMPT_VERSION = "2"
+
 class InformationExtractionPipeline(Generic[T]):
-    def __init__(self, output_format: Type[T], llm: str = "gemini-3-pro-preview"):
+    def __init__(self, output_format: Type[T], llm: str = "gemini-3-pro-preview", cache: ExtractionCache | None = None, chunk_tokens: int = 50_000, max_tokens: int | None = None, max_concurrency: int = 8):
         """
         Initialize the pipeline with Gemini client.
-        
+
         Args:
             output_format: The Pydantic model class to use for structured output.
             model_name: The Gemini model to use.
+            cache: Optional on-disk cache of previous extraction results.
+            chunk_tokens: Token budget per extraction call; larger corpora are split and extracted in parallel.
+            max_tokens: Hard ceiling on the estimated input tokens accepted per call to process_documents.
+            max_concurrency: Maximum number of chunks extracted at the same time.
         """
         self.output_format = output_format
         self.client = google_client
+        self.llm_client = LLMClient(self.client)
         self.llm = llm
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
 
     def process_documents(self, documents: List[str]) -> T:
+        """
+        Blocking wrapper around aprocess_documents for the CLI and batch runs.
+        """
+        return asyncio.run(self.aprocess_documents(documents))
+
+    async def aprocess_documents(self, documents: List[str]) -> T:
         """
         Process a list of text documents and extract structured information based on the model.
-        
+
         Args:
             documents: A list of strings, where each string is the content of a document.
-            
+
         Returns:
             T: The extracted structured data.
         """
-        
+        key = ExtractionCache.make_key(documents, self.output_format, self.llm, PROMPT_VERSION)
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, key, self.output_format)
+            if cached is not None:
+                return cached
+
+        # Identical packs uploaded at the same time (e.g. a cohort's shared company) share one extraction
+        result = await flights.do("extract", flight_key(key, self.chunk_tokens, self.max_tokens), lambda: self._extract_and_cache(key, documents))
+        # Callers that joined share the result object; hand each one its own copy
+        return result.model_copy(deep=True)
+
+    async def _extract_and_cache(self, key: str, documents: List[str]) -> T:
+        result = await self._map_reduce(documents)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, result)
+        return result
+
+    async def _map_reduce(self, documents: List[str]) -> T:
+        """
+        Packs the documents into token-budgeted chunks, extracts a partial result
+        per chunk in parallel and merges the partials deterministically.
+        """
+        total_tokens = sum(estimate_tokens(doc) for doc in documents)
+        if self.max_tokens is not None and total_tokens > self.max_tokens:
+            raise TokenBudgetExceeded(f"Documents are ~{total_tokens} tokens, over the {self.max_tokens} token limit.")
+
+        chunks = pack_documents(documents, self.chunk_tokens)
+        if len(chunks) == 1:
+            return await self._extract(chunks[0])
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def extract_chunk(chunk: List[str]) -> T:
+            async with semaphore:
+                return await self._extract(chunk)
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(extract_chunk(chunk)) for chunk in chunks]
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0]
+        return merge_all([task.result() for task in tasks])
+
+    async def _extract(self, documents: List[str]) -> T:
         # Combine documents into a single context.
-        combined_text = "\n\n--- DOCUMENT SEPARATOR ---\n\n".join(documents)
-        
+        combined_text = SEPARATOR.join(documents)
+
         prompt = f"""
         You are an expert information extraction system.
         Your task is to analyze the provided text documents and extract information to populate the {self.output_format.__name__} schema.
-        
+        The documents may only be part of a larger set; extract what is present and do not invent missing details.
+
         Extract all relevant details.
         Ensure that the output strictly adheres to the provided JSON schema.
         If a field is optional and information is not found, omit it or set it to null/empty as appropriate for the type.
         """
-        
-        response = self.client.models.generate_content(
+
+        response = await self.llm_client.generate(
+            operation="extract",
             model=self.llm,
             contents=[prompt, combined_text],
             config=types.GenerateContentConfig(
@@ -49,8 +118,8 @@ class InformationExtractionPipeline(Generic[T]):
                 response_schema=self.output_format,
             ),
         )
-        
+
         if not response.parsed:
              raise ValueError(f"Failed to parse the response into the {self.output_format.__name__} model.")
-             
+
         return response.parsed
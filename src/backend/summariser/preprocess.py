@@ -0,0 +1,133 @@
+import hashlib
+import html
+import re
+from typing import List
+
+from src.backend.models import PreprocessingReport
+from src.backend.summariser.chunking import estimate_tokens
+
+_HTML_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+# Only real tag names: Markdown and plain text use angle brackets for autolinks
+# (<https://...>), emails and generic types (Map<String, List<Order>>, Vec<u8>)
+_HTML_TAGS = (
+    "a|abbr|article|aside|b|blockquote|body|br|caption|center|code|col|colgroup|dd|del|details|div|dl|dt|"
+    "em|figcaption|figure|font|footer|h[1-6]|head|header|hr|html|i|img|ins|kbd|li|main|mark|nav|ol|p|"
+    "picture|pre|q|s|section|small|source|span|strike|strong|sub|summary|sup|table|tbody|td|tfoot|th|"
+    "thead|title|tr|tt|u|ul|wbr"
+)
+_HTML_TAG_RE = re.compile(rf"</?(?:{_HTML_TAGS})(?:\s[^<>\n]*)?/?>", re.IGNORECASE)
+_HORIZONTAL_RULE_RE = re.compile(r"^[ \t]*([-*_=])([ \t]*\1){2,}[ \t]*$", re.MULTILINE)
+_INLINE_WHITESPACE_RE = re.compile(r"[ \t\f\v\u00a0]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_WORD_RE = re.compile(r"\w+")
+
+def normalise_text(text: str) -> str:
+    """
+    Strips markup that carries no information for extraction (HTML comments
+    and tags, entities, horizontal rules) and collapses whitespace.
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _HTML_COMMENT_RE.sub("", text)
+    text = _HTML_TAG_RE.sub("", text)
+    text = html.unescape(text)
+    text = _HORIZONTAL_RULE_RE.sub("", text)
+    text = "\n".join(_normalise_line(line) for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+def _normalise_line(line: str) -> str:
+    # Leading indentation is structure in YAML and code snippets, keep it
+    content = line.lstrip()
+    indent = line[: len(line) - len(content)].replace("\t", "    ")
+    return indent + _INLINE_WHITESPACE_RE.sub(" ", content).rstrip() if content else ""
+
+def _shingles(words: List[str], size: int) -> set[int]:
+    if len(words) <= size:
+        return {hash(" ".join(words))}
+    return {hash(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+class ParagraphDeduplicator:
+    """
+    Drops paragraphs that were already seen, either verbatim (after
+    normalisation) or nearly so: two paragraphs whose word shingles have a
+    Jaccard similarity of at least `threshold` count as duplicates. An inverted
+    index over shingles keeps the comparison to candidate paragraphs only.
+    """
+
+    def __init__(self, threshold: float = 0.6, shingle_size: int = 3, min_words: int = 8):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        # Short paragraphs (headings, list labels) give structure and are never dropped
+        self.min_words = min_words
+        self._exact: set[str] = set()
+        self._kept: List[set[int]] = []
+        self._index: dict[int, List[int]] = {}
+
+    def is_duplicate(self, paragraph: str) -> bool:
+        words = _WORD_RE.findall(paragraph.lower())
+        if len(words) < self.min_words:
+            return False
+
+        fingerprint = hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+        if fingerprint in self._exact:
+            return True
+
+        shingles = _shingles(words, self.shingle_size)
+        overlaps: dict[int, int] = {}
+        for shingle in shingles:
+            for kept_id in self._index.get(shingle, ()):
+                overlaps[kept_id] = overlaps.get(kept_id, 0) + 1
+        for kept_id, overlap in overlaps.items():
+            union = len(shingles) + len(self._kept[kept_id]) - overlap
+            if overlap / union >= self.threshold:
+                return True
+
+        self._exact.add(fingerprint)
+        kept_id = len(self._kept)
+        self._kept.append(shingles)
+        for shingle in shingles:
+            self._index.setdefault(shingle, []).append(kept_id)
+        return False
+
+def preprocess_documents(documents: List[str], threshold: float = 0.6) -> tuple[List[str], PreprocessingReport]:
+    """
+    Normalises documents and removes exact and near-duplicate paragraphs across
+    the whole set, keeping the first occurrence. Documents left empty are dropped.
+
+    Args:
+        documents: Raw document texts.
+        threshold: Jaccard similarity above which two paragraphs are duplicates.
+
+    Returns:
+        tuple[List[str], PreprocessingReport]: the cleaned documents and what was saved.
+    """
+    deduplicator = ParagraphDeduplicator(threshold=threshold)
+    cleaned: List[str] = []
+    paragraphs_removed = 0
+    for document in documents:
+        kept = []
+        for paragraph in normalise_text(document).split("\n\n"):
+            if deduplicator.is_duplicate(paragraph):
+                paragraphs_removed += 1
+            else:
+                kept.append(paragraph)
+        text = "\n\n".join(p for p in kept if p)
+        if text:
+            cleaned.append(text)
+
+    bytes_in = sum(len(doc.encode("utf-8")) for doc in documents)
+    bytes_out = sum(len(doc.encode("utf-8")) for doc in cleaned)
+    report = PreprocessingReport(
+        documents_in=len(documents),
+        documents_out=len(cleaned),
+        paragraphs_removed=paragraphs_removed,
+        bytes_in=bytes_in,
+        bytes_out=bytes_out,
+        tokens_saved=sum(estimate_tokens(doc) for doc in documents) - sum(estimate_tokens(doc) for doc in cleaned),
+    )
+    return cleaned, report
+
+def combine_reports(*reports: PreprocessingReport) -> PreprocessingReport:
+    return PreprocessingReport(**{
+        field: sum(getattr(report, field) for report in reports)
+        for field in PreprocessingReport.model_fields
+    })
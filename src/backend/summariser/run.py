@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 from src.backend.summariser.pipeline import InformationExtractionPipeline
 from src.backend.models import CompanyInfo
 from src.backend.summariser.utils import read_documents_from_directory
+from src.backend.summariser.preprocess import preprocess_documents
 
 def main():
     load_dotenv()
@@ -28,6 +29,9 @@ def main():
         print("No documents found to process.")
         return
 
+    documents, report = preprocess_documents(documents)
+    print(f"Preprocessing removed {report.paragraphs_removed} duplicate paragraphs, saving ~{report.tokens_saved} tokens.")
+
     print(f"Found {len(documents)} documents. Processing...")
     
     try:
@@ -1,9 +1,10 @@
 import os
 from typing import List
+from src.backend.summariser.loaders import DocumentLoader
 
 def read_documents_from_directory(directory_path: str) -> List[str]:
     """
-    Reads all file contents from a directory and returns them as a list of strings.
+    Reads all documents in a directory (text, PDF, DOCX, HTML, JSON, YAML) and returns their text.
     
     Args:
         directory_path: Path to the directory containing documents.
@@ -16,13 +17,5 @@ def read_documents_from_directory(directory_path: str) -> List[str]:
         print(f"Warning: Directory {directory_path} does not exist.")
         return documents
 
-    for filename in os.listdir(directory_path):
-        filepath = os.path.join(directory_path, filename)
-        if os.path.isfile(filepath):
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    documents.append(f.read())
-            except Exception as e:
-                print(f"Skipping file {filename}: {e}")
-                
-    return documents
+    # Same loader as /api/init, so the CLI accepts (and skips) exactly the same files
+    return DocumentLoader().load_directory(directory_path)
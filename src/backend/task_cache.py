@@ -0,0 +1,33 @@
+import hashlib
+import json
+import os
+
+from src.backend.metrics import registry
+from src.backend.models import Plan
+from src.backend.summariser.cache import ExtractionCache
+
+TASK_CACHE_DIR = os.path.join(".cache", "tasks")
+
+def make_task_key(task: Plan, context: list[str], model: str, prompt_version: str) -> str:
+    """
+    Hashes everything a task's README and implementation depend on: the task
+    itself, the company/candidate context sent in its prompts, the model and the
+    prompt version. Editing one task in the plan only invalidates that task.
+    """
+    payload = {
+        "task": task.model_dump(mode="json"),
+        "context": context,
+        "model": model,
+        "prompt_version": prompt_version,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Generated task artifacts share the extraction cache's storage, TTL and LRU eviction
+task_cache = ExtractionCache(directory=TASK_CACHE_DIR)
+
+def _collect_task_cache_stats():
+    stats = task_cache.stats()
+    for name in ("hits", "misses", "evictions"):
+        yield f"katalab_task_cache_{name}_total", "counter", f"Task artifact cache {name}", {}, stats[name]
+
+registry.add_collector(_collect_task_cache_stats)
@@ -0,0 +1,28 @@
+import asyncio
+from typing import AsyncGenerator, Iterator, TypeVar
+
+T = TypeVar("T")
+
+def iterate_sync(agen: AsyncGenerator[T, None]) -> Iterator[T]:
+    """
+    Drives an async generator from synchronous code on a private event loop.
+
+    Used by the blocking entry points (CLI, run_pipeline, tests) so that the
+    async implementation stays the single source of truth.
+
+    Args:
+        agen: The async generator to consume.
+
+    Returns:
+        Iterator[T]: the items yielded by the async generator, in order.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
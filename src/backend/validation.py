@@ -0,0 +1,230 @@
+"""
+Static checks of generated kata files.
+
+Each file is checked in a worker process, so a pathological file (deeply
+nested expressions, a huge literal) cannot stall the event loop, and each check
+runs under its own timeout, counted inside the worker from when the check
+starts:
+
+- Python files must compile;
+- JSON, TOML and YAML files must parse;
+- Python test files may only import names that the task's own modules define,
+  and modules that are either files of the task or installed.
+
+Keep this module's imports light: worker processes import it to run checks.
+"""
+import ast
+import asyncio
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import posixpath
+import resource
+import signal
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.backend.metrics import registry
+
+VALIDATION_TIMEOUT = float(os.environ.get("KATALAB_VALIDATION_TIMEOUT", "5"))
+
+registry.describe("katalab_validation_seconds", "histogram", "Wall time of statically checking one task's generated files")
+registry.describe("katalab_validation_failures_total", "counter", "Generated files failing static checks, by file extension")
+
+# Attempts per file when its worker dies; every check in flight fails with the pool, not just the culprit
+CRASH_ATTEMPTS = 3
+
+_executor: ProcessPoolExecutor | None = None
+
+def _workers() -> int:
+    return int(os.environ.get("KATALAB_VALIDATION_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # forkserver: the server process runs threads (sqlite, to_thread) that fork would copy mid-flight
+        _executor = ProcessPoolExecutor(max_workers=_workers(), mp_context=multiprocessing.get_context("forkserver"))
+    return _executor
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """Makes the next check start a fresh pool; only called once `pool` is broken."""
+    global _executor
+    if _executor is pool:
+        _executor = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+async def warm_pool():
+    """Starts the worker processes ahead of the first build, so no check waits for them."""
+    loop = asyncio.get_running_loop()
+    pool = _pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, check_file, "warm.py", "") for _ in range(_workers())))
+
+def shutdown_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def is_test_file(filename: str) -> bool:
+    name = posixpath.basename(filename)
+    return filename.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py") or "tests/" in filename or name == "conftest.py")
+
+def _module_path(module: str) -> list[str]:
+    base = module.replace(".", "/")
+    return [f"{base}.py", f"{base}/__init__.py"]
+
+def _defined_names(body: list[ast.stmt]) -> set[str] | None:
+    """
+    Top-level names a module defines, or None if they cannot be known
+    statically. Names bound anywhere under `if`/`try`/`with` blocks count.
+    """
+    names = set()
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            continue
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                names.add(child.id)
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                names.add(child.name)
+            elif isinstance(child, (ast.Import, ast.ImportFrom)):
+                for alias in child.names:
+                    if alias.name == "*":
+                        return None
+                    names.add(alias.asname or alias.name.split(".")[0])
+    return None if "__getattr__" in names else names
+
+def _is_available(module: str, modules: dict[str, str]) -> bool:
+    """Whether `module` is a file of the task or, failing that, importable here."""
+    top = module.split(".")[0]
+    if any(path in modules for path in _module_path(top)):
+        # A task package: its submodules must be task files too
+        return any(path in modules for path in _module_path(module))
+    # Only the top-level name is looked up, so nothing gets imported
+    return importlib.util.find_spec(top) is not None
+
+def _check_imports(filename: str, tree: ast.Module, modules: dict[str, str]) -> list[str]:
+    issues = []
+    package = posixpath.dirname(filename)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if not _is_available(alias.name, modules):
+                    issues.append(f"line {node.lineno}: imports '{alias.name}', which is not part of the task or installed")
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package
+                for _ in range(node.level - 1):
+                    base = posixpath.dirname(base)
+                module = ".".join(part for part in [base.replace("/", "."), node.module or ""] if part)
+            else:
+                module = node.module or ""
+            source = next((modules[path] for path in _module_path(module) if path in modules), None)
+            if source is None:
+                if node.level:
+                    issues.append(f"line {node.lineno}: relative import of '{module}', which is not a file of this task")
+                elif not _is_available(module, modules):
+                    issues.append(f"line {node.lineno}: imports from '{module}', which is not part of the task or installed")
+                continue
+            try:
+                defined = _defined_names(ast.parse(source).body)
+            except SyntaxError:
+                # Reported against that module itself
+                continue
+            if defined is None:
+                continue
+            prefix = module.replace(".", "/") + "/"
+            # `from package import module` names a file rather than an attribute
+            submodules = {path[len(prefix):].split("/")[0].removesuffix(".py") for path in modules if path.startswith(prefix)}
+            missing = [alias.name for alias in node.names if alias.name != "*" and alias.name not in defined and alias.name not in submodules]
+            if missing:
+                issues.append(f"line {node.lineno}: imports {missing} from '{module}', which does not define them")
+    return issues
+
+def check_file(filename: str, content: str, modules: dict[str, str] | None = None) -> list[str]:
+    """
+    Returns the problems found in one file (empty if it passed). `modules` maps
+    the task's Python file paths to their source, for resolving test imports.
+    """
+    extension = posixpath.splitext(filename)[1].lower()
+    try:
+        if extension == ".py":
+            tree = ast.parse(content, filename=filename)
+            compile(tree, filename, "exec")
+            if modules is not None and is_test_file(filename):
+                return _check_imports(filename, tree, modules)
+        elif extension == ".json":
+            json.loads(content)
+        elif extension == ".toml":
+            tomllib.loads(content)
+        elif extension in (".yaml", ".yml"):
+            import yaml
+            list(yaml.safe_load_all(content))
+    except SyntaxError as e:
+        return [f"line {e.lineno}: {e.msg}"]
+    except Exception as e:
+        return [f"{type(e).__name__}: {e}"]
+    return []
+
+class _CheckTimeout(BaseException):
+    # Not an Exception, so check_file's own error handling cannot swallow it
+    pass
+
+def _on_alarm(signum, frame):
+    raise _CheckTimeout
+
+def _timed_check(filename: str, content: str, modules: dict[str, str] | None, timeout: float) -> list[str]:
+    """
+    Runs check_file in a pool worker under `timeout`, so time spent queued or
+    starting the worker does not count. A check stuck inside C code (e.g.
+    compiling a pathological expression) cannot be interrupted; the CPU limit
+    then kills the worker instead.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    limit = math.ceil(usage.ru_utime + usage.ru_stime + timeout) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (limit if hard == resource.RLIM_INFINITY else min(limit, hard), hard))
+    signal.signal(signal.SIGALRM, _on_alarm)
+    try:
+        try:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            return check_file(filename, content, modules)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except _CheckTimeout:
+        return [f"validation timed out after {timeout:g}s"]
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+async def validate_files(files: dict[str, str], timeout: float = VALIDATION_TIMEOUT) -> dict[str, list[str]]:
+    """
+    Checks every file in parallel worker processes and returns the problems by
+    filename, only for files that failed. A check that exceeds `timeout` counts
+    as a failure, and so does one whose worker process keeps dying.
+    """
+    loop = asyncio.get_running_loop()
+    modules = {path: content for path, content in files.items() if path.endswith(".py")}
+
+    async def check(filename: str, content: str) -> list[str]:
+        args = (filename, content, modules if is_test_file(filename) else None, timeout)
+        for _ in range(CRASH_ATTEMPTS):
+            pool = _pool()
+            try:
+                return await loop.run_in_executor(pool, _timed_check, *args)
+            except BrokenProcessPool:
+                # A worker died (killed by its CPU limit or the OS); retry in a fresh pool
+                _reset_pool(pool)
+        return ["validation worker crashed while checking this file"]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(check(filename, content) for filename, content in files.items()))
+    registry.observe("katalab_validation_seconds", time.perf_counter() - start)
+    failed = {filename: issues for filename, issues in zip(files, results) if issues}
+    for filename in failed:
+        registry.inc("katalab_validation_failures_total", {"extension": posixpath.splitext(filename)[1].lower() or "none"})
+    return failed
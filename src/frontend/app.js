@@ -2,7 +2,9 @@ const state = {
     companyFiles: [],
     employeeFiles: [],
     sessionId: null,
-    plan: null
+    plan: null,
+    // path -> <pre> element showing that file as it streams in
+    buildFiles: {}
 };
 
 const dom = {
@@ -23,6 +25,7 @@ const dom = {
     uploadBtn: document.getElementById('upload-btn'),
 
     processingText: document.getElementById('processing-text'),
+    buildPreview: document.getElementById('build-preview'),
     planContent: document.getElementById('plan-content'),
     feedbackInput: document.getElementById('feedback-input'),
     regenerateBtn: document.getElementById('regenerate-btn'),
@@ -131,6 +134,11 @@ async function uploadFiles() {
 
         renderPlan();
         showSection('plan-section');
+
+        if (data.skipped_files && data.skipped_files.length > 0) {
+            const skipped = data.skipped_files.map(f => `- ${f.filename}: ${f.reason}`).join('\n');
+            alert(`Some files were skipped:\n${skipped}`);
+        }
     } catch (error) {
         console.error(error);
         alert('An error occurred during upload/parsing.');
@@ -154,6 +162,9 @@ function renderPlan() {
             <ul class="task-list">
                 ${p.tasks.map((t, i) => `
                     <li class="task-item">
+                        <label class="task-target" title="Only revise the selected tasks">
+                            <input type="checkbox" class="task-target-input" value="${t.id}"> revise
+                        </label>
                         <div class="task-title">${i + 1}. ${t.name}</div>
                         <div class="task-desc">${t.description}</div>
                         <div class="task-desc" style="margin-top:0.5rem;">Files: ${t.files.join(', ')}</div>
@@ -168,6 +179,9 @@ async function regeneratePlan() {
     const feedback = dom.feedbackInput.value;
     if (!feedback) return;
 
+    // Selected tasks are revised on their own; with none selected the model picks what to change
+    const taskIds = Array.from(dom.planContent.querySelectorAll('.task-target-input:checked')).map(el => el.value);
+
     showSection('processing-section');
     dom.processingText.textContent = "Refining plan based on feedback...";
 
@@ -177,7 +191,8 @@ async function regeneratePlan() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 session_id: state.sessionId,
-                feedback: feedback
+                feedback: feedback,
+                task_ids: taskIds.length > 0 ? taskIds : null
             })
         });
 
@@ -196,23 +211,15 @@ async function regeneratePlan() {
     }
 }
 
-async function buildRepo() {
-    showSection('processing-section');
-    dom.processingText.textContent = "Initializing build...";
+// Reads an NDJSON build stream, returning how many events arrived and whether the build ended
+async function readBuildEvents(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let count = 0;
+    let finished = false;
 
     try {
-        const response = await fetch('/api/build', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ session_id: state.sessionId })
-        });
-
-        if (!response.ok) throw new Error('Build failed to start');
-
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
-        let buffer = '';
-
         while (true) {
             const { done, value } = await reader.read();
             if (done) break;
@@ -225,12 +232,49 @@ async function buildRepo() {
                 if (!line.trim()) continue;
                 try {
                     const event = JSON.parse(line);
+                    count += 1;
+                    finished = finished || event.type === 'complete' || event.type === 'error';
                     handleBuildEvent(event);
                 } catch (e) {
                     console.error("Error parsing stream line:", e, line);
                 }
             }
         }
+    } catch (e) {
+        // Connection dropped; the build keeps running on the server
+        console.error("Build stream interrupted:", e);
+    }
+    return { count, finished };
+}
+
+async function buildRepo() {
+    showSection('processing-section');
+    dom.processingText.textContent = "Initializing build...";
+    dom.buildPreview.innerHTML = '';
+    state.buildFiles = {};
+
+    try {
+        let response = await fetch('/api/build', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ session_id: state.sessionId })
+        });
+
+        if (!response.ok) throw new Error('Build failed to start');
+
+        const jobId = response.headers.get('X-Build-Job');
+        let seen = 0;
+        for (let attempt = 0; attempt < 5; attempt++) {
+            const { count, finished } = await readBuildEvents(response);
+            seen += count;
+            if (finished || !jobId) return;
+
+            // Resume from the last event we saw
+            dom.processingText.textContent = "Reconnecting to build...";
+            response = await fetch(`/api/build/${jobId}/events?since=${seen}`);
+            if (!response.ok) throw new Error('Failed to resume build');
+        }
+        throw new Error('Lost connection to the build');
 
     } catch (error) {
         console.error(error);
@@ -239,9 +283,33 @@ async function buildRepo() {
     }
 }
 
+function previewFile(path) {
+    if (!state.buildFiles[path]) {
+        const wrapper = document.createElement('div');
+        wrapper.className = 'preview-file';
+        const title = document.createElement('div');
+        title.className = 'preview-path';
+        title.textContent = path;
+        const body = document.createElement('pre');
+        wrapper.append(title, body);
+        dom.buildPreview.appendChild(wrapper);
+        state.buildFiles[path] = body;
+    }
+    return state.buildFiles[path];
+}
+
 function handleBuildEvent(event) {
     if (event.type === 'log') {
         dom.processingText.textContent = event.message;
+    } else if (event.type === 'file_delta') {
+        const body = previewFile(event.path);
+        body.textContent += event.chunk;
+        body.scrollTop = body.scrollHeight;
+    } else if (event.type === 'file') {
+        // Only streamed files are previewed; the final event replaces their partial text
+        if (state.buildFiles[event.path]) {
+            state.buildFiles[event.path].textContent = event.content;
+        }
     } else if (event.type === 'complete') {
         dom.downloadBtn.parentElement.href = event.download_url;
         showSection('success-section');
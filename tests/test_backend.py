@@ -1,8 +1,12 @@
+import asyncio
+import io
+import zipfile
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from src.backend.builder import KataBuilder
-from src.backend.models import CompanyInfo, EmployeeInfo, KataPlan, Plan, Team, Role, TaskImplementation, FileContent
-from src.backend.agent import KataAgent
+from src.backend.models import BatchedTask, CompanyInfo, EmployeeInfo, KataPlan, Plan, PlanRevision, Team, Role, TaskBatch, TaskImplementation, FileContent
+from src.backend.agent import KataAgent, RevisionMismatch, UnknownTaskId, apply_revision
+from src.backend.summariser.chunking import TokenBudgetExceeded
 
 # Mock Data
 MOCK_COMPANY = CompanyInfo(
@@ -84,7 +88,7 @@ def test_agent_plan():
     with patch("src.backend.agent.google_client") as mock_client:
         mock_response = MagicMock()
         mock_response.parsed = MOCK_PLAN
-        mock_client.models.generate_content.return_value = mock_response
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
         
         agent = KataAgent()
         plan = agent.plan(MOCK_COMPANY, MOCK_EMPLOYEE)
@@ -97,14 +101,14 @@ def test_agent_plan_n_tasks_prompt():
     with patch("src.backend.agent.google_client") as mock_client:
         mock_response = MagicMock()
         mock_response.parsed = MOCK_PLAN
-        mock_client.models.generate_content.return_value = mock_response
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
         
         tasks_count = 7
         agent = KataAgent(n_tasks=tasks_count)
         agent.plan(MOCK_COMPANY, MOCK_EMPLOYEE)
         
         # Check call args
-        call_args = mock_client.models.generate_content.call_args
+        call_args = mock_client.aio.models.generate_content.call_args
         assert call_args is not None
         
         # contents arg is the first positional or "contents" kwarg
@@ -121,22 +125,31 @@ def test_agent_plan_n_tasks_prompt():
         # but we can assume if it runs without error and passes schema it's working.
         assert config.response_schema is not None
 
+def mock_stream(chunks_for, delay_for=lambda prompt: 0):
+    """Builds a fake `generate_content_stream` that streams `chunks_for(prompt)`."""
+    async def generate_content_stream(model, contents, config):
+        chunks = chunks_for(contents[0])
+
+        async def stream():
+            for chunk in chunks:
+                await asyncio.sleep(delay_for(contents[0]))
+                yield MagicMock(text=chunk)
+        return stream()
+    return generate_content_stream
+
 def test_agent_run():
     with patch("src.backend.agent.google_client") as mock_client:
         agent = KataAgent()
         agent.latest_plan = MOCK_PLAN
         
         # Mock responses
-        # 1. README response
-        mock_readme_response = MagicMock()
-        mock_readme_response.text = "Mock README content"
+        # 1. README response, streamed in chunks
+        mock_client.aio.models.generate_content_stream = mock_stream(lambda prompt: ["Mock README", " content"])
         
         # 2. Implementation response
         mock_impl_response = MagicMock()
         mock_impl_response.parsed = TaskImplementation(files=[FileContent(filename="main.py", content="code")])
-        
-        # Set side_effect for generate_content to return appropriate mock
-        mock_client.models.generate_content.side_effect = [mock_readme_response, mock_impl_response]
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_impl_response)
         
         # Consume generator
         events = list(agent.run(MOCK_COMPANY, MOCK_EMPLOYEE))
@@ -149,3 +162,393 @@ def test_agent_run():
         assert "task_1/README.md" in files
         assert "task_1/main.py" in files
         assert files["task_1/main.py"] == "code"
+
+        # README deltas arrive before the assembled file
+        deltas = [e for e in events if e['type'] == 'file_delta']
+        assert [(e['path'], e['chunk']) for e in deltas] == [("task_1/README.md", "Mock README"), ("task_1/README.md", " content")]
+        assert events.index(deltas[-1]) < events.index(next(e for e in events if e.get('path') == "task_1/README.md" and e['type'] == 'file'))
+        assert files["task_1/README.md"] == "Mock README content"
+
+def test_builder_async_flow(mock_summariser, mock_employee_extractor, mock_agent, tmp_path):
+    mock_summariser.arun = AsyncMock(return_value=MOCK_COMPANY)
+    mock_employee_extractor.arun = AsyncMock(return_value=MOCK_EMPLOYEE)
+    mock_agent.aplan = AsyncMock(return_value=MOCK_PLAN)
+
+    async def mock_async_generator(*args, **kwargs):
+        yield {"type": "file", "path": "task_1/main.py", "content": "print('hello')"}
+    mock_agent.arun.side_effect = mock_async_generator
+
+    async def flow():
+        builder = KataBuilder(docs=["fake doc"], employee_docs=["fake employee doc"], output_dir=str(tmp_path))
+        assert await builder._aparse_data() == MOCK_COMPANY
+        assert await builder._aparse_employee_data() == MOCK_EMPLOYEE
+        assert await builder._aplan_repo(feedback="harder") == MOCK_PLAN
+        events = [event async for event in builder._abuild_repo()]
+        return builder, events
+
+    builder, events = asyncio.run(flow())
+    mock_agent.aplan.assert_awaited_once_with(company_data=MOCK_COMPANY, employee_data=MOCK_EMPLOYEE, feedback="harder")
+    assert events == [{"type": "file", "path": "task_1/main.py", "content": "print('hello')"}]
+    assert builder.repo["task_1/main.py"] == "print('hello')"
+    # The zip is written while the build streams
+    with zipfile.ZipFile(builder.zip_path) as archive:
+        assert archive.read("task_1/main.py") == b"print('hello')"
+
+def test_agent_run_parallel_ordering():
+    slow = Plan(id="slow_task", name="Slow", description="Takes a while", files=["main.py"])
+    fast = Plan(id="fast_task", name="Fast", description="Quick one", files=["main.py"])
+
+    async def fake_generate_content(model, contents, config):
+        prompt = contents[0]
+        await asyncio.sleep(0.2 if "Slow" in prompt or "slow" in prompt else 0.01)
+        response = MagicMock()
+        if config.response_schema is TaskImplementation:
+            name = "slow.py" if "slow" in prompt else "fast.py"
+            response.parsed = TaskImplementation(files=[FileContent(filename=name, content="code")])
+        return response
+
+    def readme_chunks(prompt):
+        return ["# slow readme"] if "Slow" in prompt else ["# fast readme"]
+
+    def file_paths(ordered):
+        with patch("src.backend.agent.google_client") as mock_client:
+            mock_client.aio.models.generate_content = AsyncMock(side_effect=fake_generate_content)
+            mock_client.aio.models.generate_content_stream = mock_stream(readme_chunks, lambda prompt: 0.2 if "Slow" in prompt else 0.01)
+            agent = KataAgent(max_concurrency=2)
+            agent.latest_plan = KataPlan(title="Kata", description="d", tasks=[slow, fast])
+            events = list(agent.run(MOCK_COMPANY, MOCK_EMPLOYEE, ordered=ordered))
+        return [e["path"] for e in events if e["type"] == "file"]
+
+    ordered_paths = file_paths(ordered=True)
+    assert ordered_paths == ["README.md", "slow_task/README.md", "slow_task/slow.py", "fast_task/README.md", "fast_task/fast.py"]
+
+    completion_paths = file_paths(ordered=False)
+    assert completion_paths[1:3] == ["fast_task/README.md", "fast_task/fast.py"]
+    assert sorted(completion_paths) == sorted(ordered_paths)
+
+def test_builder_parse_inputs_concurrently(mock_summariser, mock_employee_extractor, mock_agent):
+    async def slow_company(docs):
+        await asyncio.sleep(0.1)
+        return MOCK_COMPANY
+
+    async def slow_employee(docs):
+        await asyncio.sleep(0.1)
+        return MOCK_EMPLOYEE
+
+    mock_summariser.arun = AsyncMock(side_effect=slow_company)
+    mock_employee_extractor.arun = AsyncMock(side_effect=slow_employee)
+
+    builder = KataBuilder(docs=["fake doc"], employee_docs=["fake employee doc"])
+    company, employee = asyncio.run(builder._aparse_inputs())
+    assert (company, employee) == (MOCK_COMPANY, MOCK_EMPLOYEE)
+    assert builder.data == MOCK_COMPANY and builder.employee_data == MOCK_EMPLOYEE
+
+def test_builder_parse_inputs_cancels_other_side(mock_summariser, mock_employee_extractor, mock_agent):
+    cancelled = asyncio.Event()
+
+    async def hanging_company(docs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    mock_summariser.arun = AsyncMock(side_effect=hanging_company)
+    mock_employee_extractor.arun = AsyncMock(side_effect=RuntimeError("quota exceeded"))
+
+    builder = KataBuilder(docs=["fake doc"], employee_docs=["fake employee doc"])
+    with pytest.raises(ValueError, match="Employee extraction failed: quota exceeded"):
+        asyncio.run(builder._aparse_inputs())
+    assert cancelled.is_set()
+
+def test_builder_session_token_ceiling(mock_summariser, mock_employee_extractor, mock_agent):
+    builder = KataBuilder(docs=["x" * 400], employee_docs=["y" * 400], max_input_tokens=150)
+    with pytest.raises(TokenBudgetExceeded):
+        asyncio.run(builder._aparse_inputs())
+    mock_summariser.arun.assert_not_called()
+
+def test_builder_preprocesses_before_extraction(mock_summariser, mock_employee_extractor, mock_agent):
+    mock_summariser.arun = AsyncMock(return_value=MOCK_COMPANY)
+    mock_employee_extractor.arun = AsyncMock(return_value=MOCK_EMPLOYEE)
+    paragraph = "We are a small team building reliable payment infrastructure for European banks."
+
+    builder = KataBuilder(docs=[paragraph, paragraph + "\n\n<br>Contact us"], employee_docs=["fake employee doc"])
+    asyncio.run(builder._aparse_inputs())
+
+    mock_summariser.arun.assert_awaited_once_with([paragraph, "Contact us"])
+    assert builder.preprocessing.paragraphs_removed == 1
+
+THREE_TASK_PLAN = KataPlan(title="Kata", description="d", tasks=[
+    Plan(id=f"task_{i}", name=f"Task {i}", description=f"Step {i}", files=["main.py"]) for i in range(1, 4)
+])
+
+def test_agent_revise_keeps_unchanged_tasks():
+    harder = Plan(id="task_3", name="Task 3", description="Step 3, now with concurrency", files=["main.py", "worker.py"])
+    with patch("src.backend.agent.google_client") as mock_client:
+        mock_response = MagicMock()
+        mock_response.parsed = PlanRevision(tasks=[harder])
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
+        agent = KataAgent(n_tasks=3)
+        agent._record_version(THREE_TASK_PLAN, None, ["task_1", "task_2", "task_3"])
+
+        plan = agent.revise(MOCK_COMPANY, MOCK_EMPLOYEE, feedback="make task 3 harder", task_ids=["task_3"])
+
+        prompt = mock_client.aio.models.generate_content.call_args.kwargs["contents"][0]
+        assert "task_3" in prompt and MOCK_COMPANY.model_dump_json(indent=2) not in prompt
+
+        with pytest.raises(UnknownTaskId):
+            agent.revise(MOCK_COMPANY, MOCK_EMPLOYEE, feedback="x", task_ids=["task_9"])
+
+    assert plan.tasks[:2] == THREE_TASK_PLAN.tasks[:2]
+    assert plan.tasks[2] == harder
+    assert [(v.version, v.changed_task_ids) for v in agent.plan_history] == [(1, ["task_1", "task_2", "task_3"]), (2, ["task_3"])]
+    assert agent.plan_history[1].feedback == "make task 3 harder"
+
+def test_apply_revision_only_touches_targets():
+    renamed = Plan(id="harder_task", name="Task 2", description="Harder", files=["main.py"])
+    stray = Plan(id="task_1", name="Task 1", description="Changed anyway", files=["main.py"])
+    plan, changed = apply_revision(THREE_TASK_PLAN, PlanRevision(tasks=[stray, renamed]), task_ids=["task_2"])
+    assert changed == ["task_2"]
+    assert plan.tasks[0] == THREE_TASK_PLAN.tasks[0]
+    assert plan.tasks[1].id == "task_2" and plan.tasks[1].description == "Harder"
+    assert plan.title == THREE_TASK_PLAN.title
+
+def test_apply_revision_matches_renamed_ids_by_name_or_rejects_them():
+    renamed = Plan(id="task_two", name="task 2", description="Harder", files=["main.py"])
+    plan, changed = apply_revision(THREE_TASK_PLAN, PlanRevision(tasks=[renamed]))
+    assert changed == ["task_2"]
+    assert plan.tasks[1].id == "task_2" and plan.tasks[1].description == "Harder"
+    assert [task.id for task in plan.tasks] == [task.id for task in THREE_TASK_PLAN.tasks]
+
+    extra = Plan(id="task_4", name="Task 4", description="New", files=["main.py"])
+    with pytest.raises(RevisionMismatch, match="task_4"):
+        apply_revision(THREE_TASK_PLAN, PlanRevision(tasks=[renamed, extra]))
+
+def test_agent_revise_retries_a_revision_with_unknown_tasks():
+    invented = Plan(id="task_4", name="Task 4", description="New", files=["main.py"])
+    harder = Plan(id="task_3", name="Task 3", description="Harder", files=["main.py"])
+    with patch("src.backend.agent.google_client") as mock_client:
+        responses = [MagicMock(parsed=PlanRevision(tasks=[invented])), MagicMock(parsed=PlanRevision(tasks=[harder]))]
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=responses)
+        agent = KataAgent(n_tasks=3)
+        agent._record_version(THREE_TASK_PLAN, None, ["task_1", "task_2", "task_3"])
+
+        plan = agent.revise(MOCK_COMPANY, MOCK_EMPLOYEE, feedback="make the last task harder")
+        assert plan.tasks[2] == harder
+
+        mock_client.aio.models.generate_content = AsyncMock(return_value=MagicMock(parsed=PlanRevision(tasks=[invented])))
+        with pytest.raises(RevisionMismatch):
+            agent.revise(MOCK_COMPANY, MOCK_EMPLOYEE, feedback="add a task")
+        assert mock_client.aio.models.generate_content.await_count == 2
+    assert len(agent.plan_history) == 2
+
+def test_agent_rebuild_reuses_cached_tasks(tmp_path):
+    from src.backend.summariser.cache import ExtractionCache
+
+    async def fake_generate_content(model, contents, config):
+        response = MagicMock()
+        response.parsed = TaskImplementation(files=[FileContent(filename="main.py", content="code")])
+        return response
+
+    with patch("src.backend.agent.google_client") as mock_client:
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=fake_generate_content)
+        mock_client.aio.models.generate_content_stream = mock_stream(lambda prompt: ["# readme"])
+        agent = KataAgent(n_tasks=3, cache=ExtractionCache(directory=str(tmp_path)))
+        agent.latest_plan = THREE_TASK_PLAN
+        first = {e["path"]: e["content"] for e in agent.run(MOCK_COMPANY, MOCK_EMPLOYEE) if e["type"] == "file"}
+        assert mock_client.aio.models.generate_content.await_count == 3
+
+        harder = THREE_TASK_PLAN.tasks[2].model_copy(update={"description": "Harder"})
+        agent.latest_plan = THREE_TASK_PLAN.model_copy(update={"tasks": THREE_TASK_PLAN.tasks[:2] + [harder]})
+        events = list(agent.run(MOCK_COMPANY, MOCK_EMPLOYEE))
+
+    second = {e["path"]: e["content"] for e in events if e["type"] == "file"}
+    assert mock_client.aio.models.generate_content.await_count == 4
+    assert {path: second[path] for path in first if path.startswith(("task_1/", "task_2/"))} == \
+        {path: first[path] for path in first if path.startswith(("task_1/", "task_2/"))}
+    assert set(second) == set(first)
+    assert [e["path"] for e in events if e["type"] == "file_delta"] == ["task_3/README.md"]
+
+def test_speculative_tasks_are_picked_up_by_the_build(tmp_path):
+    from src.backend.summariser.cache import ExtractionCache
+
+    async def slow_generate_content(model, contents, config):
+        await asyncio.sleep(0.2)
+        response = MagicMock()
+        response.parsed = TaskImplementation(files=[FileContent(filename="main.py", content="code")])
+        return response
+
+    with patch("src.backend.agent.google_client") as mock_client:
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=slow_generate_content)
+        mock_client.aio.models.generate_content_stream = mock_stream(lambda prompt: ["# readme"])
+        agent = KataAgent(n_tasks=3, cache=ExtractionCache(directory=str(tmp_path)), speculative_concurrency=1)
+        agent.latest_plan = THREE_TASK_PLAN
+
+        async def scenario():
+            assert agent.speculate(MOCK_COMPANY, MOCK_EMPLOYEE) == 3
+            # Feedback changes task 3 before its speculative generation got a slot
+            harder = THREE_TASK_PLAN.tasks[2].model_copy(update={"description": "Harder"})
+            agent.latest_plan = THREE_TASK_PLAN.model_copy(update={"tasks": THREE_TASK_PLAN.tasks[:2] + [harder]})
+            assert agent.speculate(MOCK_COMPANY, MOCK_EMPLOYEE) == 1
+            # Task 1 is done and task 2 is mid-generation when the user approves; the
+            # first validation also starts the worker pool, so wait rather than sleep
+            second = agent._task_key(THREE_TASK_PLAN.tasks[1], MOCK_COMPANY, MOCK_EMPLOYEE)
+            while second not in agent._speculation_started:
+                await asyncio.sleep(0.01)
+            return [event async for event in agent.arun(MOCK_COMPANY, MOCK_EMPLOYEE)]
+
+        events = asyncio.run(scenario())
+
+    logs = [e["message"] for e in events if e["type"] == "log"]
+    assert "[1/3] reusing unchanged task: Task 1" in logs
+    assert "[2/3] using task generated ahead of the build: Task 2" in logs
+    # Task 3 was still queued, so the build generated it itself; nothing was generated twice
+    assert [e["path"] for e in events if e["type"] == "file_delta"] == ["task_3/README.md"]
+    assert mock_client.aio.models.generate_content.await_count == 3
+    assert {e["path"] for e in events if e["type"] == "file"} == {"README.md"} | {f"task_{i}/{name}" for i in range(1, 4) for name in ("README.md", "main.py")}
+
+def test_speculative_tasks_that_produce_nothing_count_as_failed(tmp_path):
+    from src.backend.metrics import registry
+    from src.backend.summariser.cache import ExtractionCache
+
+    async def empty_generate_content(model, contents, config):
+        response = MagicMock()
+        response.parsed = None
+        return response
+
+    before = {outcome: registry.counter_value("katalab_speculative_tasks_total", {"outcome": outcome}) for outcome in ("generated", "failed")}
+    with patch("src.backend.agent.google_client") as mock_client:
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=empty_generate_content)
+        mock_client.aio.models.generate_content_stream = mock_stream(lambda prompt: ["# readme"])
+        agent = KataAgent(n_tasks=1, cache=ExtractionCache(directory=str(tmp_path)))
+        agent.latest_plan = THREE_TASK_PLAN.model_copy(update={"tasks": THREE_TASK_PLAN.tasks[:1]})
+
+        async def scenario():
+            agent.speculate(MOCK_COMPANY, MOCK_EMPLOYEE)
+            while agent._speculative:
+                await asyncio.sleep(0.01)
+
+        asyncio.run(scenario())
+
+    assert registry.counter_value("katalab_speculative_tasks_total", {"outcome": "failed"}) == before["failed"] + 1
+    assert registry.counter_value("katalab_speculative_tasks_total", {"outcome": "generated"}) == before["generated"]
+
+def test_agent_batched_generation_falls_back_per_task():
+    implementation = TaskImplementation(files=[FileContent(filename="main.py", content="code")])
+
+    async def fake_generate_content(model, contents, config):
+        response = MagicMock()
+        if config.response_schema is TaskBatch:
+            # First batch only covers task_1, second is truncated and fails to parse
+            covers_task_1 = "Task id: task_1" in contents[0]
+            response.parsed = TaskBatch(tasks=[BatchedTask(task_id="task_1", readme="# one", implementation=implementation)]) if covers_task_1 else None
+        else:
+            response.parsed = implementation
+        return response
+
+    with patch("src.backend.agent.google_client") as mock_client:
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=fake_generate_content)
+        mock_client.aio.models.generate_content_stream = mock_stream(lambda prompt: ["# readme"])
+        agent = KataAgent(n_tasks=3, batch_size=2)
+        agent.latest_plan = THREE_TASK_PLAN
+        events = list(agent.run(MOCK_COMPANY, MOCK_EMPLOYEE))
+
+    schemas = [call.kwargs["config"].response_schema for call in mock_client.aio.models.generate_content.await_args_list]
+    assert schemas.count(TaskBatch) == 2
+    assert schemas.count(TaskImplementation) == 2
+    files = {e["path"]: e["content"] for e in events if e["type"] == "file"}
+    assert files["task_1/README.md"] == "# one"
+    assert files["task_2/README.md"] == files["task_3/README.md"] == "# readme"
+    assert {f"task_{i}/main.py" for i in range(1, 4)} <= set(files)
+    # Ordered mode still emits tasks in plan order
+    task_paths = [e["path"].split("/")[0] for e in events if e["type"] == "file" and "/" in e["path"]]
+    assert task_paths == sorted(task_paths)
+
+def test_context_digest_keeps_relevant_roles_and_is_cached():
+    from src.backend.context import build_context_digest
+
+    teams = [Team(name=f"Team {i}", size=4, context="Builds things " * 40, tools_used=[f"Tool{i}"], philosophy=[]) for i in range(6)]
+    company = CompanyInfo(
+        roles=[Role(title=f"Role {i}", stack=[f"Lang{i}"], requirements="Lots of detail " * 40) for i in range(6)]
+              + [Role(title="Python Dev", stack=["Python", "FastAPI"], requirements="APIs", team=teams[5])],
+        teams=teams,
+        philosophy="Move fast",
+    )
+    digest = build_context_digest(company, MOCK_EMPLOYEE)
+    assert "Python Dev [Team 5]" in digest.text
+    assert "Role 3" not in digest.text
+    assert digest.tokens * 3 < digest.full_tokens
+
+    with patch("src.backend.agent.google_client"):
+        agent = KataAgent()
+        assert agent.context(company, MOCK_EMPLOYEE) is agent.context(company, MOCK_EMPLOYEE)
+        assert agent.context(MOCK_COMPANY, MOCK_EMPLOYEE).text != digest.text
+
+def test_streamed_zip_round_trips():
+    from src.backend.archive import iter_zip
+
+    files = [("README.md", "# Kata"), ("task_1/main.py", "x = 1\n" * 1000)]
+    data = b"".join(iter_zip(files))
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert [(name, archive.read(name).decode()) for name in archive.namelist()] == files
+
+def test_zip_writer_discards_partial_archive(tmp_path):
+    from src.backend.archive import ZipStreamWriter
+
+    async def build(fail: bool):
+        writer = ZipStreamWriter(str(tmp_path / "kata_repo.zip"))
+        writer.add("README.md", "# Kata")
+        if fail:
+            await writer.abort()
+        else:
+            await writer.close()
+
+    asyncio.run(build(fail=True))
+    assert list(tmp_path.iterdir()) == []
+    asyncio.run(build(fail=False))
+    assert [p.name for p in tmp_path.iterdir()] == ["kata_repo.zip"]
+
+def test_zip_writer_keeps_last_version_of_duplicate_files(tmp_path):
+    from src.backend.archive import ZipStreamWriter
+
+    async def build():
+        writer = ZipStreamWriter(str(tmp_path / "kata_repo.zip"))
+        writer.add("README.md", "# Kata")
+        writer.add("task_1/main.py", "x = 1")
+        writer.add("README.md", "# Kata, revised")
+        return await writer.close()
+
+    with zipfile.ZipFile(asyncio.run(build())) as archive:
+        assert archive.namelist() == ["README.md", "task_1/main.py"]
+        assert archive.read("README.md").decode() == "# Kata, revised"
+    assert [p.name for p in tmp_path.iterdir()] == ["kata_repo.zip"]
+
+def test_single_flight_shares_work_and_survives_caller_cancellation():
+    from src.backend.metrics import registry
+    from src.backend.singleflight import SingleFlight, flight_key, normalise_text
+
+    group = SingleFlight()
+    calls = []
+    before = registry.counter_value("katalab_singleflight_coalesced_total", {"operation": "test"})
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def scenario():
+        key = flight_key("s1", normalise_text("Make it  HARDER"))
+        assert key == flight_key("s1", normalise_text("make it harder"))
+        leader = asyncio.create_task(group.do("test", key, work))
+        await asyncio.sleep(0)
+        joined = asyncio.create_task(group.do("test", key, work))
+        await asyncio.sleep(0)
+        # The first caller going away does not cancel the shared work
+        leader.cancel()
+        assert await joined == 1
+        # Once finished, the key is free and the next call starts new work
+        assert await group.do("test", key, work) == 2
+        assert group.in_flight() == 0
+
+    asyncio.run(scenario())
+    assert registry.counter_value("katalab_singleflight_coalesced_total", {"operation": "test"}) == before + 1
@@ -0,0 +1,35 @@
+import asyncio
+import os
+import zipfile
+from unittest.mock import patch
+from src.backend.batch import candidate_names, run_batch
+from src.backend.fake_client import FakeGenAIClient
+from src.backend.llm import recent_calls
+
+CASE_STUDIES = os.path.join(os.path.dirname(__file__), "..", "case-studies")
+
+def test_candidate_names_are_unique():
+    assert candidate_names(["cs/alice", "cs/bob/candidate", "other/alice"]) == ["alice", "bob", "alice_2"]
+
+def test_batch_builds_one_zip_per_candidate(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = FakeGenAIClient()
+    case_studies = sorted(os.path.join(CASE_STUDIES, name) for name in os.listdir(CASE_STUDIES))
+    company_dir = os.path.join(case_studies[0], "company")
+
+    def company_extractions():
+        return sum(1 for call in recent_calls if call.operation == "extract" and call.schema_name == "CompanyInfo")
+
+    before = company_extractions()
+    with patch("src.backend.agent.google_client", client), patch("src.backend.summariser.pipeline.google_client", client):
+        report = asyncio.run(run_batch(company_dir, case_studies + [case_studies[0]], str(tmp_path / "out"), concurrency=2, n_tasks=2))
+
+    assert report["succeeded"] == 3 and report["failed"] == 0
+    assert os.path.exists(tmp_path / "out" / "report.json")
+    for candidate in report["candidates"]:
+        assert set(candidate["timings"]) == {"extract", "plan", "build", "total"}
+        with zipfile.ZipFile(candidate["zip_path"]) as archive:
+            assert "task_2/README.md" in archive.namelist()
+
+    # The shared company pack is extracted once for the whole cohort
+    assert company_extractions() == before + 1
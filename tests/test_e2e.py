@@ -0,0 +1,91 @@
+import asyncio
+import io
+import zipfile
+import httpx
+import pytest
+from unittest.mock import patch
+from benchmarks.e2e import run_benchmark
+from src.backend.agent import KataAgent
+from src.backend.fake_client import FakeGenAIClient, fake_instance
+from src.backend.llm import recent_calls
+from src.backend.models import CompanyInfo, EmployeeInfo, TaskImplementation
+from src.backend.session_store import FileSessionStore
+from src.backend.sessions import SessionManager
+
+@pytest.fixture
+def fake_llm():
+    client = FakeGenAIClient()
+    with patch("src.backend.agent.google_client", client), patch("src.backend.summariser.pipeline.google_client", client):
+        yield client
+
+def test_fake_client_returns_schema_valid_responses(fake_llm):
+    company = fake_instance(CompanyInfo)
+    employee = fake_instance(EmployeeInfo)
+    agent = KataAgent(n_tasks=4)
+    plan = agent.plan(company, employee)
+    assert len(plan.tasks) == 4
+    assert len({task.id for task in plan.tasks}) == 4
+
+    events = list(agent.run(company, employee))
+    files = [e["path"] for e in events if e["type"] == "file"]
+    assert "task_4/tests/test_task.py" in files
+    assert isinstance(fake_instance(TaskImplementation), TaskImplementation)
+
+def test_fake_client_is_deterministic():
+    first = FakeGenAIClient(latency=0.01, jitter=0.05).models
+    second = FakeGenAIClient(latency=0.01, jitter=0.05).models
+    assert first._delay("m", "prompt") == second._delay("m", "prompt")
+    assert 0.01 <= first._delay("m", "prompt") <= 0.06
+
+def test_e2e_benchmark_smoke(fake_llm, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.backend import main
+    monkeypatch.setattr(main, "session_manager", SessionManager(FileSessionStore(str(tmp_path / "sessions"))))
+
+    report = asyncio.run(run_benchmark([2], sessions=2, n_tasks=2, app=main.app))
+    (level,) = report["levels"]
+    assert level["errors"] == []
+    assert level["completed"] == 2
+    assert set(level["latency_seconds"]) == {"init", "plan", "build", "download", "total"}
+    assert level["latency_seconds"]["total"]["p99"] >= level["latency_seconds"]["build"]["p50"]
+    assert level["peak_rss_bytes"] > 0
+    assert report["cache"] == "cold"
+
+def test_metrics_endpoint_reports_llm_calls(fake_llm, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.backend import main
+    monkeypatch.setattr(main, "session_manager", SessionManager(FileSessionStore(str(tmp_path / "sessions"))))
+    asyncio.run(run_benchmark([1], sessions=1, n_tasks=1, app=main.app))
+
+    async def scrape():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.get("/api/metrics")
+
+    response = asyncio.run(scrape())
+    assert response.status_code == 200
+    for operation in ("extract", "plan", "readme", "implementation"):
+        assert f'operation="{operation}"' in response.text
+    assert "katalab_llm_call_seconds_bucket" in response.text
+    assert "katalab_extraction_cache_hits_total" in response.text
+    assert any(call.session_id for call in recent_calls)
+
+def test_streamed_download_matches_staged_zip(fake_llm, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.backend import main
+    manager = SessionManager(FileSessionStore(str(tmp_path / "sessions")))
+    monkeypatch.setattr(main, "session_manager", manager)
+    asyncio.run(run_benchmark([1], sessions=1, n_tasks=2, app=main.app))
+    (session_id,) = manager.store.ids()
+
+    async def download(stream: bool):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.get(f"/api/download/{session_id}", params={"stream": stream})
+
+    def contents(response):
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+
+    staged, streamed = asyncio.run(download(False)), asyncio.run(download(True))
+    assert streamed.headers["content-type"] == "application/zip"
+    assert contents(streamed) == contents(staged)
+    assert "task_2/README.md" in contents(streamed)
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+from src.backend.coordination import LeaseStore
+from src.backend.jobs import JobManager, RemoteBuildJob
+
+def make_builder(fail: bool = False):
+    builder = MagicMock()
+
+    async def build(ordered=None):
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield {"type": "file", "path": f"task_{i}/README.md", "content": "# task"}
+        if fail:
+            raise RuntimeError("boom")
+    builder._abuild_repo = build
+    return builder
+
+def test_jobs_are_single_flight_per_session_and_resumable(tmp_path):
+    manager = JobManager(workers=2, directory=str(tmp_path))
+    saved = []
+
+    async def scenario():
+        builder = make_builder()
+        job = manager.submit("s1", builder, save=lambda session_id, b: saved.append(session_id))
+        assert manager.submit("s1", builder, save=lambda *args: None) is job
+        other = manager.submit("s2", make_builder(), save=lambda *args: None)
+        assert other is not job
+
+        everything = [event async for event in job.follow()]
+        resumed = [event async for event in job.follow(since=2)]
+        await asyncio.wait_for(other.follow().__anext__(), timeout=1)
+        return job, everything, resumed
+
+    job, everything, resumed = asyncio.run(scenario())
+    assert job.status == "done"
+    assert saved == ["s1"]
+    assert [e["type"] for e in everything] == ["log", "file", "file", "file", "complete"]
+    assert resumed == everything[2:]
+
+    # Finished jobs are dropped from memory and served from their logs
+    assert job.job_id not in manager.jobs
+    assert manager.get(job.job_id).events == everything
+
+    # A fresh manager (e.g. after a restart) serves the persisted log
+    restored = JobManager(directory=str(tmp_path)).get(job.job_id)
+    assert restored.status == "done" and restored.session_id == "s1"
+    assert restored.events == everything
+    assert JobManager(directory=str(tmp_path)).get("../etc") is None
+
+def test_failed_job_reports_error_and_releases_session(tmp_path):
+    manager = JobManager(workers=1, directory=str(tmp_path))
+
+    async def scenario():
+        job = manager.submit("s1", make_builder(fail=True), save=lambda *args: None)
+        events = [event async for event in job.follow()]
+        retry = manager.submit("s1", make_builder(), save=lambda *args: None)
+        return job, events, retry
+
+    job, events, retry = asyncio.run(scenario())
+    assert job.status == "failed"
+    assert events[-1] == {"type": "error", "message": "boom"}
+    assert retry is not job
+
+def test_leases_are_exclusive_until_released_or_expired(tmp_path):
+    leases = LeaseStore(str(tmp_path / "coordination.db"))
+    assert leases.acquire("build:s1", "a", ttl=30) == "a"
+    assert LeaseStore(str(tmp_path / "coordination.db")).acquire("build:s1", "b", ttl=30) == "a"
+    assert leases.renew("build:s1", "a", ttl=30)
+    assert not leases.renew("build:s1", "b", ttl=30)
+
+    leases.release("build:s1", "b")
+    assert leases.owner("build:s1") == "a"
+    leases.release("build:s1", "a")
+    assert leases.owner("build:s1") is None
+
+    # A holder that stops renewing loses the lease once it expires
+    assert leases.acquire("build:s2", "a", ttl=0.05) == "a"
+    time.sleep(0.1)
+    assert leases.owner("build:s2") is None
+    assert leases.acquire("build:s2", "b", ttl=30) == "b"
+
+def test_workers_sharing_leases_run_one_build_per_session(tmp_path):
+    # Two worker processes, modelled as two managers sharing the job folder and lease database
+    first = JobManager(workers=1, directory=str(tmp_path / "jobs"), leases=LeaseStore(str(tmp_path / "coordination.db")))
+    second = JobManager(workers=1, directory=str(tmp_path / "jobs"), leases=LeaseStore(str(tmp_path / "coordination.db")))
+    saved = []
+
+    async def scenario():
+        job = first.submit("s1", make_builder(), save=lambda session_id, b: saved.append(session_id))
+        joined = second.submit("s1", make_builder(), save=lambda session_id, b: saved.append("duplicate"))
+        assert isinstance(joined, RemoteBuildJob) and joined.job_id == job.job_id
+        assert second.is_active("s1")
+        assert second.get(job.job_id).status == "running"
+
+        followed = [event async for event in joined.follow()]
+        local = [event async for event in job.follow()]
+        return job, followed, local
+
+    job, followed, local = asyncio.run(scenario())
+    assert saved == ["s1"]
+    assert followed == local
+    assert second.get(job.job_id).status == "done"
+    assert not second.is_active("s1")
+
+def test_remote_job_is_interrupted_when_its_lease_lapses(tmp_path):
+    leases = LeaseStore(str(tmp_path / "coordination.db"))
+    log = tmp_path / "dead.ndjson"
+    log.write_text('{"type": "log", "message": "Build queued", "session_id": "s1"}\n')
+    leases.acquire("build:s1", "dead", ttl=0.05)
+
+    job = JobManager(directory=str(tmp_path), leases=leases).get("dead")
+    assert isinstance(job, RemoteBuildJob) and job.status == "running"
+    time.sleep(0.1)
+    job.refresh()
+    assert job.status == "interrupted"
+    assert len(job.events) == 1
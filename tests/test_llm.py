@@ -0,0 +1,181 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from google.genai import types
+from google.genai import errors
+from src.backend.llm import LLMClient, ResiliencePolicy, current_session, recent_calls
+from src.backend.metrics import MetricsRegistry, registry
+from src.backend.models import TaskImplementation
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    registry.describe("jobs_total", "counter", "Jobs run")
+    registry.describe("job_seconds", "histogram", "Job time", buckets=(0.5, 1.0))
+    registry.inc("jobs_total", {"kind": 'a"b'})
+    registry.observe("job_seconds", 0.7, {"kind": "a"})
+    registry.observe("job_seconds", 3.0, {"kind": "a"})
+    text = registry.render()
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{kind="a\\"b"} 1' in text
+    assert 'job_seconds_bucket{kind="a",le="0.5"} 0' in text
+    assert 'job_seconds_bucket{kind="a",le="1"} 1' in text
+    assert 'job_seconds_bucket{kind="a",le="+Inf"} 2' in text
+    assert 'job_seconds_sum{kind="a"} 3.7' in text
+
+def test_llm_client_records_calls():
+    response = MagicMock()
+    response.parsed = None
+    response.usage_metadata.prompt_token_count = 120
+    response.usage_metadata.candidates_token_count = 30
+    client = MagicMock()
+    client.aio.models.generate_content = AsyncMock(side_effect=[response, RuntimeError("429 RESOURCE_EXHAUSTED")])
+    llm = LLMClient(client, ResiliencePolicy(max_attempts=1))
+    config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=TaskImplementation)
+
+    async def calls():
+        current_session.set("session-1")
+        await llm.generate(operation="implementation", model="gemini", contents=["p"], config=config)
+        with pytest.raises(RuntimeError):
+            await llm.generate(operation="implementation", model="gemini", contents=["p"], config=config)
+
+    asyncio.run(calls())
+    empty, failed = list(recent_calls)[-2:]
+    assert (empty.outcome, empty.schema_name, empty.session_id) == ("empty", "TaskImplementation", "session-1")
+    assert (empty.prompt_tokens, empty.response_tokens) == (120, 30)
+    assert failed.outcome == "error" and "RESOURCE_EXHAUSTED" in failed.error
+
+def _response(parsed):
+    response = MagicMock()
+    response.parsed = parsed
+    return response
+
+def test_llm_client_retries_rate_limits_and_empty_parses():
+    ok = _response(TaskImplementation(files=[]))
+    client = MagicMock()
+    client.aio.models.generate_content = AsyncMock(side_effect=[
+        errors.ClientError(429, {"error": {"message": "RESOURCE_EXHAUSTED"}}),
+        _response(None),
+        ok,
+    ])
+    llm = LLMClient(client, ResiliencePolicy(base_delay=0))
+    config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=TaskImplementation)
+    before = registry.counter_value("katalab_llm_retries_total", {"operation": "retry", "model": "gemini", "reason": "429"})
+
+    result = asyncio.run(llm.generate(operation="retry", model="gemini", contents=["p"], config=config))
+
+    assert result is ok
+    assert client.aio.models.generate_content.await_count == 3
+    assert registry.counter_value("katalab_llm_retries_total", {"operation": "retry", "model": "gemini", "reason": "429"}) == before + 1
+    assert registry.counter_value("katalab_llm_retries_total", {"operation": "retry", "model": "gemini", "reason": "empty"}) >= 1
+
+def test_llm_client_does_not_retry_client_errors():
+    client = MagicMock()
+    client.aio.models.generate_content = AsyncMock(side_effect=errors.ClientError(400, {"error": {"message": "bad request"}}))
+    llm = LLMClient(client, ResiliencePolicy(base_delay=0))
+
+    with pytest.raises(errors.ClientError):
+        asyncio.run(llm.generate(operation="bad", model="gemini", contents=["p"]))
+    assert client.aio.models.generate_content.await_count == 1
+
+def test_llm_client_hedges_slow_requests():
+    calls = 0
+
+    async def generate_content(**kwargs):
+        nonlocal calls
+        calls += 1
+        # Warm-up calls are fast; the first real call stalls and the hedge wins
+        await asyncio.sleep(10 if calls == 4 else 0.01)
+        return MagicMock(text=f"call {calls}")
+
+    client = MagicMock()
+    client.aio.models.generate_content = generate_content
+    llm = LLMClient(client, ResiliencePolicy(hedge=True, hedge_min_samples=3))
+
+    async def run():
+        for _ in range(3):
+            await llm.generate(operation="hedge", model="gemini-hedge", contents=["p"])
+        return await asyncio.wait_for(llm.generate(operation="hedge", model="gemini-hedge", contents=["p"]), timeout=5)
+
+    result = asyncio.run(run())
+    assert result.text == "call 5"
+    # The losing attempt is cancelled and finished before generate returns
+    assert list(recent_calls)[-1].outcome == "cancelled"
+    assert registry.counter_value("katalab_llm_hedges_total", {"operation": "hedge", "model": "gemini-hedge"}) == 1
+
+def test_llm_client_streams_and_retries_before_first_chunk():
+    attempts = 0
+
+    async def generate_content_stream(**kwargs):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise errors.ServerError(503, {"error": {"message": "UNAVAILABLE"}})
+
+        async def stream():
+            for text in ("Hello", "", " world"):
+                await asyncio.sleep(0.01)
+                yield MagicMock(text=text)
+        return stream()
+
+    client = MagicMock()
+    client.aio.models.generate_content_stream = generate_content_stream
+    llm = LLMClient(client, ResiliencePolicy(base_delay=0))
+
+    async def collect():
+        return [chunk async for chunk in llm.stream(operation="stream", model="gemini", contents=["p"])]
+
+    assert asyncio.run(collect()) == ["Hello", " world"]
+    failed, streamed = list(recent_calls)[-2:]
+    assert failed.outcome == "error"
+    assert streamed.outcome == "ok"
+    assert 0 < streamed.ttfb_seconds < streamed.wall_seconds
+
+def test_llm_client_deadline_bounds_the_whole_call():
+    async def generate_content(**kwargs):
+        await asyncio.sleep(0.1)
+        raise errors.ServerError(503, {"error": {"message": "UNAVAILABLE"}})
+
+    async def generate_content_stream(**kwargs):
+        async def stream():
+            # Every chunk arrives within the attempt timeout, the stream as a whole does not
+            for _ in range(100):
+                await asyncio.sleep(0.05)
+                yield MagicMock(text="chunk")
+        return stream()
+
+    client = MagicMock()
+    client.aio.models.generate_content = generate_content
+    client.aio.models.generate_content_stream = generate_content_stream
+    llm = LLMClient(client, ResiliencePolicy(max_attempts=100, base_delay=0.05, attempt_timeout=1, deadline=0.3))
+
+    async def collect():
+        return [chunk async for chunk in llm.stream(operation="deadline", model="gemini-deadline", contents=["p"])]
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        with pytest.raises((TimeoutError, errors.ServerError)):
+            await llm.generate(operation="deadline", model="gemini-deadline", contents=["p"])
+        generate_seconds = loop.time() - start
+        start = loop.time()
+        with pytest.raises(TimeoutError):
+            await collect()
+        return generate_seconds, loop.time() - start
+
+    generate_seconds, stream_seconds = asyncio.run(run())
+    assert generate_seconds < 0.5
+    assert stream_seconds < 0.5
+
+def test_llm_client_records_attempt_timeouts():
+    async def generate_content(**kwargs):
+        await asyncio.sleep(1)
+
+    client = MagicMock()
+    client.aio.models.generate_content = generate_content
+    llm = LLMClient(client, ResiliencePolicy(max_attempts=1, attempt_timeout=0.05))
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(llm.generate(operation="slow", model="gemini-slow", contents=["p"]))
+    call = list(recent_calls)[-1]
+    assert call.outcome == "timeout"
+    assert call.error == "attempt timed out after 0.05s"
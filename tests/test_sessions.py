@@ -0,0 +1,266 @@
+import asyncio
+import os
+import time
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.backend.agent import RevisionMismatch, UnknownTaskId
+from src.backend.builder import KataBuilder
+from src.backend.models import CompanyInfo, EmployeeInfo, KataPlan, Plan, Role, Team
+from src.backend.session_store import FileSessionStore, SessionConflict, SessionStore, SQLiteSessionStore
+from src.backend.jobs import JobManager
+from src.backend.retention import RetentionPolicy, RetentionSweeper
+from src.backend.sessions import SessionExpired, SessionManager
+
+MOCK_COMPANY = CompanyInfo(
+    roles=[Role(title="Dev", stack=["Python"], requirements="Code")],
+    teams=[Team(name="Product", size=5, context="test context", tools_used=[], philosophy=[])],
+    philosophy="Move fast"
+)
+
+MOCK_EMPLOYEE = EmployeeInfo(
+    name="John Doe",
+    stack=["Python", "FastAPI"],
+    experience_yrs=5,
+    level="senior",
+    likely_learning_style="hands-on practical examples"
+)
+
+MOCK_PLAN = KataPlan(
+    title="Test Kata",
+    description="A test kata",
+    tasks=[Plan(id="task_1", name="Task 1", description="Do smth", files=["main.py"])]
+)
+
+@pytest.fixture(params=["sqlite", "files"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteSessionStore(path=str(tmp_path / "sessions.db"))
+    return FileSessionStore(directory=str(tmp_path / "sessions"))
+
+def test_store_round_trip(store):
+    store.put("abc", {"output_dir": "downloads/abc"})
+    store.put("def", {"output_dir": "downloads/def"})
+    store.put("abc", {"output_dir": "downloads/abc2"})
+    assert store.get("abc") == {"output_dir": "downloads/abc2"}
+    assert store.get("missing") is None
+    assert sorted(store.ids()) == ["abc", "def"]
+    store.delete("abc")
+    assert store.get("abc") is None
+
+def test_store_backends_must_implement_the_whole_interface():
+    class PartialStore(SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+def test_store_rejects_path_like_ids(store):
+    with pytest.raises(ValueError):
+        store.get("../etc/passwd")
+
+def test_session_manager_rehydrates_lazily(store):
+    builder = KataBuilder(docs=[], employee_docs=[], output_dir="downloads/s1")
+    builder.data = MOCK_COMPANY
+    builder.agent.latest_plan = MOCK_PLAN
+    SessionManager(store).save_session("s1", builder)
+
+    manager = SessionManager(store)
+    assert manager.sessions == {}
+    restored = manager.get_session("s1")
+    assert restored.output_dir == "downloads/s1"
+    assert restored.data == MOCK_COMPANY
+    assert restored.agent.latest_plan == MOCK_PLAN
+    assert manager.get_session("s1") is restored
+    assert manager.get_session("nope") is None
+    assert manager.get_session("../nope") is None
+
+def test_session_manager_persists_build_state(store):
+    builder = KataBuilder(docs=[], employee_docs=[], output_dir="downloads/s2", n_tasks=3, max_input_tokens=1000, task_batch_size=2)
+    builder.data = MOCK_COMPANY
+    builder.employee_data = MOCK_EMPLOYEE
+    builder.agent._record_version(MOCK_PLAN, "harder", ["task_1"])
+    builder.repo = {"README.md": "# Test Kata"}
+    SessionManager(store).save_session("s2", builder)
+
+    restored = SessionManager(store).get_session("s2")
+    assert restored.employee_data == MOCK_EMPLOYEE
+    assert restored.repo == {"README.md": "# Test Kata"}
+    assert restored.agent.n_tasks == 3
+    assert restored.max_input_tokens == 1000
+    assert restored.agent.batch_size == 2
+    assert restored.agent.latest_plan == MOCK_PLAN
+    assert [(v.version, v.feedback, v.plan) for v in restored.agent.plan_history] == [(1, "harder", MOCK_PLAN)]
+
+def test_session_managers_sharing_a_store_see_each_others_saves(store):
+    # Two worker processes: each has its own in-memory cache over the same store
+    first, second = SessionManager(store), SessionManager(store)
+    builder = KataBuilder(docs=[], employee_docs=[], output_dir="downloads/s3")
+    first.save_session("s3", builder)
+    cached = second.get_session("s3")
+    assert cached.agent.latest_plan is None
+    assert second.get_session("s3") is cached
+
+    builder.agent.latest_plan = MOCK_PLAN
+    first.save_session("s3", builder)
+    assert second.get_session("s3").agent.latest_plan == MOCK_PLAN
+
+    first.evict("s3")
+    with pytest.raises(SessionExpired):
+        second.get_session("s3")
+    assert "s3" not in second.sessions
+
+def test_store_put_compares_revisions(store):
+    first = store.put("cas", {"output_dir": "a"})
+    second = store.put("cas", {"output_dir": "b"}, expected_revision=first)
+    assert second == store.revision("cas") != first
+    with pytest.raises(SessionConflict):
+        store.put("cas", {"output_dir": "stale"}, expected_revision=first)
+    assert store.get("cas") == {"output_dir": "b"}
+
+def test_session_manager_rejects_saves_over_newer_copies(store):
+    first, second = SessionManager(store), SessionManager(store)
+    first.save_session("s5", KataBuilder(docs=[], employee_docs=[], output_dir="downloads/s5"))
+    stale = second.get_session("s5")
+
+    revised = first.get_session("s5")
+    revised.agent.latest_plan = MOCK_PLAN
+    first.save_session("s5", revised)
+
+    stale.agent.latest_plan = None
+    with pytest.raises(SessionConflict):
+        second.save_session("s5", stale)
+    assert second.get_session("s5").agent.latest_plan == MOCK_PLAN
+
+def test_saves_stay_conditional_after_the_builder_leaves_the_cache(store):
+    first, second = SessionManager(store, max_sessions=1), SessionManager(store)
+    first.save_session("s7", KataBuilder(docs=[], employee_docs=[], output_dir="downloads/s7"))
+    stale = first.get_session("s7")
+    # A long plan call: meanwhile the builder is evicted here and the plan revised elsewhere
+    first.save_session("other", KataBuilder(docs=[], employee_docs=[], output_dir="downloads/other"))
+    assert "s7" not in first.sessions
+    revised = second.get_session("s7")
+    revised.agent.latest_plan = MOCK_PLAN
+    second.save_session("s7", revised)
+
+    with pytest.raises(SessionConflict):
+        first.save_session("s7", stale)
+    assert first.get_session("s7").agent.latest_plan == MOCK_PLAN
+
+def test_legacy_migration_tolerates_another_worker_finishing_first(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sessions.json").write_text('{"old": {"output_dir": "downloads/old"}}')
+    real_replace = os.replace
+
+    def raced_replace(src, dst):
+        real_replace(src, dst)
+        if src == "sessions.json":
+            # The other worker renamed the file between our read and our rename
+            raise FileNotFoundError(src)
+
+    monkeypatch.setattr(os, "replace", raced_replace)
+    manager = SessionManager(FileSessionStore(str(tmp_path / "sessions")))
+    assert manager.store.get("old") == {"output_dir": "downloads/old"}
+
+def test_build_saves_keep_plans_saved_meanwhile(store):
+    first, second = SessionManager(store), SessionManager(store)
+    first.save_session("s6", KataBuilder(docs=[], employee_docs=[], output_dir="downloads/s6"))
+    building = first.get_session("s6")
+
+    # Another worker revises the plan while this one builds
+    revised = second.get_session("s6")
+    revised.agent.latest_plan = MOCK_PLAN
+    second.save_session("s6", revised)
+
+    building.repo = {"README.md": "# Test Kata"}
+    first.save_build("s6", building)
+    restored = SessionManager(store).get_session("s6")
+    assert restored.agent.latest_plan == MOCK_PLAN
+    assert restored.repo == {"README.md": "# Test Kata"}
+    assert first.get_session("s6") is not building
+
+def test_session_manager_lru_eviction(store):
+    manager = SessionManager(store, max_sessions=2)
+    for session_id in ["a", "b", "c"]:
+        manager.save_session(session_id, KataBuilder(docs=[], employee_docs=[], output_dir=f"downloads/{session_id}"))
+    assert list(manager.sessions) == ["b", "c"]
+
+    # Evicted sessions come back from the store and push out the least recently used one
+    manager.get_session("b")
+    assert manager.get_session("a").output_dir == "downloads/a"
+    assert list(manager.sessions) == ["b", "a"]
+
+def test_session_manager_byte_cap(store):
+    manager = SessionManager(store, max_bytes=10)
+    manager.save_session("small", KataBuilder(docs=["12345"], employee_docs=[], output_dir="downloads/small"))
+    manager.save_session("big", KataBuilder(docs=["1234567890"], employee_docs=[], output_dir="downloads/big"))
+    assert list(manager.sessions) == ["big"]
+
+def test_sweeper_evicts_sessions_over_quota(store, tmp_path):
+    downloads = tmp_path / "downloads"
+    manager = SessionManager(store)
+    for session_id in ["old", "mid", "new"]:
+        (downloads / session_id).mkdir(parents=True)
+        (downloads / session_id / "kata_repo.zip").write_bytes(b"zip")
+        manager.save_session(session_id, KataBuilder(docs=[], employee_docs=[], output_dir=str(downloads / session_id)))
+        time.sleep(0.01)
+
+    sweeper = RetentionSweeper(manager, JobManager(directory=str(tmp_path / "jobs")), RetentionPolicy(max_sessions=1), downloads_dir=str(downloads))
+    removed = sweeper.sweep()
+
+    assert removed["sessions"] == 2
+    assert sorted(os.listdir(downloads)) == ["new"]
+    assert manager.get_session("new") is not None
+    with pytest.raises(SessionExpired):
+        manager.get_session("old")
+    with pytest.raises(SessionExpired):
+        SessionManager(store).get_session("mid")
+
+    # Once the tombstone is gone the session is simply unknown
+    store.purge_tombstones(older_than=time.time() + 1)
+    assert manager.get_session("old") is None
+
+def test_sweeper_enforces_artifact_ttl_and_quota(store, tmp_path):
+    downloads = tmp_path / "downloads"
+    now = time.time()
+    for session_id, age in [("stale", 7200), ("older", 60), ("recent", 0)]:
+        (downloads / session_id).mkdir(parents=True)
+        path = downloads / session_id / "kata_repo.zip"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (now - age, now - age))
+
+    policy = RetentionPolicy(artifact_ttl_seconds=3600, max_artifact_bytes=150)
+    sweeper = RetentionSweeper(SessionManager(store), JobManager(directory=str(tmp_path / "jobs")), policy, downloads_dir=str(downloads))
+    assert sweeper.sweep()["artifacts"] == 2
+    assert [p.parent.name for p in downloads.glob("*/kata_repo.zip")] == ["recent"]
+
+def test_download_of_evicted_session_is_gone(store, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.backend import main
+    manager = SessionManager(store)
+    monkeypatch.setattr(main, "session_manager", manager)
+    manager.save_session("s1", KataBuilder(docs=[], employee_docs=[], output_dir="downloads/s1"))
+    manager.evict("s1")
+
+    async def download(session_id):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.get(f"/api/download/{session_id}")
+
+    assert asyncio.run(download("s1")).status_code == 410
+    assert asyncio.run(download("never")).status_code == 404
+
+def test_plan_errors_blame_the_request_or_the_model(store, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.backend import main
+    manager = SessionManager(store)
+    monkeypatch.setattr(main, "session_manager", manager)
+    manager.save_session("s1", KataBuilder(docs=[], employee_docs=[], output_dir="downloads/s1"))
+
+    async def revise(error):
+        with patch.object(KataBuilder, "_arevise_plan", AsyncMock(side_effect=error)):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+                return await client.post("/api/plan", json={"session_id": "s1", "feedback": "harder", "task_ids": ["task_9"]})
+
+    assert asyncio.run(revise(UnknownTaskId("Unknown task ids ['task_9']"))).status_code == 400
+    assert asyncio.run(revise(RevisionMismatch("The revision returned tasks ['task_4']"))).status_code == 502
@@ -0,0 +1,247 @@
+import asyncio
+import io
+import os
+import time
+import zipfile
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.backend.models import CompanyInfo, EmployeeInfo, Role, Team
+from src.backend.summariser.cache import ExtractionCache
+from src.backend.summariser.pipeline import InformationExtractionPipeline
+from src.backend.summariser.loaders import DocumentLoader, UnsupportedDocument, extract_text
+from src.backend.summariser.utils import read_documents_from_directory
+from src.backend.summariser.chunking import TokenBudgetExceeded, estimate_tokens, pack_documents
+from src.backend.summariser.merge import merge_all
+from src.backend.summariser.preprocess import normalise_text, preprocess_documents
+
+MOCK_COMPANY = CompanyInfo(
+    roles=[Role(title="Dev", stack=["Python"], requirements="Code")],
+    teams=[Team(name="Product", size=5, context="test context", tools_used=[], philosophy=[])],
+    philosophy="Move fast"
+)
+
+def test_cache_key_normalises_documents():
+    key = ExtractionCache.make_key(["a  b\n c", "second doc"], CompanyInfo, "gemini", "1")
+    assert key == ExtractionCache.make_key(["second doc", "a b c"], CompanyInfo, "gemini", "1")
+    assert key != ExtractionCache.make_key(["a b c", "second doc"], EmployeeInfo, "gemini", "1")
+    assert key != ExtractionCache.make_key(["a b c", "second doc"], CompanyInfo, "other-model", "1")
+    assert key != ExtractionCache.make_key(["a b c", "second doc"], CompanyInfo, "gemini", "2")
+
+def test_pipeline_uses_cache(tmp_path):
+    cache = ExtractionCache(directory=str(tmp_path))
+    with patch("src.backend.summariser.pipeline.google_client") as mock_client:
+        mock_response = MagicMock()
+        mock_response.parsed = MOCK_COMPANY
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
+
+        pipeline = InformationExtractionPipeline(output_format=CompanyInfo, llm="gemini", cache=cache)
+        assert pipeline.process_documents(["about us", "jd"]) == MOCK_COMPANY
+        assert pipeline.process_documents(["jd", "about  us"]) == MOCK_COMPANY
+
+    assert mock_client.aio.models.generate_content.await_count == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+
+def test_pipeline_coalesces_identical_concurrent_extractions():
+    with patch("src.backend.summariser.pipeline.google_client") as mock_client:
+        async def generate(**kwargs):
+            await asyncio.sleep(0.05)
+            response = MagicMock()
+            response.parsed = MOCK_COMPANY
+            return response
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=generate)
+
+        pipeline = InformationExtractionPipeline(output_format=CompanyInfo, llm="gemini")
+
+        async def two_uploads():
+            return await asyncio.gather(
+                pipeline.aprocess_documents(["about us", "jd"]),
+                pipeline.aprocess_documents(["jd", "about  us"]),
+            )
+        first, second = asyncio.run(two_uploads())
+
+    assert mock_client.aio.models.generate_content.await_count == 1
+    assert first == second == MOCK_COMPANY
+    assert first is not second
+
+def test_cache_ttl_and_size_eviction(tmp_path):
+    cache = ExtractionCache(directory=str(tmp_path), max_entries=2, ttl_seconds=60)
+    for key in ["a", "b", "c"]:
+        cache.put(key, MOCK_COMPANY)
+        time.sleep(0.01)
+    assert cache.get("a", CompanyInfo) is None
+    assert cache.get("c", CompanyInfo) == MOCK_COMPANY
+
+    # Entries older than the TTL are treated as misses and removed
+    expired = ExtractionCache(directory=str(tmp_path), ttl_seconds=0)
+    assert expired.get("b", CompanyInfo) is None
+    assert not os.path.exists(tmp_path / "b.json")
+
+class FakeUpload:
+    def __init__(self, filename, data):
+        self.filename = filename
+        self._buffer = io.BytesIO(data)
+
+    async def read(self, size=-1):
+        return self._buffer.read(size)
+
+def make_docx(paragraphs):
+    body = "".join(f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>" for p in paragraphs)
+    xml = f'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>{body}</w:body></w:document>'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", xml)
+    return buffer.getvalue()
+
+def test_extract_text_formats():
+    assert extract_text("about.html", b"<html><script>x()</script><p>We build</p><p>katas</p></html>") == "We build\nkatas"
+    assert extract_text("data.json", b'{\n  "a": [1, 2]\n}') == '{"a":[1,2]}'
+    assert extract_text("cv.docx", make_docx(["Senior engineer", "Python"])) == "Senior engineer\nPython"
+    assert extract_text("prefs.yaml", b"style: visual\n") == "style: visual\n"
+    with pytest.raises(UnsupportedDocument):
+        extract_text(".DS_Store", b"\x00\x00\x00\x01Bud1\x00\xff\xfe")
+
+def test_loader_enforces_limits_and_reports_skips():
+    loader = DocumentLoader(max_file_bytes=100, max_total_bytes=150)
+    uploads = [
+        FakeUpload("jd.md", b"a" * 80),
+        FakeUpload("huge.md", b"b" * 101),
+        FakeUpload("image.png", b"\x89PNG\r\n\x1a\n\x00\xff"),
+        FakeUpload("about.md", b"c" * 80),
+    ]
+    documents = asyncio.run(loader.aload_uploads(uploads))
+    assert documents == ["a" * 80]
+    assert [s.filename for s in loader.skipped] == ["huge.md", "image.png", "about.md"]
+    assert "upload limit" in loader.skipped[-1].reason
+
+def test_loader_skips_oversized_uploads_without_reading_them():
+    upload = FakeUpload("huge.md", b"b" * 101)
+    upload.size = 101
+    upload.read = AsyncMock(side_effect=AssertionError("should not be read"))
+    loader = DocumentLoader(max_file_bytes=100)
+    assert asyncio.run(loader.aload_uploads([upload])) == []
+    assert "100 byte limit" in loader.skipped[0].reason
+
+def test_request_size_limit_rejects_large_bodies_early():
+    import httpx
+    from fastapi import FastAPI, Request
+    from src.backend.main import RequestSizeLimit
+
+    inner = FastAPI()
+
+    @inner.post("/upload")
+    async def upload(request: Request):
+        return {"bytes": len(await request.body())}
+
+    app = RequestSizeLimit(inner, max_bytes=10)
+
+    async def body(size):
+        yield b"x" * size
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            small = await client.post("/upload", content=b"x" * 10)
+            declared = await client.post("/upload", content=b"x" * 11)
+            # No Content-Length: counted while the body streams in
+            streamed = await client.post("/upload", content=body(11))
+            malformed = await client.post("/upload", content=b"x", headers={"Content-Length": "ten"})
+            return small, declared, streamed, malformed
+
+    small, declared, streamed, malformed = asyncio.run(scenario())
+    assert small.json() == {"bytes": 10}
+    assert declared.status_code == 413
+    assert streamed.status_code == 413
+    assert malformed.status_code == 400
+
+def test_directory_loader_matches_case_study():
+    loader = DocumentLoader()
+    documents = loader.load_directory("case-studies/nebula_junior_dev")
+    assert documents == []
+    assert [s.filename for s in loader.skipped] == [".DS_Store"]
+    assert len(read_documents_from_directory("case-studies/nebula_junior_dev/company")) == 4
+
+def test_pack_documents_respects_budget():
+    documents = ["a" * 40, "b" * 40, "c" * 40, ("d" * 30 + "\n\n") * 5]
+    chunks = pack_documents(documents, budget=25)
+    for chunk in chunks:
+        assert sum(estimate_tokens(piece) for piece in chunk) <= 25
+    assert "".join("".join(chunk) for chunk in chunks).replace("\n", "") == "".join(documents).replace("\n", "")
+    assert pack_documents(["small", "docs"], budget=1000) == [["small", "docs"]]
+
+def test_merge_models_deduplicates():
+    first = CompanyInfo(
+        roles=[Role(title="Backend Engineer", stack=["Python", "Postgres"], requirements="APIs")],
+        teams=[Team(name="Platform", size=4, context=None, tools_used=["Docker"], philosophy=None)],
+        philosophy="Ship small"
+    )
+    second = CompanyInfo(
+        roles=[
+            Role(title="backend engineer", stack=["python", "Kafka"], requirements=""),
+            Role(title="Designer", stack=["Figma"], requirements="UX"),
+        ],
+        teams=[Team(name="Platform ", size=6, context="Owns infra", tools_used=["docker", "Terraform"], philosophy=["TDD"])],
+        philosophy="Other"
+    )
+    merged = merge_all([first, second])
+    assert [r.title for r in merged.roles] == ["Backend Engineer", "Designer"]
+    assert merged.roles[0].stack == ["Python", "Postgres", "Kafka"]
+    assert merged.roles[0].requirements == "APIs"
+    assert merged.teams[0].size == 6
+    assert merged.teams[0].context == "Owns infra"
+    assert merged.teams[0].tools_used == ["Docker", "Terraform"]
+    assert merged.philosophy == "Ship small"
+
+def test_pipeline_map_reduce_over_chunks():
+    partials = [
+        CompanyInfo(roles=[Role(title="Dev", stack=["Python"], requirements="Code")], teams=[], philosophy="Move fast"),
+        CompanyInfo(roles=[Role(title="Dev", stack=["Go"], requirements="")], teams=[], philosophy=""),
+    ]
+    with patch("src.backend.summariser.pipeline.google_client") as mock_client:
+        responses = []
+        for partial in partials:
+            response = MagicMock()
+            response.parsed = partial
+            responses.append(response)
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=responses)
+
+        pipeline = InformationExtractionPipeline(output_format=CompanyInfo, llm="gemini", chunk_tokens=30)
+        result = pipeline.process_documents(["x" * 100, "y" * 100])
+
+    assert mock_client.aio.models.generate_content.await_count == 2
+    assert result.roles[0].stack == ["Python", "Go"]
+    assert result.philosophy == "Move fast"
+
+    capped = InformationExtractionPipeline(output_format=CompanyInfo, llm="gemini", max_tokens=10)
+    with pytest.raises(TokenBudgetExceeded):
+        capped.process_documents(["z" * 100])
+
+def test_preprocess_removes_duplicates_and_markup():
+    team = "The Core Ledger Team manages the systems of record that track every penny of user funds across the platform."
+    documents = [
+        f"# About\n\n{team}\n\n<!-- draft -->We  value   <b>safety</b> &amp; speed.",
+        f"# Team\n\n{team.replace('every penny', 'each penny')}\n\n---\n\nconfig:\n    retries: 3",
+        f"{team.upper()}",
+    ]
+    cleaned, report = preprocess_documents(documents)
+    assert cleaned == [
+        f"# About\n\n{team}\n\nWe value safety & speed.",
+        "# Team\n\nconfig:\n    retries: 3",
+    ]
+    assert report.paragraphs_removed == 2
+    assert report.documents_in == 3 and report.documents_out == 2
+    assert report.bytes_out < report.bytes_in
+    assert report.tokens_saved > 0
+
+def test_normalise_keeps_angle_brackets_that_are_not_html():
+    text = "Repo: <https://github.com/nebula/api>. We use Map<String, List<Order>> and Vec<u8>; email <jobs@nebula.io>."
+    assert normalise_text(text) == text
+    assert normalise_text('<p class="lead">Rust <i>and</i> Go<br/></p>') == "Rust and Go"
+
+def test_junk_files_are_skipped():
+    loader = DocumentLoader()
+    documents = asyncio.run(loader.aload_uploads([
+        FakeUpload(".DS_Store", b"Bud1 plain looking bytes"),
+        FakeUpload("__MACOSX/._jd.md", b"resource fork"),
+        FakeUpload("jd.md", b"# Job"),
+    ]))
+    assert documents == ["# Job"]
+    assert [s.reason for s in loader.skipped] == ["system metadata file", "system metadata file"]
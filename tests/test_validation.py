@@ -0,0 +1,119 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.backend.agent import KataAgent
+from src.backend.models import CompanyInfo, EmployeeInfo, FileContent, KataPlan, Plan, Role, Team, TaskImplementation
+from src.backend import validation
+from src.backend.validation import check_file, validate_files
+
+MOCK_COMPANY = CompanyInfo(
+    roles=[Role(title="Dev", stack=["Python"], requirements="Code")],
+    teams=[Team(name="Product", size=5, context="test context", tools_used=[], philosophy=[])],
+    philosophy="Move fast"
+)
+
+MOCK_EMPLOYEE = EmployeeInfo(
+    name="John Doe",
+    stack=["Python", "FastAPI"],
+    experience_yrs=5,
+    level="senior",
+    likely_learning_style="hands-on practical examples"
+)
+
+SKELETON = "def solve(values):\n    raise NotImplementedError\n\nif __name__ == '__main__':\n    DEBUG = True\n"
+
+def test_check_file_formats():
+    assert check_file("main.py", SKELETON) == []
+    assert check_file("main.py", "def solve(:\n") == ["line 1: invalid syntax"]
+    assert check_file("config.json", '{"a": 1}') == []
+    assert check_file("config.json", "{a: 1}")[0].startswith("JSONDecodeError")
+    assert check_file("pyproject.toml", "[project\n")[0].startswith("TOMLDecodeError")
+    assert check_file(".github/ci.yml", "jobs: [1,\n")[0].startswith("ParserError")
+    assert check_file("service.js", "function (") == []
+
+def test_validate_files_resolves_test_imports():
+    files = {
+        "main.py": SKELETON,
+        "app/__init__.py": "",
+        "app/store.py": "from collections import *\n",
+        "app/models.py": "class Order:\n    pass\n",
+        "tests/test_task.py": (
+            "import pytest\n"
+            "from main import solve, DEBUG, parse\n"
+            "from app import models\n"
+            "from app.models import Order, Invoice\n"
+            "from app.store import anything\n"
+            "from inventory import reserve\n"
+            "from app.billing import Invoice\n"
+            "import os.path, missing_helpers\n"
+        ),
+    }
+    assert asyncio.run(validate_files(files)) == {"tests/test_task.py": [
+        "line 2: imports ['parse'] from 'main', which does not define them",
+        "line 4: imports ['Invoice'] from 'app.models', which does not define them",
+        "line 6: imports from 'inventory', which is not part of the task or installed",
+        "line 7: imports from 'app.billing', which is not part of the task or installed",
+        "line 8: imports 'missing_helpers', which is not part of the task or installed",
+    ]}
+
+def test_validate_files_times_out_slow_checks_without_recycling_the_pool():
+    files = {"main.py": SKELETON, "data.json": "[" + "1, " * 3_000_000 + "1]"}
+
+    async def scenario():
+        await validate_files({"main.py": SKELETON})
+        pool = validation._executor
+        failed = await validate_files(files, timeout=0.01)
+        assert validation._executor is pool
+        return failed
+
+    assert asyncio.run(scenario()) == {"data.json": ["validation timed out after 0.01s"]}
+
+def test_validate_files_reports_files_whose_worker_crashes():
+    def crashing_pool():
+        # Every worker exits as soon as it starts, like one killed by the OS
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("forkserver"), initializer=os._exit, initargs=(1,))
+
+    with patch.object(validation, "_pool", side_effect=crashing_pool) as pools:
+        failed = asyncio.run(validate_files({"main.py": SKELETON}))
+    assert failed == {"main.py": ["validation worker crashed while checking this file"]}
+    assert pools.call_count == validation.CRASH_ATTEMPTS
+
+def test_agent_regenerates_only_failing_files():
+    plan = KataPlan(title="Kata", description="d", tasks=[Plan(id="task_1", name="Task 1", description="Step 1", files=["main.py"])])
+    generated = TaskImplementation(files=[
+        FileContent(filename="main.py", content=SKELETON),
+        FileContent(filename="data.json", content='{"orders": []}'),
+        FileContent(filename="tests/test_task.py", content="from main import solve, parse\n"),
+    ])
+
+    async def fake_generate_content(model, contents, config):
+        response = MagicMock()
+        if config.response_schema is FileContent:
+            assert "File to fix: tests/test_task.py" in contents[0]
+            response.parsed = FileContent(filename="tests/test_task.py", content="from main import solve\n")
+        else:
+            response.parsed = generated
+        return response
+
+    async def fake_stream(model, contents, config):
+        async def stream():
+            yield MagicMock(text="# Task 1")
+        return stream()
+
+    with patch("src.backend.agent.google_client") as mock_client:
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=fake_generate_content)
+        mock_client.aio.models.generate_content_stream = fake_stream
+        agent = KataAgent(n_tasks=1)
+        agent.latest_plan = plan
+        events = list(agent.run(MOCK_COMPANY, MOCK_EMPLOYEE))
+
+    files = {e["path"]: e["content"] for e in events if e["type"] == "file"}
+    assert files["task_1/tests/test_task.py"] == "from main import solve\n"
+    assert files["task_1/main.py"] == SKELETON
+    assert files["task_1/data.json"] == '{"orders": []}'
+    # One implementation call plus one repair, for the failing file only
+    assert mock_client.aio.models.generate_content.await_count == 2
+    assert any("regenerating ['tests/test_task.py']" in e["message"] for e in events if e["type"] == "log")
+    assert not any("still fail validation" in e["message"] for e in events if e["type"] == "log")